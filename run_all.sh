@@ -1,23 +1,10 @@
 #!/usr/bin/env bash
 #run_all.sh
 
-set -e
-
-echo "== Ingest =="
-python src/ingest/ingest_data.py
-
-echo
+# Thin wrapper around the stage runner: ingest → prepare → train → evaluate,
+# skipping every stage whose inputs and code are unchanged since its last run.
+# Pass --all for the optional models and CV, --force to re-run, --jobs N, …
 
-# REMOVED: "== Clean =="
-# REMOVED: python src/clean/clean_data.py
-
-echo "== Data Preparation (Clean & Feature Engineering) =="
-python src/features/prepare_data.py # NEW SCRIPT NAME
-echo
-
-echo "== Train (baseline) =="
-python src/model/train_model.py
-echo
+set -e
 
-echo "== Full evaluation =="
-python src/eval/full_evaluate.py --model models/rating_model.pkl
\ No newline at end of file
+exec python src/pipeline/run_pipeline.py "$@"
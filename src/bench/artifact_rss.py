@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# artifact_rss.py
+#
+# Per-worker memory of a model in each artifact format, as a multi-process
+# scoring box sees it.
+#
+# For every format (pickle, forest directory, compressed .forest.npz), --workers
+# fresh (spawned) processes each load the artifact and score --rows feature
+# rows. They wait for each other so all of them are alive when they read their
+# own /proc/self/smaps_rollup, before loading and after scoring:
+#
+#   rss       resident pages, shared ones counted in full
+#   pss       shared pages divided among the processes mapping them
+#   private   pages no other process maps: what one more worker costs
+#
+# The sum of the workers' pss is what the box pays in total. Formats missing
+# next to --model are written to a temporary directory first. Linux only.
+#
+#   python src/bench/artifact_rss.py --model models/rating_model.pkl --workers 4
+#   → reports/benchmarks/artifact_rss-<time>.json
+
+import os, sys, json, time, shutil, argparse, tempfile, multiprocessing
+
+import joblib
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.dataset import clean_features
+from common.storage import read_table
+from model.forest_arrays import (ForestArrays, FOREST_SUFFIX, COMPRESSED_SUFFIX,
+                                 is_forest_dir, load_forest_or_model)
+
+ROOT = os.path.abspath(os.path.join(SRC, ".."))
+OUT_DIR = os.path.join(ROOT, "reports", "benchmarks")
+FEAT = os.path.join(ROOT, "data", "processed", "player_ratings_features")
+SMAPS = "/proc/self/smaps_rollup"
+MB = 2 ** 20
+
+
+def memory():
+    """This process's rss / pss / private bytes."""
+    fields = {}
+    with open(SMAPS) as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                fields[key] = int(rest.split()[0]) * 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"],
+            "private": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def _worker(path, X, barrier, queue):
+    import sklearn.ensemble  # noqa: F401  (library pages in the baseline, not in the model)
+    before = memory()
+    t0 = time.perf_counter()
+    model = load_forest_or_model(path)
+    load_s = time.perf_counter() - t0
+    if hasattr(model, "n_jobs"):
+        model.n_jobs = 1
+    model.predict(X)
+    barrier.wait()              # everyone has the model mapped
+    after = memory()
+    queue.put({"pid": os.getpid(), "load_ms": round(load_s * 1000, 1),
+               **{k: after[k] for k in after}, "model_rss": after["rss"] - before["rss"]})
+    barrier.wait()              # nobody exits (and unmaps) before the others have measured
+
+
+def measure(path, X, workers):
+    """Memory of `workers` concurrent processes serving the artifact at `path`."""
+    ctx = multiprocessing.get_context("spawn")
+    barrier, queue = ctx.Barrier(workers), ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(path, X, barrier, queue)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    results = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return results
+
+
+def artifacts(model_path, scratch):
+    """{format: path}, writing the forest formats of a forest pickle to `scratch` if missing."""
+    stem = os.path.splitext(model_path)[0]
+    paths = {"pickle": model_path}
+    forest_dir, packed = stem + FOREST_SUFFIX, stem + COMPRESSED_SUFFIX
+    model = joblib.load(model_path)
+    if not hasattr(model, "estimators_"):
+        return paths
+    if not is_forest_dir(forest_dir) or not os.path.isfile(packed):
+        forest = ForestArrays.from_model(model)
+        if not is_forest_dir(forest_dir):
+            forest_dir = forest.save(os.path.join(scratch, "model" + FOREST_SUFFIX))
+        if not os.path.isfile(packed):
+            packed = forest.save_compressed(os.path.join(scratch, "model" + COMPRESSED_SUFFIX))
+    paths.update(forest=forest_dir, npz=packed)
+    return paths
+
+
+def _disk_bytes(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-worker RSS of each model artifact format.")
+    parser.add_argument("--model", default=os.path.join(ROOT, "models", "rating_model.pkl"))
+    parser.add_argument("--features", default=FEAT)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=1_000, help="rows each worker scores")
+    args = parser.parse_args(argv)
+    if not os.path.isfile(SMAPS):
+        raise SystemExit(f"{SMAPS} is not available; this benchmark needs Linux")
+
+    X = read_table(args.features).head(args.rows)
+    X = X.__class__(clean_features(X), columns=X.columns)
+    scratch = tempfile.mkdtemp(prefix="rater-rss-")
+    try:
+        results = {}
+        for fmt, path in artifacts(args.model, scratch).items():
+            per_worker = measure(path, X, args.workers)
+            results[fmt] = {"path": path, "disk_bytes": _disk_bytes(path), "workers": per_worker,
+                            "box_pss": sum(w["pss"] for w in per_worker)}
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"{args.workers} workers, {args.rows} rows each (MB per worker, mean)")
+    print(f"{'format':<8} {'disk':>8} {'load ms':>8} {'rss':>8} {'pss':>8} {'private':>8} "
+          f"{'model':>8} {'box pss':>8}")
+    for fmt, r in results.items():
+        w = r["workers"]
+
+        def mean(key):
+            return sum(x[key] for x in w) / len(w)
+
+        print(f"{fmt:<8} {r['disk_bytes'] / MB:>8.1f} {mean('load_ms'):>8.1f} {mean('rss') / MB:>8.1f} "
+              f"{mean('pss') / MB:>8.1f} {mean('private') / MB:>8.1f} {mean('model_rss') / MB:>8.1f} "
+              f"{r['box_pss'] / MB:>8.1f}")
+
+    os.makedirs(OUT_DIR, exist_ok=True)
+    out = os.path.join(OUT_DIR, f"artifact_rss-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out, "w") as f:
+        json.dump({"model": args.model, "workers": args.workers, "rows": args.rows,
+                   "results": results}, f, indent=2)
+    print(f"\nResults → {out}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# make_synthetic.py
+#
+# Synthetic stand-ins for the two raw inputs (data/raw/ only holds Git LFS
+# pointers), at any size:
+#
+#   data_football_ratings.csv  one row per (appearance, rater), same columns as
+#                              the real dump; WhoScored plus other machine and
+#                              human raters (Kicker/Bild on the German 1–6 scale)
+#   database.sqlite            Player and Player_Attributes with the real
+#                              schemas, several dated snapshots per player
+#
+# The data has the quirks ingest_data.py handles: some rated players are
+# missing from the database, some names belong to two api ids, and some
+# attribute values are NULL. Ratings are a noisy linear function of the match
+# stats, so the trained model has signal to find.
+#
+# Rows are produced a block of matches at a time and appended to the CSV, so
+# memory stays flat from thousands to tens of millions of rows.
+#
+#   python src/bench/make_synthetic.py --rows 1000000 --out /tmp/rater-1m
+#   → /tmp/rater-1m/data/raw/{data_football_ratings.csv,database.sqlite}
+
+import os, time, sqlite3, argparse
+
+import numpy as np
+import pandas as pd
+
+STATS = [
+    "goals", "assists", "shots_ontarget", "shots_offtarget", "shotsblocked",
+    "chances2score", "drib_success", "drib_unsuccess", "keypasses", "touches",
+    "passes_acc", "passes_inacc", "crosses_acc", "crosses_inacc", "lballs_acc",
+    "lballs_inacc", "grduels_w", "grduels_l", "aerials_w", "aerials_l",
+    "poss_lost", "fouls", "wasfouled", "clearances", "stop_shots",
+    "interceptions", "tackles", "dribbled_past", "tballs_acc", "tballs_inacc",
+    "countattack", "offsides",
+]
+CSV_COLUMNS = (["competition", "date", "match", "team", "pos", "pos_role", "player",
+                "minutesPlayed", "win", "lost", "is_home_team"] + STATS
+               + ["rater", "is_human", "original_rating"])
+
+# (name, is_human, scale): "whoscored" 1–10 higher is better, "grade" 1–6 lower is better
+RATERS = [("WhoScored", False, "whoscored"), ("SofaScore", False, "whoscored"),
+          ("Kicker", True, "grade"), ("Bild", True, "grade"), ("Goal", True, "whoscored")]
+LEAGUES = ["Premier League", "Bundesliga", "Serie A", "La Liga", "Ligue 1"]
+SEASONS = ["2015-16", "2016-17", "2017-18"]
+TEAMS_PER_LEAGUE = 20
+ROSTER = 25
+PLAYING = 14                                   # 11 starters + 3 substitutes per team
+APPEARANCES = 40                               # per player before the rosters turn over
+SLOT_POS = ["GK"] + ["DF"] * 4 + ["MF"] * 4 + ["FW"] * 2 + ["Sub"] * 3
+SLOT_ROLE = ["GK", "DR", "DC", "DC", "DL", "DMC", "MC", "MC", "AMC", "FW", "FW", "Sub", "Sub", "Sub"]
+
+# mean count per 90 minutes of every stat, by broad position (GK, DF, MF, FW)
+_BASE = np.array([0.05, 0.05, 0.3, 0.3, 0.2, 0.3, 0.5, 0.4, 0.6, 50, 25, 5, 0.5, 0.8, 3, 2,
+                  3, 3, 1.5, 1.5, 8, 1, 1, 3, 0.2, 1.2, 1.5, 0.8, 0.2, 0.2, 0.2, 0.2])
+_POS_SCALE = {"GK": 0.3, "DF": 1.0, "MF": 1.2, "FW": 1.1}
+_FW_BOOST = {"goals": 8, "shots_ontarget": 3, "shots_offtarget": 2.5, "offsides": 4, "assists": 3}
+_DF_BOOST = {"clearances": 2, "interceptions": 1.5, "tackles": 1.3, "aerials_w": 1.5}
+# contribution of each stat to the (WhoScored-scale) rating
+_WEIGHT = dict.fromkeys(STATS, 0.0)
+_WEIGHT.update(goals=0.9, assists=0.6, shots_ontarget=0.12, keypasses=0.12, drib_success=0.08,
+               passes_acc=0.008, passes_inacc=-0.03, grduels_w=0.05, grduels_l=-0.05,
+               aerials_w=0.04, poss_lost=-0.03, fouls=-0.08, clearances=0.04,
+               interceptions=0.07, tackles=0.08, dribbled_past=-0.08, stop_shots=0.25)
+
+ATTR_COLUMNS = [
+    "overall_rating", "potential", "preferred_foot", "attacking_work_rate",
+    "defensive_work_rate", "crossing", "finishing", "heading_accuracy", "short_passing",
+    "volleys", "dribbling", "curve", "free_kick_accuracy", "long_passing", "ball_control",
+    "acceleration", "sprint_speed", "agility", "reactions", "balance", "shot_power",
+    "jumping", "stamina", "strength", "long_shots", "aggression", "interceptions",
+    "positioning", "vision", "penalties", "marking", "standing_tackle", "sliding_tackle",
+    "gk_diving", "gk_handling", "gk_kicking", "gk_positioning", "gk_reflexes",
+]
+_TEXT_ATTRS = {"preferred_foot": ["right", "left"], "attacking_work_rate": ["low", "medium", "high"],
+               "defensive_work_rate": ["low", "medium", "high"]}
+SCHEMA = f"""
+CREATE TABLE Player (
+    id                 INTEGER PRIMARY KEY AUTOINCREMENT,
+    player_api_id      INTEGER UNIQUE,
+    player_name        TEXT,
+    player_fifa_api_id INTEGER UNIQUE,
+    birthday           TEXT,
+    height             INTEGER,
+    weight             INTEGER
+);
+CREATE TABLE Player_Attributes (
+    id                 INTEGER PRIMARY KEY AUTOINCREMENT,
+    player_fifa_api_id INTEGER,
+    player_api_id      INTEGER,
+    date               TEXT,
+    {", ".join(f"{c} {'TEXT' if c in _TEXT_ATTRS else 'INTEGER'}" for c in ATTR_COLUMNS)}
+);
+"""
+
+
+def rows_per_match(n_raters):
+    return 2 * PLAYING * n_raters
+
+
+def _rate_matrix():
+    """(position slot, stat) → mean count per 90 minutes."""
+    rates = np.empty((len(SLOT_POS), len(STATS)))
+    for s, pos in enumerate(SLOT_POS):
+        broad = pos if pos != "Sub" else "MF"
+        r = _BASE * _POS_SCALE[broad]
+        boost = _FW_BOOST if broad == "FW" else _DF_BOOST if broad == "DF" else {}
+        for k, v in boost.items():
+            r[STATS.index(k)] *= v
+        if broad == "GK":
+            r[STATS.index("stop_shots")] = 3.0
+        rates[s] = r
+    return rates
+
+
+def _to_scale(whoscored, scale, rng):
+    if scale == "grade":      # German school grade: 1 best, 6 worst, steps of 0.5
+        grade = np.clip(6.5 - (whoscored - 3) * 0.75 + rng.normal(0, 0.35, len(whoscored)), 1, 6)
+        return np.round(grade * 2) / 2
+    return np.round(np.clip(whoscored + rng.normal(0, 0.3, len(whoscored)), 1, 10), 1)
+
+
+def _match_block(rng, match, comp, home, away, dates, n_raters, roster_base, names, rates, weights):
+    """CSV rows (all raters) for one block of matches.
+
+    `home`/`away` are team indices; a team's roster is the ROSTER players from
+    `roster_base[i]` on for match i, so rosters turn over between epochs.
+    """
+    m = len(match)
+    team = np.stack([home, away], axis=1).reshape(-1)                      # (2m,)
+    is_home = np.tile([True, False], m)
+    goals_for = rng.poisson(1.4, size=(m, 2))
+    win = np.stack([goals_for[:, 0] > goals_for[:, 1], goals_for[:, 1] > goals_for[:, 0]], 1).reshape(-1)
+    lost = np.stack([goals_for[:, 0] < goals_for[:, 1], goals_for[:, 1] < goals_for[:, 0]], 1).reshape(-1)
+
+    # 14 of the 25-man roster play; slot k gets position SLOT_POS[k]
+    picks = rng.random((2 * m, ROSTER)).argsort(axis=1)[:, :PLAYING]
+    player = (np.repeat(roster_base, 2)[:, None] + team[:, None] * ROSTER + picks).reshape(-1)
+    slot = np.tile(np.arange(PLAYING), 2 * m)
+    minutes = np.where(slot < 11, np.where(rng.random(slot.size) < 0.85, 90,
+                                           rng.integers(45, 90, slot.size)),
+                       rng.integers(1, 45, slot.size))
+    stats = rng.poisson(rates[slot] * (minutes / 90.0)[:, None])
+    ws = 6.4 + stats @ weights + 0.25 * np.repeat(win, PLAYING) - 0.25 * np.repeat(lost, PLAYING)
+    ws = np.clip(ws + rng.normal(0, 0.35, ws.size), 3, 10)
+
+    per_team = lambda a: np.repeat(a, PLAYING)            # (2m,) → one value per appearance
+    per_match = lambda a: np.repeat(a, 2 * PLAYING)       # (m,)  → one value per appearance
+    app = pd.DataFrame({
+        "competition": per_match(comp), "date": per_match(dates), "match": per_match(match),
+        "team": per_team(team), "pos": np.array(SLOT_POS, dtype=object)[slot],
+        "pos_role": np.array(SLOT_ROLE, dtype=object)[slot], "player": names[player],
+        "minutesPlayed": minutes, "win": per_team(win), "lost": per_team(lost),
+        "is_home_team": per_team(is_home),
+    })
+    app = pd.concat([app, pd.DataFrame(stats, columns=STATS)], axis=1)
+
+    frames = []
+    for name, human, scale in RATERS[:n_raters]:
+        rating = np.round(ws, 1) if name == "WhoScored" else _to_scale(ws, scale, rng)
+        frames.append(app.assign(rater=name, is_human=human, original_rating=rating))
+    # the dump lists every rater of an appearance together
+    out = pd.concat(frames, ignore_index=True)
+    order = np.arange(len(out)).reshape(n_raters, -1).T.reshape(-1)
+    return out.iloc[order]
+
+
+def _players(n_players, rng):
+    """Names for every roster spot; a few names are shared by two people."""
+    names = np.array([f"Player {i:07d}" for i in range(n_players)], dtype=object)
+    dup = rng.choice(n_players, size=max(1, n_players // 200), replace=False)
+    names[dup] = names[(dup + 1) % n_players]          # two api ids, one name
+    return names
+
+
+def write_database(path, player_names, rng, missing_frac=0.03, null_frac=0.02):
+    """Player / Player_Attributes for the rated players, some left out."""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    n = len(player_names)
+    keep = np.flatnonzero(rng.random(n) >= missing_frac)
+    api = 100_000 + keep
+    birthday = (pd.Timestamp("1980-01-01") + pd.to_timedelta(rng.integers(0, 6000, keep.size), unit="D"))
+    conn.executemany(
+        "INSERT INTO Player (player_api_id, player_name, player_fifa_api_id, birthday, height, weight) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        zip(api.tolist(), player_names[keep].tolist(), (500_000 + keep).tolist(),
+            birthday.strftime("%Y-%m-%d 00:00:00"), rng.integers(165, 200, keep.size).tolist(),
+            rng.integers(140, 210, keep.size).tolist()))
+
+    # a snapshot roughly every six months from 2014 to 2018
+    n_snap = rng.integers(3, 9, keep.size)
+    who = np.repeat(np.arange(keep.size), n_snap)
+    dates = pd.Timestamp("2014-01-01") + pd.to_timedelta(rng.integers(0, 5 * 365, who.size), unit="D")
+    cols = {"player_fifa_api_id": 500_000 + keep[who], "player_api_id": api[who],
+            "date": dates.strftime("%Y-%m-%d 00:00:00")}
+    level = rng.integers(45, 85, keep.size)[who]
+    for c in ATTR_COLUMNS:
+        if c in _TEXT_ATTRS:
+            vals = np.array(_TEXT_ATTRS[c], dtype=object)[rng.integers(0, len(_TEXT_ATTRS[c]), who.size)]
+        else:
+            vals = np.clip(level + rng.integers(-12, 13, who.size), 20, 99).astype(float)
+            vals[rng.random(who.size) < null_frac] = np.nan
+        cols[c] = vals
+    frame = pd.DataFrame(cols)
+    placeholders = ", ".join("?" * frame.shape[1])
+    sql = f"INSERT INTO Player_Attributes ({', '.join(frame.columns)}) VALUES ({placeholders})"
+    for start in range(0, len(frame), 200_000):
+        part = frame.iloc[start:start + 200_000].astype(object)
+        conn.executemany(sql, part.where(part.notna(), None).itertuples(index=False, name=None))
+    conn.commit()
+    conn.close()
+    return {"players": int(keep.size), "attribute_rows": int(len(frame))}
+
+
+def generate(out_dir, rows, raters=3, seed=0, block_matches=2_000, log=print):
+    """Write data/raw/{data_football_ratings.csv,database.sqlite} under `out_dir`; returns counts."""
+    if not 1 <= raters <= len(RATERS):
+        raise ValueError(f"raters must be between 1 and {len(RATERS)}")
+    rng = np.random.default_rng(seed)
+    raw = os.path.join(out_dir, "data", "raw")
+    os.makedirs(raw, exist_ok=True)
+    csv_path = os.path.join(raw, "data_football_ratings.csv")
+    db_path = os.path.join(raw, "database.sqlite")
+
+    n_matches = max(1, -(-rows // rows_per_match(raters)))
+    n_comps = len(LEAGUES) * len(SEASONS)
+    n_teams = len(LEAGUES) * TEAMS_PER_LEAGUE
+    # rosters turn over every epoch, so each player gets ~APPEARANCES appearances
+    epoch_matches = max(1, APPEARANCES * ROSTER * n_teams // (2 * PLAYING))
+    n_epochs = -(-n_matches // epoch_matches)
+    names = _players(n_epochs * n_teams * ROSTER, rng)
+    team_names = np.array([f"{lg} FC {t:02d}" for lg in LEAGUES for t in range(TEAMS_PER_LEAGUE)],
+                          dtype=object)
+    comp_names = np.array([f"{lg} {s}" for s in SEASONS for lg in LEAGUES], dtype=object)
+    season_start = np.array([np.datetime64(f"20{s[2:4]}-08-01") for s in SEASONS])
+    rates, weights = _rate_matrix(), np.array([_WEIGHT[s] for s in STATS])
+
+    t0 = time.perf_counter()
+    written = 0
+    with open(csv_path, "w", newline="") as f:
+        for start in range(0, n_matches, block_matches):
+            ids = np.arange(start, min(n_matches, start + block_matches))
+            comp = ids % n_comps
+            league = comp % len(LEAGUES)
+            home_t = rng.integers(0, TEAMS_PER_LEAGUE, ids.size)
+            away_t = (home_t + rng.integers(1, TEAMS_PER_LEAGUE, ids.size)) % TEAMS_PER_LEAGUE
+            home, away = league * TEAMS_PER_LEAGUE + home_t, league * TEAMS_PER_LEAGUE + away_t
+            dates = pd.DatetimeIndex(season_start[comp // len(LEAGUES)]
+                                     + rng.integers(0, 280, ids.size).astype("timedelta64[D]"))
+            match = team_names[home] + " - " + team_names[away] + " #" + ids.astype(str)
+            block = _match_block(rng, match, comp_names[comp], home, away,
+                                 dates.strftime("%d/%m/%Y").to_numpy(), raters,
+                                 (ids // epoch_matches) * n_teams * ROSTER, names, rates, weights)
+            block["team"] = team_names[block["team"].to_numpy()]
+            block[CSV_COLUMNS].to_csv(f, header=(start == 0), index=False)
+            written += len(block)
+    log(f"Wrote {written:,} rating rows ({n_matches:,} matches, {raters} raters) → {csv_path} "
+        f"in {time.perf_counter() - t0:.1f}s")
+
+    t0 = time.perf_counter()
+    db = write_database(db_path, names, rng)
+    log(f"Wrote {db['players']:,} players / {db['attribute_rows']:,} attribute snapshots → {db_path} "
+        f"in {time.perf_counter() - t0:.1f}s")
+    return {"rows": written, "matches": n_matches, "raters": raters, **db,
+            "csv_bytes": os.path.getsize(csv_path), "db_bytes": os.path.getsize(db_path)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic raw ratings and attributes.")
+    parser.add_argument("--rows", type=int, default=100_000, help="rating rows (all raters) to write")
+    parser.add_argument("--out", required=True, help="directory to create data/raw/ in")
+    parser.add_argument("--raters", type=int, default=3, help=f"raters per appearance (1-{len(RATERS)})")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    generate(args.out, args.rows, args.raters, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# run_benchmarks.py
+#
+# End-to-end scaling benchmark on synthetic data.
+#
+# For every scale point (number of raw rating rows), a fresh work directory
+# gets synthetic raw inputs (make_synthetic.py). The real stage scripts then
+# run in it as separate processes:
+#
+#   generate → ingest → prepare → train → predict
+#
+# Each stage records its wall time, CPU time and peak RSS (from os.wait4's
+# rusage, i.e. the stage process itself, not pool workers it forks) plus the
+# size of what it wrote. Results go to reports/benchmarks/bench-<time>.json.
+# With --baseline, each stage is compared with an earlier results file and
+# flagged when it got slower or larger than --tolerance allows.
+#
+#   python src/bench/run_benchmarks.py --scales 10000 100000 1000000
+#   python src/bench/run_benchmarks.py --scales 100000 --baseline reports/benchmarks/bench-….json
+
+import os, sys, json, time, shutil, platform, argparse, tempfile, subprocess
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+ROOT = os.path.abspath(os.path.join(SRC, ".."))
+OUT_DIR = os.path.join(ROOT, "reports", "benchmarks")
+STAGES = ("generate", "ingest", "prepare", "train", "predict")
+
+
+def _script(*parts):
+    return os.path.join(SRC, *parts)
+
+
+def stage_commands(rows, raters, seed, extra):
+    """argv of every stage for one scale point (run with the work directory as cwd)."""
+    py = sys.executable
+    return {
+        "generate": [py, _script("bench", "make_synthetic.py"), "--rows", str(rows),
+                     "--raters", str(raters), "--seed", str(seed), "--out", "."],
+        "ingest": [py, _script("ingest", "ingest_data.py"), *extra.get("ingest", [])],
+        "prepare": [py, _script("features", "prepare_data.py"), *extra.get("prepare", [])],
+        "train": [py, _script("model", "train_model.py"), *extra.get("train", [])],
+        "predict": [py, _script("predict", "predict_rating.py"), "--model", "models/rating_model.pkl",
+                    "--input", "data/processed/player_ratings_merged",
+                    "--output", "reports/predictions.csv", *extra.get("predict", [])],
+    }
+
+
+def _disk_bytes(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(path) for f in fs)
+
+
+# what each stage writes, relative to the work directory
+OUTPUTS = {
+    "generate": ["data/raw"],
+    "ingest": ["data/processed/player_ratings_merged"],
+    "prepare": ["data/processed/player_ratings_features", "data/processed/player_ratings_target",
+                "data/processed/player_ratings_cleaned"],
+    "train": ["models/rating_model.pkl"],
+    "predict": ["reports/predictions.csv"],
+}
+
+
+def _outputs_bytes(workdir, stage):
+    total = 0
+    for rel in OUTPUTS[stage]:
+        for cand in (rel, rel + ".parquet", rel + ".csv"):
+            path = os.path.join(workdir, cand)
+            if os.path.exists(path):
+                total += _disk_bytes(path)
+    return total
+
+
+def timed(argv, cwd, log_path):
+    """Run argv to completion; returns exit code, wall/CPU seconds and peak RSS."""
+    with open(log_path, "w") as log:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(argv, cwd=cwd, stdout=log, stderr=subprocess.STDOUT,
+                                env=dict(os.environ, PYTHONUNBUFFERED="1"))
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - t0
+    proc.returncode = code = os.waitstatus_to_exitcode(status)
+    return {"exit_code": code, "wall_s": round(wall, 3),
+            "cpu_s": round(usage.ru_utime + usage.ru_stime, 3),
+            "peak_rss_mb": round(usage.ru_maxrss / 1024, 1)}     # ru_maxrss is in KiB on Linux
+
+
+def bench_scale(rows, workdir, raters=3, seed=0, stages=STAGES, extra=None, log=print):
+    """Run `stages` for one scale point in `workdir`; returns {stage: record}."""
+    os.makedirs(os.path.join(workdir, "logs"), exist_ok=True)
+    commands = stage_commands(rows, raters, seed, extra or {})
+    results = {}
+    for stage in stages:
+        rec = timed(commands[stage], workdir, os.path.join(workdir, "logs", f"{stage}.log"))
+        rec["output_mb"] = round(_outputs_bytes(workdir, stage) / 2**20, 2)
+        results[stage] = rec
+        if rec["exit_code"] != 0:
+            log(f"  {stage:<9} FAILED (exit {rec['exit_code']}), see {workdir}/logs/{stage}.log")
+            break
+        log(f"  {stage:<9} {rec['wall_s']:8.2f}s wall  {rec['cpu_s']:8.2f}s cpu  "
+            f"{rec['peak_rss_mb']:8.0f} MB peak  {rec['output_mb']:8.1f} MB out")
+    return results
+
+
+def compare(current, baseline, tolerance=0.2):
+    """Stages whose wall time or peak RSS grew by more than `tolerance` against `baseline`."""
+    base = {(str(s["rows"]), st): r for s in baseline["scales"] for st, r in s["stages"].items()}
+    flagged = []
+    for s in current["scales"]:
+        for stage, r in s["stages"].items():
+            b = base.get((str(s["rows"]), stage))
+            if not b or r.get("exit_code") or b.get("exit_code"):
+                continue
+            for metric in ("wall_s", "peak_rss_mb"):
+                if b[metric] > 0 and r[metric] > b[metric] * (1 + tolerance):
+                    flagged.append({"rows": s["rows"], "stage": stage, "metric": metric,
+                                    "baseline": b[metric], "current": r[metric],
+                                    "ratio": round(r[metric] / b[metric], 2)})
+    return flagged
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every pipeline stage on synthetic data at several scales.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[10_000, 100_000],
+                        help="raw rating rows per scale point")
+    parser.add_argument("--raters", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES),
+                        help="stages to run, in pipeline order (later ones need earlier outputs)")
+    parser.add_argument("--workdir", default=None, help="where scale points run (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep each scale point's work directory")
+    for stage in ("ingest", "prepare", "train", "predict"):
+        parser.add_argument(f"--{stage}-args", default="", metavar="ARGS",
+                            help=f"extra arguments for the {stage} script, e.g. --{stage}-args=\"--stream\"")
+    parser.add_argument("--output", default=None, help="results JSON (default: reports/benchmarks/bench-<time>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown/growth vs --baseline")
+    args = parser.parse_args(argv)
+
+    extra = {s: getattr(args, f"{s}_args").split() for s in ("ingest", "prepare", "train", "predict")}
+    base_dir = args.workdir or tempfile.mkdtemp(prefix="rater-bench-")
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "raters": args.raters, "seed": args.seed, "extra_args": extra,
+        "scales": [],
+    }
+    for rows in args.scales:
+        workdir = os.path.join(base_dir, f"rows-{rows}")
+        shutil.rmtree(workdir, ignore_errors=True)
+        print(f"\n== {rows:,} rows ({workdir}) ==")
+        stages = bench_scale(rows, workdir, args.raters, args.seed, args.stages, extra)
+        report["scales"].append({"rows": rows, "stages": stages})
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    if not args.keep and not args.workdir:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+        print(f"\n{len(report['regressions'])} regression(s) beyond {args.tolerance:.0%} vs {args.baseline}")
+        for r in report["regressions"]:
+            print(f"  {r['rows']:>12,} rows  {r['stage']:<9} {r['metric']:<12} "
+                  f"{r['baseline']} → {r['current']}  ({r['ratio']}x)")
+
+    output = args.output or os.path.join(OUT_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults → {output}")
+    failed = any(r["exit_code"] for s in report["scales"] for r in s["stages"].values())
+    return 1 if failed or report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# rater.py
+#
+# One command for the pipeline stages and inspection scripts:
+#
+#   rater ingest   [ingest_data.py options]
+#   rater prepare  [prepare_data.py options]
+#   rater train    [train_model.py options]
+#   rater update   [update_model.py options]
+#   rater evaluate [full_evaluate.py options]
+#   rater predict  [predict_rating.py options]
+#   rater inspect  positions | tiers | errors | features | processed
+#
+# Only the standard library is imported up front. A subcommand imports its
+# script's module when it runs, so `rater --help` does not pay for pandas,
+# sklearn or matplotlib, and neither does a command that does not use them.
+#
+# `rater predict` takes a NumPy-only path when --model is a flattened forest
+# (forest_arrays.py: a .forest directory or .forest.npz) and --input already
+# holds the engineered features: a .npy matrix in the forest's column order,
+# or a .csv whose header names every feature column. NaN/inf values get the
+# training medians stored in the forest's header. The output holds what
+# predict_rating.py writes: the imputed features in the model's column order,
+# then predicted_rating (a .csv with that header, or a .npy matrix with those
+# columns). Anything else (raw merged rows, pickled models, --id-col,
+# --chunk-rows, …) runs predict_rating.py as usual.
+#
+# --timings reports to stderr how the run split between interpreter start,
+# imports and work.
+#
+#   ./rater predict --model models/rating_model.forest --input feats.csv --output preds.csv --timings
+#   ./rater train --backend lightgbm
+#   ./rater inspect positions
+
+import os
+import sys
+import time
+
+T0 = time.perf_counter()
+
+import argparse
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+# name -> (module, help); each module has main(argv)
+COMMANDS = {
+    "ingest": ("ingest.ingest_data", "raw ratings CSV + SQLite → merged table"),
+    "prepare": ("features.prepare_data", "merged table → features, target, transformer"),
+    "train": ("model.train_model", "fit models/rating_model.pkl"),
+    "update": ("model.update_model", "grow the model with recent matches"),
+    "evaluate": ("eval.full_evaluate", "sliced test-set metrics for --model"),
+    "predict": ("predict.predict_rating", "score a table with --model"),
+}
+# name -> module; each module has main() without arguments
+INSPECT = {
+    "positions": "model.inspect_position_examples",
+    "tiers": "model.inspect_tier_predictions",
+    "errors": "model.error_analysis_by_position",
+    "features": "eda.show_features",
+    "processed": "eda.inspect_processed",
+}
+
+
+def _interpreter_s():
+    """Seconds from process start to this module's first line (Linux; None elsewhere)."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK") - (time.perf_counter() - T0))
+
+
+# ── NumPy-only scoring ──
+def _float(field):
+    return float(field) if field else float("nan")
+
+
+def read_features(path, names):
+    """Feature matrix (float32) of a .npy, or of a .csv with a header naming every column in `names`.
+
+    Returns None for a .csv that lacks some of them (raw rows, not features).
+    """
+    import numpy as np
+    if path.endswith(".npy"):
+        X = np.load(path, mmap_mode="r")
+        if X.ndim != 2 or X.shape[1] != len(names):
+            raise SystemExit(f"{path} has shape {X.shape}; the model expects {len(names)} columns")
+        return np.asarray(X, dtype=np.float32)
+    with open(path) as f:
+        header = f.readline().rstrip("\r\n").split(",")
+    position = {c.strip('"'): i for i, c in enumerate(header)}
+    if any(n not in position for n in names):
+        return None
+    return np.loadtxt(path, delimiter=",", skiprows=1, usecols=[position[n] for n in names],
+                      dtype=np.float32, converters=_float, ndmin=2)
+
+
+def fast_predict(argv):
+    """Score with NumPy only if `argv` allows it; returns the output path, or None to fall back."""
+    parser = argparse.ArgumentParser(add_help=False)
+    for flag in ("--model", "--input", "--output"):
+        parser.add_argument(flag)
+    args, rest = parser.parse_known_args(argv)
+    if rest or not (args.model and args.input and args.output) \
+            or not args.input.endswith((".npy", ".csv")):
+        return None
+    from model.forest_arrays import ForestArrays, is_forest_dir, is_forest_npz
+    if is_forest_dir(args.model):
+        forest = ForestArrays.load(args.model)
+    elif is_forest_npz(args.model):
+        forest = ForestArrays.load_compressed(args.model)
+    else:
+        return None
+    names = forest.meta.get("feature_names")
+    X = read_features(args.input, names) if names else None
+    if X is None:
+        return None
+
+    import numpy as np
+    medians = (forest.meta.get("transformer") or {}).get("feature_medians")
+    bad = ~np.isfinite(X)
+    if medians and bad.any():
+        fill = np.array([medians.get(n, 0.0) for n in names], dtype=np.float32)
+        X = np.where(bad, fill, X)
+    preds = forest.predict(X)
+    out = np.column_stack([X.astype(np.float64), preds])     # predict_rating.py's columns
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    if args.output.endswith(".npy"):
+        np.save(args.output, out)
+    else:
+        np.savetxt(args.output, out, delimiter=",", fmt=["%.9g"] * len(names) + ["%.17g"],
+                   header=",".join([*names, "predicted_rating"]), comments="")
+    print(f"Saved {len(preds)} predictions → {args.output}")
+    return args.output
+
+
+# ── dispatch ──
+def run(command, argv):
+    """Import the subcommand's module and run it; returns {"imports": s, "work": s}."""
+    import importlib
+    clock = {"imports": 0.0, "work": 0.0}
+
+    def timed(part, fn, *args):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        clock[part] += time.perf_counter() - t0
+        return out
+
+    if command == "predict":
+        timed("imports", importlib.import_module, "model.forest_arrays")   # NumPy only
+        if timed("work", fast_predict, argv):
+            return clock
+    if command == "inspect":
+        if len(argv) != 1 or argv[0] not in INSPECT:
+            raise SystemExit(f"usage: rater inspect {{{','.join(INSPECT)}}}")
+        module = timed("imports", importlib.import_module, INSPECT[argv[0]])
+        timed("work", module.main)
+    else:
+        module = timed("imports", importlib.import_module, COMMANDS[command][0])
+        timed("work", module.main, argv)
+    return clock
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(
+        prog="rater", description="Player match-rating pipeline.",
+        epilog="Options after the command go to its script; `rater <command> --help` lists them.")
+    parser.add_argument("--timings", action="store_true",
+                        help="report interpreter start, import and work time to stderr")
+    parser.add_argument("command", choices=[*COMMANDS, "inspect"],
+                        help=", ".join(f"{n}: {h}" for n, (_, h) in COMMANDS.items())
+                        + f"; inspect: {'|'.join(INSPECT)}")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+    if "--timings" in args.args:      # also accepted after the command
+        args.args.remove("--timings")
+        args.timings = True
+
+    boot = _interpreter_s()
+    clock = run(args.command, args.args)
+    if args.timings:
+        total = time.perf_counter() - T0 + (boot or 0.0)
+        print(f"rater {args.command}: interpreter {boot or 0.0:.3f}s, "
+              f"imports {clock['imports']:.3f}s, work {clock['work']:.3f}s, total {total:.3f}s",
+              file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# dataset.py
+#
+# One cleaned, split, memory-mapped copy of the training data for every
+# training and analysis script.
+#
+# The first load_dataset() call reads the feature/target tables and does the
+# inf → NaN → column-median cleanup. It then applies
+# train_test_split(test_size=0.2, random_state=42) and writes the result under
+# data/processed/_cache/dataset-<key>/:
+#
+#   X.npy, y.npy       rows in train-then-test order, so the train and test
+#                      sets are plain slices (zero-copy views of the mmap)
+#   train_idx.npy,     original row positions of each part, in sklearn's
+#   test_idx.npy       order, so X_train matches train_test_split exactly
+#   meta.parquet       context columns (pos, competition, team, …) from
+#                      player_ratings_cleaned, in the same order
+#   info.json          columns, split parameters and source digests
+#
+# <key> hashes the *contents* of the source tables together with the split
+# parameters, so a re-prepared dataset gets a new cache and an unchanged one
+# is reused across processes. File digests are memoised by size + mtime in
+# _cache/digests.json, so unchanged sources are not re-hashed on every run.
+#
+# Writing a new cache prunes the older ones: only the KEEP_DATASETS most
+# recently used dataset-<key> directories stay (a cache is "used" each time it
+# is opened). prune() does the same for the stacking and prediction caches.
+
+import os
+import json
+import shutil
+import hashlib
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from common.hashing import file_digest
+from common.storage import exists, read_columns, read_table, table_files
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+PROC = os.path.join(ROOT, "data", "processed")
+FEAT = os.path.join(PROC, "player_ratings_features")
+TARGET = os.path.join(PROC, "player_ratings_target")
+CLEAN = os.path.join(PROC, "player_ratings_cleaned")
+CACHE_DIR = os.path.join(PROC, "_cache")
+
+META_COLUMNS = ["date", "match", "competition", "team", "player_name",
+                "pos", "pos_role", "minutesPlayed", "rating"]
+CLEANING_VERSION = 1   # bump when clean_features() changes
+CLIP = 1e6
+KEEP_DATASETS = 3
+
+_OPEN = {}   # directory -> Dataset, so one process maps each cache once
+
+
+def clean_features(X):
+    """The cleanup every script used to repeat: ±inf → NaN, NaN → column median,
+    values clipped to ±1e6. Returns one float matrix (float32 unless a column is wider)."""
+    X = X.replace([np.inf, -np.inf], np.nan)
+    X = X.fillna(X.median())
+    wide = any(dt.itemsize > 4 and dt.kind in "fiu" for dt in X.dtypes)
+    arr = X.to_numpy(dtype=np.float64 if wide else np.float32)
+    np.clip(arr, -CLIP, CLIP, out=arr)
+    return arr
+
+
+# ── source digests ──
+def _digests_path(cache_dir):
+    return os.path.join(cache_dir, "digests.json")
+
+
+def files_digest(files, cache_dir=CACHE_DIR):
+    """Content hash of a list of files, each digest memoised by size + mtime."""
+    memo_path = _digests_path(cache_dir)
+    try:
+        with open(memo_path) as f:
+            memo = json.load(f)
+    except (OSError, ValueError):
+        memo = {}
+    h = hashlib.sha256()
+    changed = False
+    for f in files:
+        st = os.stat(f)
+        stamp = f"{st.st_size}:{st.st_mtime_ns}"
+        entry = memo.get(os.path.abspath(f))
+        if not entry or entry["stamp"] != stamp:
+            entry = {"stamp": stamp, "sha256": file_digest(f)}
+            memo[os.path.abspath(f)] = entry
+            changed = True
+        h.update(entry["sha256"].encode())
+    if changed:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{memo_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(memo, f, indent=1)
+        os.replace(tmp, memo_path)
+    return h.hexdigest()
+
+
+def table_digest(path, cache_dir=CACHE_DIR):
+    """Content hash of a table (all of its part files), memoised by size + mtime."""
+    return files_digest(table_files(path), cache_dir)
+
+
+# ── cache housekeeping ──
+def touch(directory):
+    """Mark a cache directory as just used (its mtime orders prune())."""
+    try:
+        os.utime(directory)
+    except OSError:
+        pass
+
+
+def prune(cache_dir, prefix, keep, protect=()):
+    """Remove all but the `keep` most recently used `prefix`* directories of `cache_dir`.
+
+    Directories in `protect` and unfinished *.tmp writes are never removed.
+    Returns the removed paths.
+    """
+    try:
+        names = os.listdir(cache_dir)
+    except FileNotFoundError:
+        return []
+    dirs = [os.path.join(cache_dir, n) for n in names
+            if n.startswith(prefix) and not n.endswith(".tmp")]
+    dirs = sorted((d for d in dirs if os.path.isdir(d)), key=os.path.getmtime, reverse=True)
+    protect = {os.path.abspath(d) for d in protect}
+    removed = [d for d in dirs[keep:] if os.path.abspath(d) not in protect]
+    for d in removed:
+        shutil.rmtree(d, ignore_errors=True)
+    return removed
+
+
+class Dataset:
+    """Read-only view of one cached, split dataset."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "info.json")) as f:
+            self.info = json.load(f)
+        self.columns = self.info["columns"]
+        self.n_train = self.info["n_train"]
+        self.X = np.load(os.path.join(directory, "X.npy"), mmap_mode="r")
+        self.y = np.load(os.path.join(directory, "y.npy"), mmap_mode="r")
+        self.train_idx = np.load(os.path.join(directory, "train_idx.npy"))
+        self.test_idx = np.load(os.path.join(directory, "test_idx.npy"))
+        self._meta = None
+
+    def __len__(self):
+        return len(self.y)
+
+    def _rows(self, part):
+        if part == "train":
+            return slice(0, self.n_train)
+        if part == "test":
+            return slice(self.n_train, None)
+        raise ValueError(f"part must be 'train', 'test' or 'all', not {part!r}")
+
+    @property
+    def original_order(self):
+        """Positions in the cached layout of the rows in original table order."""
+        inv = np.empty(len(self), dtype=np.intp)
+        inv[np.concatenate([self.train_idx, self.test_idx])] = np.arange(len(self))
+        return inv
+
+    def features(self, part="train"):
+        """Feature frame for 'train'/'test' (zero-copy views) or 'all' (original row order, a copy)."""
+        X = self.X[self.original_order] if part == "all" else self.X[self._rows(part)]
+        return pd.DataFrame(X, columns=self.columns, copy=False)
+
+    def target(self, part="train"):
+        if part == "all":
+            return np.asarray(self.y[self.original_order])
+        return self.y[self._rows(part)]
+
+    def split(self):
+        """(X_train, X_test, y_train, y_test) — what train_test_split(..., random_state=42) returned."""
+        return (self.features("train"), self.features("test"),
+                self.target("train"), self.target("test"))
+
+    def meta(self, part="test", columns=None):
+        """Context columns (pos, competition, …) aligned with features(part)."""
+        if self._meta is None:
+            path = os.path.join(self.directory, "meta.parquet")
+            if not os.path.isfile(path):
+                raise FileNotFoundError("no cleaned-rows table was available when this dataset "
+                                        "was cached; re-run prepare_data.py")
+            self._meta = pd.read_parquet(path)
+        meta = self._meta if columns is None else self._meta[columns]
+        if part == "all":
+            return meta.iloc[self.original_order].reset_index(drop=True)
+        return meta.iloc[self._rows(part)].reset_index(drop=True)
+
+
+def _build(directory, feat, target, clean, test_size, random_state, info):
+    X_df = read_table(feat)
+    y = read_table(target, columns=["rating"])["rating"].to_numpy(dtype=np.float64)
+    if len(X_df) != len(y):
+        raise ValueError(f"{feat} has {len(X_df)} rows but {target} has {len(y)}")
+    columns = X_df.columns.tolist()
+    X = clean_features(X_df)
+    del X_df
+
+    train_idx, test_idx = train_test_split(np.arange(len(y)), test_size=test_size,
+                                           random_state=random_state)
+    order = np.concatenate([train_idx, test_idx])
+
+    tmp = f"{directory}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    out = np.lib.format.open_memmap(os.path.join(tmp, "X.npy"), mode="w+",
+                                    dtype=X.dtype, shape=X.shape)
+    for start in range(0, len(order), 65_536):   # bounded temporaries while permuting
+        out[start:start + 65_536] = X[order[start:start + 65_536]]
+    out.flush()
+    del out
+    np.save(os.path.join(tmp, "y.npy"), y[order])
+    np.save(os.path.join(tmp, "train_idx.npy"), train_idx)
+    np.save(os.path.join(tmp, "test_idx.npy"), test_idx)
+    if clean is not None:
+        cols = [c for c in META_COLUMNS if c in read_columns(clean)]
+        meta = read_table(clean, columns=cols)
+        if len(meta) != len(y):
+            raise ValueError(f"{clean} has {len(meta)} rows but the features have {len(y)}")
+        meta.iloc[order].reset_index(drop=True).to_parquet(os.path.join(tmp, "meta.parquet"),
+                                                           index=False)
+    info.update(columns=columns, n_train=len(train_idx), n_test=len(test_idx),
+                dtype=str(X.dtype))
+    with open(os.path.join(tmp, "info.json"), "w") as f:
+        json.dump(info, f, indent=2)
+    try:
+        os.rename(tmp, directory)
+    except OSError:   # another process finished the same cache first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load_dataset(feat=FEAT, target=TARGET, clean=CLEAN, test_size=0.2, random_state=42,
+                 cache_dir=CACHE_DIR, refresh=False, keep=KEEP_DATASETS):
+    """The cleaned, split dataset for these sources, building its cache on first use.
+
+    Building one prunes the cached datasets beyond the `keep` most recently used.
+    """
+    clean = clean if clean and exists(clean) else None
+    sources = {"features": table_digest(feat, cache_dir), "target": table_digest(target, cache_dir)}
+    if clean:
+        sources["cleaned"] = table_digest(clean, cache_dir)
+    info = {"sources": sources, "test_size": test_size, "random_state": random_state,
+            "cleaning_version": CLEANING_VERSION}
+    key = hashlib.sha256(json.dumps(info, sort_keys=True).encode()).hexdigest()[:16]
+    directory = os.path.join(cache_dir, f"dataset-{key}")
+
+    if refresh and os.path.isdir(directory):
+        _OPEN.pop(directory, None)
+        shutil.rmtree(directory)
+    if directory in _OPEN:
+        return _OPEN[directory]
+    if not os.path.isdir(directory):
+        print(f"Building dataset cache {directory}")
+        os.makedirs(cache_dir, exist_ok=True)
+        _build(directory, feat, target, clean, test_size, random_state, info)
+        # a removed cache stays readable to processes that have it mapped
+        for old in prune(cache_dir, "dataset-", keep, protect=[directory, *_OPEN]):
+            print(f"Removed stale dataset cache {old}")
+    else:
+        touch(directory)
+    _OPEN[directory] = ds = Dataset(directory)
+    return ds
@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+# hashing.py
+#
+# Content hashes used to decide whether pipeline inputs changed.
+
+import hashlib
+
+BLOCK_SIZE = 1 << 20
+
+
+def file_digest(path, algo="sha256"):
+    """Hex digest of a file's contents, read in 1 MiB blocks."""
+    h = hashlib.new(algo)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
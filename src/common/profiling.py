@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# profiling.py
+#
+# Opt-in instrumentation for the pipeline scripts: named timing spans, Python
+# heap peaks and per-stage cProfile dumps.
+#
+# Nothing is measured unless RATER_PROFILE is set. It takes a comma-separated
+# list of modes:
+#
+#   RATER_PROFILE=1                  wall/CPU time of every span
+#   RATER_PROFILE=memory             … plus the tracemalloc heap peak per span
+#   RATER_PROFILE=cprofile           … plus a cProfile dump per stage
+#   RATER_PROFILE=memory,cprofile    both
+#
+# Each finished span (and each stage as a whole) is appended as one JSON line
+# to reports/profile/profile.jsonl (RATER_PROFILE_DIR overrides the directory).
+# cProfile dumps go next to it as <stage>-<run>.prof. Records of one run share
+# a "run" id, which run_pipeline.py passes on to every stage it starts.
+#
+#   with profiling.stage("prepare"):
+#       with profiling.span("read_merged") as sp:
+#           df = read_table(path)
+#           sp.set(rows=len(df))
+#
+# When profiling is off, span() and stage() return one shared no-op object, so
+# leaving them in hot paths costs a function call and an attribute lookup.
+#
+#   python src/common/profiling.py [reports/profile/profile.jsonl] [--run ID]
+#
+# prints the recorded spans of the latest (or given) run, slowest first.
+
+import os
+import sys
+import json
+import time
+import argparse
+import warnings
+import tracemalloc
+
+ENV = "RATER_PROFILE"
+DIR_ENV = "RATER_PROFILE_DIR"
+RUN_ENV = "RATER_PROFILE_RUN"
+PROFILE_DIR = os.path.join("reports", "profile")
+LOG_NAME = "profile.jsonl"
+MODES = ("spans", "memory", "cprofile")
+
+
+def _modes(value):
+    """Modes switched on by an RATER_PROFILE value (empty, "0", "off" → none)."""
+    value = (value or "").strip().lower()
+    if value in ("", "0", "off", "false", "no"):
+        return frozenset()
+    modes = {"spans"}
+    for part in value.split(","):
+        part = part.strip()
+        if part in MODES:
+            modes.add(part)
+        elif part not in ("1", "on", "true", "yes"):
+            raise ValueError(f"{ENV}: unknown mode {part!r} (expected some of {', '.join(MODES)})")
+    return frozenset(modes)
+
+
+class _Null:
+    """What span()/stage() hand out when profiling is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+NULL = _Null()
+
+
+class _Profiler:
+    """Process-wide profiling state: the active modes, output file and span stack."""
+
+    def __init__(self, modes, directory, run):
+        self.modes = modes
+        self.directory = directory
+        self.run = run
+        self.stack = []           # open spans, innermost last
+        self.stage = None
+        self._log = None
+
+    def write(self, record):
+        if self._log is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._log = open(os.path.join(self.directory, LOG_NAME), "a", buffering=1)
+        self._log.write(json.dumps(record, default=str) + "\n")
+
+    def close(self):
+        if "memory" in self.modes and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+_state = None
+
+
+def configure(modes=None, directory=None, run=None):
+    """(Re)initialise profiling; by default from the environment. Returns the active modes."""
+    global _state
+    if _state is not None:
+        _state.close()
+    modes = _modes(os.environ.get(ENV)) if modes is None else _modes(",".join(modes) or "0")
+    if not modes:
+        _state = None
+        return modes
+    directory = directory or os.environ.get(DIR_ENV) or PROFILE_DIR
+    run = run or os.environ.get(RUN_ENV) or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    _state = _Profiler(modes, directory, run)
+    return modes
+
+
+def enabled(mode="spans"):
+    return _state is not None and mode in _state.modes
+
+
+def run_id():
+    """Id shared by the records of this run (None when profiling is off)."""
+    return _state.run if _state is not None else None
+
+
+class Span:
+    """One timed region; `set()` attaches fields (row counts, shapes, …) to its record."""
+
+    def __init__(self, state, name, fields):
+        self.state = state
+        self.name = name
+        self.fields = fields
+        self.peak = 0             # heap peak of finished children, see __exit__
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        state = self.state
+        self.path = "/".join([s.name for s in state.stack if not isinstance(s, Stage)] + [self.name])
+        if "memory" in state.modes:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            current, peak = tracemalloc.get_traced_memory()
+            if state.stack:       # the parent's peak so far, before we reset the counter
+                state.stack[-1].peak = max(state.stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.heap_start = current
+        state.stack.append(self)
+        self.cpu0 = time.process_time()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        wall = time.perf_counter() - self.t0
+        cpu = time.process_time() - self.cpu0
+        state = self.state
+        state.stack.pop()
+        record = {"run": state.run, "stage": state.stage, "span": self.path,
+                  "wall_s": round(wall, 6), "cpu_s": round(cpu, 6)}
+        if "memory" in state.modes and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak = max(self.peak, peak)
+            record["heap_peak_mb"] = round(self.peak / 2**20, 3)
+            record["heap_delta_mb"] = round((current - self.heap_start) / 2**20, 3)
+            if state.stack:
+                state.stack[-1].peak = max(state.stack[-1].peak, self.peak)
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        record.update(self.fields)
+        state.write(record)
+        return False
+
+
+def span(name, **fields):
+    """Context manager timing the enclosed block as `name` (nested spans get a/b paths)."""
+    if _state is None:
+        return NULL
+    return Span(_state, name, fields)
+
+
+class Stage(Span):
+    """A whole script run: the outermost span, plus cProfile when requested."""
+
+    def __enter__(self):
+        state = self.state
+        state.stage = self.name
+        self.profile = None
+        if "cprofile" in state.modes:
+            import cProfile
+            self.profile = cProfile.Profile()
+        super().__enter__()
+        self.path = "total"
+        if self.profile is not None:
+            self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if self.profile is not None:
+            self.profile.disable()
+            os.makedirs(self.state.directory, exist_ok=True)
+            path = os.path.join(self.state.directory, f"{self.name}-{self.state.run}.prof")
+            self.profile.dump_stats(path)
+            self.fields["cprofile"] = path
+        self.fields["pid"] = os.getpid()
+        return super().__exit__(exc_type, *exc)
+
+
+def stage(name, **fields):
+    """Context manager for a script's main work; its spans are recorded under `name`."""
+    if _state is None:
+        return NULL
+    return Stage(_state, name, fields)
+
+
+try:
+    configure()
+except ValueError as e:     # a typo in RATER_PROFILE must not break every script at import
+    warnings.warn(f"{e}; profiling is off")
+
+
+# ── Reading the log back ────────────────────────────────────────────────────
+
+def load_records(path, run=None):
+    """Records of one run from a profile log (the latest run when `run` is None)."""
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records:
+        return []
+    run = run or records[-1]["run"]
+    return [r for r in records if r["run"] == run]
+
+
+def summarize(records):
+    """Per (stage, span): calls and total wall/CPU seconds, max heap peak; slowest first."""
+    rows = {}
+    for r in records:
+        key = (r["stage"], r["span"])
+        row = rows.setdefault(key, {"stage": r["stage"], "span": r["span"], "calls": 0,
+                                    "wall_s": 0.0, "cpu_s": 0.0, "heap_peak_mb": None})
+        row["calls"] += 1
+        row["wall_s"] += r["wall_s"]
+        row["cpu_s"] += r["cpu_s"]
+        if r.get("heap_peak_mb") is not None:
+            row["heap_peak_mb"] = max(row["heap_peak_mb"] or 0.0, r["heap_peak_mb"])
+    return sorted(rows.values(), key=lambda row: -row["wall_s"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise recorded profiling spans.")
+    parser.add_argument("log", nargs="?", default=os.path.join(PROFILE_DIR, LOG_NAME))
+    parser.add_argument("--run", default=None, help="run id (default: the latest run in the log)")
+    parser.add_argument("--limit", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    records = load_records(args.log, args.run)
+    if not records:
+        print(f"No records in {args.log}")
+        return 1
+    print(f"Run {records[0]['run']}: {len(records)} records")
+    print(f"{'stage':<10} {'span':<44} {'calls':>6} {'wall s':>9} {'cpu s':>9} {'heap MB':>9}")
+    for row in summarize(records)[:args.limit]:
+        heap = f"{row['heap_peak_mb']:9.1f}" if row["heap_peak_mb"] is not None else f"{'-':>9}"
+        print(f"{str(row['stage']):<10} {row['span']:<44} {row['calls']:>6} "
+              f"{row['wall_s']:9.3f} {row['cpu_s']:9.3f} {heap}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# storage.py
+#
+# Shared table storage for every pipeline stage.
+#
+# Tables are addressed by a *stem* (a path without extension, e.g.
+# data/processed/player_ratings_features). A stem resolves to, in order:
+#   1. a dataset directory   <stem>/part-*.parquet|csv
+#   2. a Parquet file        <stem>.parquet
+#   3. a CSV file            <stem>.csv
+# Parquet (pyarrow, zstd) keeps dtypes such as `category` across stages and
+# supports column projection; CSV is kept as a fallback for compatibility.
+# Set RATER_STORAGE_FORMAT=csv to force the old text hand-off.
+
+import os
+import glob
+import shutil
+import warnings
+
+import pandas as pd
+
+FORMATS = ("parquet", "csv")
+DEFAULT_FORMAT = os.environ.get("RATER_STORAGE_FORMAT", "parquet").lower()
+PARQUET_COMPRESSION = "zstd"
+
+_EXT = {"parquet": ".parquet", "csv": ".csv"}
+
+
+def _have_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _pick_format(fmt):
+    fmt = (fmt or DEFAULT_FORMAT).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown storage format '{fmt}' (expected one of {FORMATS})")
+    if fmt == "parquet" and not _have_pyarrow():
+        warnings.warn("pyarrow not installed — falling back to CSV storage")
+        fmt = "csv"
+    return fmt
+
+
+def stem_of(path):
+    """Strip a known table extension so '.csv' / '.parquet' paths and stems are interchangeable."""
+    root, ext = os.path.splitext(path)
+    return root if ext.lower() in _EXT.values() else path
+
+
+def candidates(path):
+    """All on-disk locations a table path may refer to, in resolution order."""
+    stem = stem_of(path)
+    return [stem, stem + ".parquet", stem + ".csv"]
+
+
+def resolve(path):
+    """Return the existing file/directory backing `path`, or raise FileNotFoundError."""
+    if os.path.isfile(path):
+        return path
+    for cand in candidates(path):
+        if os.path.isdir(cand) and _part_files(cand):
+            return cand
+        if os.path.isfile(cand):
+            return cand
+    raise FileNotFoundError(f"No table found for '{path}' (tried {', '.join(candidates(path))})")
+
+
+def exists(path):
+    try:
+        resolve(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def table_files(path):
+    """The file(s) backing a table: its part files for a dataset directory."""
+    src = resolve(path)
+    return _part_files(src) if os.path.isdir(src) else [src]
+
+
+def _part_files(directory):
+    parts = glob.glob(os.path.join(directory, "**", "part-*.parquet"), recursive=True)
+    parts += glob.glob(os.path.join(directory, "**", "part-*.csv"), recursive=True)
+    return sorted(parts)
+
+
+def _read_file(path, columns=None):
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+def read_table(path, columns=None, partitions=None):
+    """Read a table by stem or explicit path; `columns` projects at read time.
+
+    For dataset directories `partitions` restricts the read to those partition names.
+    """
+    src = resolve(path)
+    if os.path.isdir(src):
+        dirs = [src] if partitions is None else [os.path.join(src, p) for p in partitions]
+        frames = [_read_file(p, columns) for d in dirs for p in _part_files(d)]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+    return _read_file(src, columns)
+
+
+def _iter_file(path, chunk_rows, columns=None):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+
+
+def iter_table(path, chunk_rows=100_000, columns=None):
+    """Yield a table as DataFrames of at most `chunk_rows` rows, in storage order.
+
+    Only one chunk is materialised at a time, so memory stays flat however
+    large the table is.
+    """
+    for f in table_files(path):
+        yield from _iter_file(f, chunk_rows, columns)
+
+
+def read_columns(path):
+    """Column names of a table without loading its rows."""
+    src = resolve(path)
+    if os.path.isdir(src):
+        src = _part_files(src)[0]
+    if src.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return pq.read_schema(src).names
+    return pd.read_csv(src, nrows=0).columns.tolist()
+
+
+def _write_file(df, path, fmt):
+    if fmt == "parquet":
+        df.to_parquet(path, engine="pyarrow", compression=PARQUET_COMPRESSION, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def remove_table(path):
+    """Delete every representation of a table (directory, Parquet and CSV)."""
+    for cand in candidates(path):
+        if os.path.isdir(cand):
+            shutil.rmtree(cand)
+        elif os.path.isfile(cand):
+            os.remove(cand)
+
+
+def write_table(df, path, fmt=None):
+    """Write `df` as the single current version of a table and return the file path.
+
+    Any other representation of the same stem is removed so a stale CSV can
+    never shadow (or be shadowed by) a fresh Parquet file.
+    """
+    fmt = _pick_format(fmt)
+    out = stem_of(path) + _EXT[fmt]
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    remove_table(path)
+    _write_file(df, out, fmt)
+    return out
+
+
+def list_partitions(path):
+    """Partition directory names of a dataset table, in read order."""
+    stem = stem_of(path)
+    if not os.path.isdir(stem):
+        return []
+    return sorted(d for d in os.listdir(stem)
+                  if os.path.isdir(os.path.join(stem, d)) and _part_files(os.path.join(stem, d)))
+
+
+def partition_signature(path, partition):
+    """Cheap change detector for one partition: its part files' names, sizes and mtimes."""
+    files = _part_files(os.path.join(stem_of(path), partition))
+    return ";".join(f"{os.path.basename(f)}:{os.path.getsize(f)}:{os.stat(f).st_mtime_ns}"
+                    for f in files)
+
+
+def append_partition(df, path, partition, fmt=None):
+    """Add `df` as partition `partition` (e.g. 'batch=2018-05-12') of a dataset table.
+
+    The table becomes a directory; single-file versions of the same stem are
+    removed so readers see one consistent dataset. Partitions are read back in
+    sorted name order, so name them so that they sort chronologically.
+    """
+    fmt = _pick_format(fmt)
+    stem = stem_of(path)
+    for cand in candidates(path)[1:]:
+        if os.path.isfile(cand):
+            os.remove(cand)
+    part_dir = os.path.join(stem, partition)
+    os.makedirs(part_dir, exist_ok=True)
+    n = len(_part_files(part_dir))
+    out = os.path.join(part_dir, f"part-{n:05d}{_EXT[fmt]}")
+    _write_file(df, out, fmt)
+    return out
+
+
+class TableWriter:
+    """Append DataFrame chunks to one table without holding them all in memory.
+
+    Parquet chunks become row groups of a single file (schema fixed by the
+    first chunk); CSV chunks are appended with a single header.
+    """
+
+    def __init__(self, path, fmt=None):
+        self.fmt = _pick_format(fmt)
+        self.path = stem_of(path) + _EXT[self.fmt]
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        remove_table(path)
+
+    def write(self, df):
+        if df.empty:
+            return
+        if self.fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self._writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self._schema = table.schema
+                self._writer = pq.ParquetWriter(self.path, self._schema,
+                                                compression=PARQUET_COMPRESSION)
+            else:
+                table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+            self._writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode="a", header=self.rows == 0, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
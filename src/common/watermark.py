@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# watermark.py
+#
+# High-water marks for incremental stages. A watermark is a small JSON file
+# recording how far a stage got (e.g. the last match date it processed) and
+# the content hashes of the sources it was computed from.
+
+import os
+import json
+import datetime as dt
+
+STATE_DIR = os.path.join("data", "processed", "_state")
+
+
+def watermark_path(stage, state_dir=STATE_DIR):
+    return os.path.join(state_dir, f"{stage}_watermark.json")
+
+
+def load_watermark(path):
+    """Return the stored watermark dict, or None if the stage never ran incrementally."""
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_watermark(path, **fields):
+    """Atomically replace the watermark with `fields` plus an update timestamp."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fields["updated_at"] = dt.datetime.now().isoformat(timespec="seconds")
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(fields, f, indent=2, default=str)
+    os.replace(tmp, path)
+    return fields
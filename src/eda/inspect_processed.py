@@ -1,32 +1,47 @@
 #!/usr/bin/env python3
 
-import os, pandas as pd, datetime as dt, textwrap
+import os, sys, datetime as dt, textwrap
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.storage import read_columns, read_table, stem_of
 
 PROC_DIR = os.path.join('data', 'processed')
 
-# Identify canonical filenames used in the pipeline
-FEATURE_FILE = 'player_ratings_features.csv'
-TARGET_FILE  = 'player_ratings_target.csv'
-
-if not os.path.isdir(PROC_DIR):
-    raise SystemExit(f"Processed directory not found: {PROC_DIR}")
-
-print("Processed CSV summary\n" + "="*40)
-for fname in sorted(os.listdir(PROC_DIR)):
-    if not fname.endswith('.csv'):  # skip non‑csv
-        continue
-    fpath = os.path.join(PROC_DIR, fname)
-    mtime = dt.datetime.fromtimestamp(os.path.getmtime(fpath)).strftime('%Y‑%m‑%d %H:%M:%S')
-    df = pd.read_csv(fpath, nrows=5)  
-    full_shape = pd.read_csv(fpath, usecols=[0]).shape  
-    tag = ''
-    if fname == FEATURE_FILE:
-        tag = '<< FEATURES (X) used for model'
-    elif fname == TARGET_FILE:
-        tag = '<< TARGET (y) used for model'
-    print(f"{fname:30}  shape={full_shape[0]}x{len(df.columns)}  modified={mtime} {tag}")
-    # show first 5 columns
-    cols_preview = ', '.join(df.columns[:5]) + ('...' if len(df.columns) > 5 else '')
-    print("   cols: " + textwrap.shorten(cols_preview, width=120))
-
-print("\nNote: The model is always trained on \"player_ratings_features.csv\" (X) and \"player_ratings_target.csv\" (y).\n")
+# Identify canonical table stems used in the pipeline
+FEATURE_FILE = 'player_ratings_features'
+TARGET_FILE  = 'player_ratings_target'
+
+
+def main():
+    if not os.path.isdir(PROC_DIR):
+        raise SystemExit(f"Processed directory not found: {PROC_DIR}")
+
+    print("Processed table summary\n" + "="*40)
+    for fname in sorted(os.listdir(PROC_DIR)):
+        fpath = os.path.join(PROC_DIR, fname)
+        if not (fname.endswith(('.csv', '.parquet')) or os.path.isdir(fpath)):
+            continue
+        mtime = dt.datetime.fromtimestamp(os.path.getmtime(fpath)).strftime('%Y‑%m‑%d %H:%M:%S')
+        try:
+            columns = read_columns(fpath)
+        except (FileNotFoundError, IndexError):  # directory without table parts
+            continue
+        n_rows = len(read_table(fpath, columns=columns[:1]))  # project one column for the row count
+        tag = ''
+        if stem_of(fname) == FEATURE_FILE:
+            tag = '<< FEATURES (X) used for model'
+        elif stem_of(fname) == TARGET_FILE:
+            tag = '<< TARGET (y) used for model'
+        print(f"{fname:30}  shape={n_rows}x{len(columns)}  modified={mtime} {tag}")
+        # show first 5 columns
+        cols_preview = ', '.join(columns[:5]) + ('...' if len(columns) > 5 else '')
+        print("   cols: " + textwrap.shorten(cols_preview, width=120))
+
+    print("\nNote: The model is always trained on \"player_ratings_features\" (X) and \"player_ratings_target\" (y).\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,23 @@
 #!/usr/bin/env python3
 
 import os
-import pandas as pd
+import sys
 import numpy as np
 
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.storage import read_table
+
 
 
 def main():
     # Path to cleaned data
-    DATA_CSV = os.path.join('data', 'processed', 'player_ratings_cleaned.csv')
+    DATA = os.path.join('data', 'processed', 'player_ratings_cleaned')
 
     # Load the cleaned dataset
-    df = pd.read_csv(DATA_CSV)
+    df = read_table(DATA)
 
     # 1) Basic info
     print(f"Dataset shape: {df.shape[0]} rows, {df.shape[1]} columns")
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# prediction_store.py
+#
+# Saved predictions, so reporting scripts stop re-running the same model on
+# the same rows.
+#
+# Predictions are stored per model artifact, under
+# data/processed/_cache/predictions/<model>/, where <model> hashes the
+# artifact's bytes (a .pkl, or every file of a .forest directory) together
+# with the feature column names:
+#
+#   <key>.npy     predictions for one named input, in row order, e.g.
+#                 "dataset-<hash>-test" for a cached split. A hit is one
+#                 np.load; the model is not even loaded.
+#   rows/         row_hash → prediction for every row this model has scored,
+#                 one part-*.parquet per call that predicted anything. When a
+#                 key is new (or no key is given), each input row is hashed
+#                 and only the rows missing here are predicted. Appending
+#                 writes only the new rows, under a name no other writer
+#                 uses; past COMPACT_PARTS parts they are merged into one.
+#
+# Invalidation is by construction. A retrained model has new bytes, hence a
+# new directory. A re-prepared dataset has a new dataset-<hash>, hence new
+# keys. Changed feature rows hash differently and are recomputed. A new model
+# directory prunes all but the KEEP_MODELS most recently used ones.
+
+import os
+import glob
+import json
+import time
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from common.dataset import CACHE_DIR, files_digest, prune, touch
+from model.forest_arrays import load_forest_or_model
+
+PRED_DIR = os.path.join(CACHE_DIR, "predictions")
+ROWS_DIR = "rows"
+COMPACT_PARTS = 32
+KEEP_MODELS = 16    # the position router alone scores with one model per position
+
+
+def artifact_files(path):
+    """Files whose bytes define a model artifact (a file, or a directory's files)."""
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, f) for f in os.listdir(path))
+    return [path]
+
+
+def row_hashes(X):
+    """One uint64 per row from the row's values (column order matters, the index does not)."""
+    if not isinstance(X, pd.DataFrame):
+        X = pd.DataFrame(np.asarray(X))
+    return pd.util.hash_pandas_object(X, index=False).to_numpy(dtype=np.uint64)
+
+
+def _atomic(path, write):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _save_npy(path, array):
+    with open(path, "wb") as f:      # a file object: np.save would append ".npy" to a name
+        np.save(f, array)
+
+
+class PredictionStore:
+    """Predictions keyed by (model artifact hash, input key), with per-row partial hits."""
+
+    def __init__(self, cache_dir=PRED_DIR, loader=load_forest_or_model, keep=KEEP_MODELS):
+        self.cache_dir = cache_dir
+        self.loader = loader
+        self.keep = keep
+        self.last = {}    # what the latest predict() served from where
+
+    def model_dir(self, model_path, columns):
+        digest = files_digest(artifact_files(model_path), os.path.dirname(self.cache_dir))
+        cols = hashlib.sha256(json.dumps([str(c) for c in columns]).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest[:16]}-{cols[:8]}")
+
+    def _create(self, directory):
+        """Make a model's directory if it is new, pruning the least recently used others."""
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+            prune(self.cache_dir, "", self.keep, protect=[directory])
+
+    def _load_rows(self, directory):
+        """(row_hash → prediction, the part files read)."""
+        parts = sorted(glob.glob(os.path.join(directory, ROWS_DIR, "part-*.parquet")))
+        if not parts:
+            return pd.Series(dtype=np.float64, index=pd.Index([], dtype=np.uint64)), parts
+        rows = pd.concat([pd.read_parquet(p) for p in parts], ignore_index=True)
+        known = pd.Series(rows["pred"].to_numpy(), index=rows["row_hash"].to_numpy(np.uint64))
+        return known[~known.index.duplicated(keep="last")], parts
+
+    def _write_part(self, directory, rows):
+        name = f"part-{time.time_ns():020d}-{os.getpid()}.parquet"   # oldest first, unique per writer
+        frame = pd.DataFrame({"row_hash": rows.index.to_numpy(np.uint64),
+                              "pred": rows.to_numpy(np.float64)})
+        _atomic(os.path.join(directory, ROWS_DIR, name),
+                lambda tmp: frame.to_parquet(tmp, index=False, engine="pyarrow"))
+
+    def _save_rows(self, directory, known, parts, hashes, preds):
+        """Append the new rows as their own part; merge the parts once there are too many."""
+        new = pd.Series(preds, index=hashes)
+        new = new[~new.index.duplicated()]
+        os.makedirs(os.path.join(directory, ROWS_DIR), exist_ok=True)
+        if len(parts) + 1 < COMPACT_PARTS:
+            self._write_part(directory, new)
+            return
+        merged = pd.concat([known, new])
+        self._write_part(directory, merged[~merged.index.duplicated(keep="last")])
+        for p in parts:          # parts other writers added meanwhile are not in `parts`
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+    def predict(self, model_path, X, key=None, model=None, loader=None):
+        """Predictions of the model at `model_path` for `X`, computing only what is not stored.
+
+        `key` names this exact input (same rows, same order) for a whole-array
+        hit next time. `model` is used instead of loading `model_path` when the
+        caller already holds it; `loader` replaces the store's loader for this call.
+        """
+        columns = list(X.columns) if isinstance(X, pd.DataFrame) else list(range(np.shape(X)[1]))
+        directory = self.model_dir(model_path, columns)
+        entry = os.path.join(directory, f"{key}.npy") if key else None
+        if os.path.isdir(directory):
+            touch(directory)
+        if entry and os.path.isfile(entry):
+            preds = np.load(entry)
+            if len(preds) == len(X):
+                self.last = {"source": "key", "hits": len(X), "computed": 0}
+                return preds
+
+        hashes = row_hashes(X)
+        known, parts = self._load_rows(directory)
+        found = known.reindex(hashes).to_numpy()
+        missing = np.isnan(found)
+        if missing.any():
+            model = model if model is not None else (loader or self.loader)(model_path)
+            rows = np.flatnonzero(missing)
+            part = X.iloc[rows] if isinstance(X, pd.DataFrame) else np.asarray(X)[rows]
+            found[rows] = model.predict(part)
+            self._create(directory)
+            self._save_rows(directory, known, parts, hashes[rows], found[rows])
+        if entry:
+            self._create(directory)
+            _atomic(entry, lambda tmp: _save_npy(tmp, found))
+        self.last = {"source": "rows", "hits": int(len(X) - missing.sum()),
+                     "computed": int(missing.sum())}
+        return found
+
+    def predict_split(self, ds, part, model_path, model=None):
+        """Predictions for `ds.features(part)` of a cached Dataset, keyed by the dataset and part."""
+        key = f"{os.path.basename(ds.directory)}-{part}"
+        return self.predict(model_path, ds.features(part), key=key, model=model)
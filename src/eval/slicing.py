@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# slicing.py
+#
+# Sliced error metrics in one pass per grouping.
+#
+# Every requested grouping — a single key such as `pos`, or a cross such as
+# ("pos", "band") — is reduced to one integer code per row: each key is
+# factorized, and the codes of a cross are combined with ravel_multi_index.
+# n, MAE, RMSE and bias (mean of pred - true) then come from four
+# np.bincount calls over the residuals. The cost is O(rows) per grouping,
+# however many competitions or positions there are, instead of one boolean
+# mask over the whole set per group.
+#
+# The result is one long table with a row per (slice, group): a `slice`
+# column naming the grouping ("pos", "pos × band", …), one column per key
+# (empty where the key is not part of that slice), then n, mae, rmse, bias.
+# format_slice() renders one slice as text-report lines.
+
+import numpy as np
+import pandas as pd
+
+# rating bands the evaluation scripts report on: (label, lo, hi), lo inclusive
+BANDS = [
+    ("≈6", 5.75, 6.25),
+    ("≈7", 6.75, 7.25),
+    ("≥8", 7.75, 10.1),
+]
+METRICS = ("n", "mae", "rmse", "bias")
+CROSS = " × "
+
+
+def assign_bands(values, bands=BANDS):
+    """Band label of every value (NaN outside all bands), as an ordered Categorical.
+
+    `bands` are non-overlapping (label, lo, hi) with lo inclusive and hi exclusive.
+    """
+    bands = sorted(bands, key=lambda b: b[1])
+    edges = np.array([e for _, lo, hi in bands for e in (lo, hi)], dtype=np.float64)
+    if np.any(np.diff(edges) < 0):
+        raise ValueError("bands overlap")
+    pos = np.searchsorted(edges, np.asarray(values, dtype=np.float64), side="right")
+    inside = pos % 2 == 1                  # between a band's lo and hi
+    codes = np.where(inside, (pos - 1) // 2, -1)
+    return pd.Categorical.from_codes(codes, categories=[label for label, _, _ in bands],
+                                     ordered=True)
+
+
+def _factorize(values):
+    """Integer codes (-1 for missing) and the uniques, keeping categorical order."""
+    if isinstance(values, pd.Categorical) or isinstance(getattr(values, "dtype", None),
+                                                        pd.CategoricalDtype):
+        cat = pd.Categorical(values)
+        return np.asarray(cat.codes, dtype=np.int64), np.asarray(cat.categories, dtype=object)
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object), sort=True)
+    return codes.astype(np.int64), np.asarray(uniques, dtype=object)
+
+
+def _group_metrics(codes, n_groups, err):
+    n = np.bincount(codes, minlength=n_groups).astype(np.float64)
+    s = np.bincount(codes, weights=err, minlength=n_groups)
+    a = np.bincount(codes, weights=np.abs(err), minlength=n_groups)
+    q = np.bincount(codes, weights=err * err, minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return n, a / n, np.sqrt(q / n), s / n
+
+
+def slice_metrics(y_true, y_pred, keys, slices=None, min_count=1):
+    """Long table of n/MAE/RMSE/bias for every slice.
+
+    keys    mapping (or DataFrame) of key name -> one value per row
+    slices  key names and/or tuples of key names (crosses); default: every key
+            on its own. Rows with a missing value in any key of a slice are
+            left out of that slice.
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    err = np.asarray(y_pred, dtype=np.float64) - y_true
+    if slices is None:
+        slices = list(keys.keys()) if isinstance(keys, dict) else list(keys.columns)
+    factorized = {}
+    frames = []
+    for sl in slices:
+        names = (sl,) if isinstance(sl, str) else tuple(sl)
+        for k in names:
+            if k not in factorized:
+                if len(keys[k]) != len(err):
+                    raise ValueError(f"key '{k}' has {len(keys[k])} values for {len(err)} rows")
+                factorized[k] = _factorize(keys[k])
+        codes = [factorized[k][0] for k in names]
+        dims = tuple(max(1, len(factorized[k][1])) for k in names)
+        valid = np.logical_and.reduce([c >= 0 for c in codes])
+        flat = np.ravel_multi_index([c[valid] for c in codes], dims)
+        # compact the (possibly sparse) crossed ids to the groups actually present
+        present, inverse = np.unique(flat, return_inverse=True)
+        n, mae, rmse, bias = _group_metrics(inverse, len(present), err[valid])
+        frame = pd.DataFrame({"slice": CROSS.join(names)}, index=range(len(present)))
+        for k, c in zip(names, np.unravel_index(present, dims)):
+            frame[k] = factorized[k][1][c]
+        frame = frame.assign(n=n.astype(np.int64), mae=mae, rmse=rmse, bias=bias)
+        frames.append(frame[frame["n"] >= min_count])
+    columns = ["slice"] + list(factorized) + list(METRICS)
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True).reindex(columns=columns)
+
+
+def overall(y_true, y_pred):
+    """n/MAE/RMSE/bias over all rows, as a dict."""
+    err = np.asarray(y_pred, dtype=np.float64) - np.asarray(y_true, dtype=np.float64)
+    n, mae, rmse, bias = _group_metrics(np.zeros(len(err), dtype=np.intp), 1, err)
+    return {"n": int(n[0]), "mae": float(mae[0]), "rmse": float(rmse[0]), "bias": float(bias[0])}
+
+
+def get_slice(table, name):
+    """Rows of one slice, with only its key columns and the metrics."""
+    names = name.split(CROSS) if isinstance(name, str) else list(name)
+    part = table[table["slice"] == CROSS.join(names)]
+    return part[names + list(METRICS)].reset_index(drop=True)
+
+
+def format_slice(table, name, sort_by=None, limit=None, width=3, metrics=("mae",)):
+    """Text-report lines for one slice: "<group>: <mae>  (n=<n>)".
+
+    Groups keep the table's order (sorted keys, band order) unless `sort_by`
+    names a metric; `width` right-aligns short labels and truncates long ones
+    when negative (e.g. -25 → first 25 characters, left-aligned).
+    """
+    part = get_slice(table, name)
+    if sort_by:
+        part = part.sort_values(sort_by, kind="stable")
+    if limit:
+        part = part.head(limit)
+    keys = [c for c in part.columns if c not in METRICS]
+    labels = part[keys].astype(str).agg(CROSS.join, axis=1) if len(part) else []
+    lines = []
+    for label, (_, row) in zip(labels, part.iterrows()):
+        label = f"{label:>{width}}" if width >= 0 else f"{label[:-width]:{-width}}"
+        vals = "  ".join(f"{row['mae']:.4f}" if m == "mae" else f"{m}={row[m]:.4f}" for m in metrics)
+        lines.append(f"{label}: {vals}  (n={int(row['n'])})")
+    return lines
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# feature_engine.py
+#
+# Low-allocation building blocks for FeatureTransformer. Each feature group
+# (pass-through numerics, per-90 rates, one-hot flags) is produced as one
+# pre-allocated NumPy block of the narrowest safe dtype and wrapped in a
+# DataFrame without copying, instead of inserting columns one at a time.
+#
+# float32 is safe for the tree models here: sklearn forests cast X to float32
+# before splitting, so predictions are unchanged. Flags and one-hot columns
+# only hold 0/1 and go to uint8.
+
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+
+def numeric_block(df, columns, fill_values, dtype):
+    """Stack `columns` of `df` into one (rows × columns) array, NaNs replaced by `fill_values`."""
+    block = np.empty((len(df), len(columns)), dtype=dtype)
+    for j, c in enumerate(columns):
+        block[:, j] = df[c].to_numpy(dtype=dtype, na_value=np.nan) if c in df.columns else np.nan
+    fill = np.asarray(fill_values, dtype=dtype)
+    rows, cols = np.nonzero(np.isnan(block))
+    block[rows, cols] = fill[cols]
+    return block
+
+
+def per90_block(counts, minutes, block_rows=65_536):
+    """counts / minutes * 90 for every column at once, in place; 0 minutes → NaN.
+
+    The rates are computed in float64 and rounded once to `counts`' dtype, so a
+    float32 block equals the float64 layout's rates cast to float32.
+    """
+    minutes = np.where(minutes == 0, np.nan, minutes).astype(np.float64, copy=False)
+    for start in range(0, len(counts), block_rows):   # bounded float64 temporaries
+        rows = slice(start, start + block_rows)
+        counts[rows] = counts[rows].astype(np.float64) / minutes[rows, None] * 90
+    return counts
+
+
+def onehot_block(df, categories, dtype):
+    """drop_first one-hot encoding of several categorical columns into a single block.
+
+    `categories` maps column → ordered categories; the first category of each
+    column is the dropped reference level and unknown values encode as all zeros.
+    """
+    widths = [max(len(cats) - 1, 0) for cats in categories.values()]
+    block = np.zeros((len(df), sum(widths)), dtype=dtype)
+    offset = 0
+    for (c, cats), width in zip(categories.items(), widths):
+        values = df[c] if c in df.columns else pd.Series(np.nan, index=df.index)
+        codes = pd.Categorical(values, categories=cats).codes
+        rows = np.nonzero(codes >= 1)[0]
+        block[rows, offset + codes[rows] - 1] = 1
+        offset += width
+    return block
+
+
+def frame(block, columns, index):
+    """Wrap a 2-D block as a DataFrame without copying it."""
+    return pd.DataFrame(block, columns=columns, index=index, copy=False)
+
+
+def frame_nbytes(df):
+    return int(df.memory_usage(index=False, deep=True).sum())
+
+
+def wide_nbytes(df):
+    """Bytes the same frame would take with every numeric column as float64/int64."""
+    total = 0
+    for c in df.columns:
+        dt = df[c].dtype
+        if dt.kind in "fiub":
+            total += 8 * len(df)
+        else:
+            total += int(df[c].memory_usage(index=False, deep=True))
+    return total
+
+
+class PeakMemory:
+    """Context manager recording the Python-heap peak (tracemalloc) of a block of code."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.peak = None
+
+    def __enter__(self):
+        if self.enabled:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.enabled:
+            _, self.peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
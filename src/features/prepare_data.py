@@ -2,101 +2,189 @@
 # prepare_data.py
 
 import os
+import sys
+import argparse
 import pandas as pd
-import numpy as np # Added for inf handling
-
-def main():
-    # ── Paths ───────────────────────────────────────────────────────────────────
-    # Input file from ingest_data.py
-    INPUT_CSV  = os.path.join("data", "processed", "player_ratings_merged.csv")
-    # Outputs for model training
-    FEAT_CSV   = os.path.join("data", "processed", "player_ratings_features.csv")
-    TARGET_CSV = os.path.join("data", "processed", "player_ratings_target.csv")
-    os.makedirs(os.path.dirname(FEAT_CSV), exist_ok=True)
 
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.profiling import span, stage
+from common.storage import (append_partition, list_partitions, partition_signature,
+                            read_table, remove_table, write_table)
+from common.watermark import load_watermark, save_watermark, watermark_path
+from features import feature_engine as fe
+from features import rolling_form
+from features.transformer import TRANSFORMER_FILE, FeatureTransformer
+
+# ── Paths ───────────────────────────────────────────────────────────────────
+# Input file from ingest_data.py
+INPUT      = os.path.join("data", "processed", "player_ratings_merged")
+# Outputs for model training
+FEAT       = os.path.join("data", "processed", "player_ratings_features")
+TARGET     = os.path.join("data", "processed", "player_ratings_target")
+# Cleaned rows (raw columns, medians filled), row-aligned with the features;
+# analysis scripts take pos/competition/team context from here
+CLEAN      = os.path.join("data", "processed", "player_ratings_cleaned")
+
+TRANSFORMER = os.path.join("models", TRANSFORMER_FILE)
+
+
+def report_memory(X, peak=None):
+    """Print the feature matrix footprint against the old all-64-bit layout."""
+    compact, wide = fe.frame_nbytes(X), fe.wide_nbytes(X)
+    line = (f"Feature matrix: {compact / 1e6:.1f} MB "
+            f"(float64/int64 layout: {wide / 1e6:.1f} MB, -{100 * (1 - compact / max(wide, 1)):.0f}%)")
+    if peak is not None:
+        line += f", peak Python heap while building: {peak / 1e6:.1f} MB"
+    print(line)
+
+
+def add_form(df, state=None, transformer=None):
+    """Drop the rows `transformer` drops as incomplete, then append the rolling player-form
+    columns (features/rolling_form.py); returns (df, form state).
+
+    Dropped rows never enter a player's history, so full and incremental builds agree.
+    The caller saves the state once the features are written.
+    """
+    keep = (transformer or FeatureTransformer()).complete(df)
+    if not keep.all():
+        df = df[keep]
+    with span("rolling_form", rows=len(df)):
+        df, state = rolling_form.add_form(df, state)
+    print(f"Added {len(rolling_form.form_columns())} player-form columns ({len(state)} players)")
+    return df, state
+
+
+def run_full(input_path=INPUT, feat_path=FEAT, target_path=TARGET,
+             transformer_path=TRANSFORMER, compact=True, trace_memory=False, clean_path=CLEAN,
+             form=False):
     # ── 1) Load merged data ────────────────────────────────────────────────────
-    df = pd.read_csv(INPUT_CSV)
+    with span("read_merged"):
+        df = read_table(input_path)
     print(f"Loaded merged data shape: {df.shape}")
-
-    # ── 2) CLEANING LOGIC (From old clean_data.py) ──────────────────────────────
-    # Drop or fill missing values
-
-    # Corrected code for prepare_data.py (Use direct assignment)
-    numeric_cols = df.select_dtypes(include='number').columns.tolist()
-    for col in numeric_cols:
-        if col != 'rating':  # don't fill target
-            # Calculate the median and assign the filled result back to the column
-            df[col] = df[col].fillna(df[col].median()) # <-- FIX: Removed inplace=True
-
-    # Drop any rows still containing nulls
-    df.dropna(inplace=True)
-
-    # Ensure correct data types (for columns needed in feature engineering)
-    df['competition'] = df['competition'].astype('category')
-    df['pos'] = df['pos'].astype('category')
-    df['pos_role'] = df['pos_role'].astype('category')
-    df['win'] = df['win'].astype(int)
-    df['lost'] = df['lost'].astype(int)
-    df['is_home_team'] = df['is_home_team'].astype(int)
-
-    # ── 3) FEATURE ENGINEERING LOGIC (Per-90 and Encoding) ──────────────────────
-    stats_to_scale = [
-        'goals', 'assists', 'shots_ontarget', 'shots_offtarget', 'shotsblocked',
-        'chances2score', 'drib_success', 'drib_unsuccess', 'keypasses',
-        'touches', 'passes_acc', 'passes_inacc', 'crosses_acc', 'crosses_inacc',
-        'lballs_acc', 'lballs_inacc', 'grduels_w', 'grduels_l',
-        'aerials_w', 'aerials_l', 'poss_lost', 'fouls', 'wasfouled',
-        'clearances', 'stop_shots', 'interceptions', 'tackles', 'dribbled_past',
-        'tballs_acc', 'tballs_inacc', 'countattack', 'offsides'
-    ]
-    stats_present = [col for col in stats_to_scale if col in df.columns]
-
-    # Compute per-90 metrics (handle division by zero if 'minutesPlayed' is 0)
-    #df['minutesPlayed'].replace(0, np.nan, inplace=True) # Replace 0 with NaN for division
-    df['minutesPlayed'] = df['minutesPlayed'].replace(0, np.nan) # FIX: Removed inplace=True
-    for col in stats_present:
-        # Scale stats only where minutesPlayed is valid
-        df[f"{col}_per90"] = df[col] / df["minutesPlayed"] * 90
-
-    # Drop the original count columns
-    df.drop(columns=stats_present, inplace=True)
-    df.drop(columns=["minutesPlayed"], inplace=True) # Drop 'minutesPlayed' now that per-90 is done
-
-    # Encode categorical features
-    cat_cols = [c for c in ["competition", "pos", "pos_role"] if c in df.columns]
-    df = pd.get_dummies(df, columns=cat_cols, drop_first=True)
-
-
-    # ... (Continuing from Section 3, where encoding is complete)
-
-    # ── 4) Separate target and features & Final Cleanup ────────────────────────
-
-    if "rating" not in df.columns:
-        raise KeyError("Expected 'rating' column in data as the target.")
-
-    # 1. Extract the target 'y' from the main DataFrame 'df' FIRST
-    y = df["rating"].values
-
-    # 2. Create the feature DataFrame 'X' by dropping the target and meta-columns from 'df'
-    # Drop: target ('rating'), original time/identifier columns ('date', 'match'), 
-    # and the problematic text columns ('player_name', 'team') that caused the TypeError.
-    X = df.drop(
-        columns=["rating", "date", "match", "player_name", "team"], 
-        errors="ignore"
-    ) 
-
-    # 3. Final Sanity Check: Ensure 'X' contains only numeric types
-    # (The previous steps should have handled this, but this is good practice 
-    # if you want to be absolutely sure no object columns remain, uncomment the line below)
-    # X = X.select_dtypes(include=np.number)
-
-    # ── 5) Save out features and target ─────────────────────────────────────────
-    X.to_csv(FEAT_CSV, index=False)
-    pd.DataFrame({"rating": y}).to_csv(TARGET_CSV, index=False)
-    print(f"Features saved to {FEAT_CSV} (shape: {X.shape})")
-    print(f"Target saved to {TARGET_CSV} (shape: {y.shape})")
+    # Prior-match form per player; numeric, so the transformer passes it through
+    form_state = None
+    if form:
+        df, form_state = add_form(df)
+
+    # ── 2) Cleaning and 3) feature engineering, fitted on this data ────────────
+    # The fitted transformer keeps the medians, per-90 columns and one-hot
+    # layout so inference can rebuild identical features for any batch size.
+    # Features are built as a few typed NumPy blocks (float32 / uint8 unless
+    # compact=False) rather than column by column.
+    transformer = FeatureTransformer(compact=compact)
+    with fe.PeakMemory(enabled=trace_memory) as mem, span("fit_transform", rows=len(df)):
+        X, y = transformer.fit_transform(df)
+    transformer.save(transformer_path)
+    print(f"Feature transformer saved to {transformer_path}")
+    report_memory(X, mem.peak)
+
+    # ── 4) Save out features and target ─────────────────────────────────────────
+    with span("write", rows=len(X)):
+        feat_out = write_table(X, feat_path)
+        target_out = write_table(pd.DataFrame({"rating": y}), target_path)
+        clean_out = write_table(transformer.clean(df), clean_path)
+    if form_state is not None:
+        rolling_form.save_state(form_state)
+    print(f"Features saved to {feat_out} (shape: {X.shape})")
+    print(f"Target saved to {target_out} (shape: {y.shape})")
+    print(f"Cleaned rows saved to {clean_out}")
+    return X, y, transformer
+
+
+# ── Incremental mode ────────────────────────────────────────────────────────
+# Works on the partitioned store written by `ingest_data.py --incremental`.
+# The watermark records which merged partitions were already prepared (with a
+# signature of their files); new partitions are encoded with the transformer
+# fitted by the last full build, so the feature/target tables grow by one
+# partition each with exactly the existing column layout.
+
+def run_incremental(input_path=INPUT, feat_path=FEAT, target_path=TARGET,
+                    transformer_path=TRANSFORMER, full_rebuild=False, state_path=None,
+                    clean_path=CLEAN, form=False, compact=True):
+    state_path = state_path or watermark_path("prepare")
+    partitions = {p: partition_signature(input_path, p) for p in list_partitions(input_path)}
+    if not partitions:
+        raise SystemExit(f"{input_path} is not a partitioned store — run ingest_data.py --incremental first")
+    wm = load_watermark(state_path)
+
+    reason = None
+    if full_rebuild:
+        reason = "requested"
+    elif wm is None or not os.path.isfile(transformer_path):
+        reason = "no previous incremental run"
+    elif any(partitions.get(p) != sig for p, sig in wm["partitions"].items()):
+        reason = "merged store was rebuilt or modified"
+    elif wm.get("form", False) != form:
+        reason = "player-form features switched " + ("on" if form else "off")
+    elif wm.get("compact", True) != compact:
+        reason = "feature dtypes switched to " + ("compact" if compact else "wide")
+    elif form and rolling_form.load_state() is None:
+        reason = "no player-form state"
+
+    if reason:
+        print(f"Full rebuild of features ({reason})")
+        df = read_table(input_path)
+        form_state = None
+        if form:
+            df, form_state = add_form(df)
+        transformer = FeatureTransformer(compact=compact)
+        X, y = transformer.fit_transform(df)
+        transformer.save(transformer_path)
+        remove_table(feat_path)
+        remove_table(target_path)
+        remove_table(clean_path)
+        new = sorted(partitions)
+    else:
+        new = sorted(p for p in partitions if p not in wm["partitions"])
+        if not new:
+            print("Features up to date — nothing to do")
+            return 0
+        transformer = FeatureTransformer.load(transformer_path)
+        df = read_table(input_path, partitions=new)
+        print(f"Preparing {len(df)} new rows from {len(new)} partition(s)")
+        form_state = None
+        if form:   # continues each player's history from the saved state
+            df, form_state = add_form(df, rolling_form.load_state(), transformer)
+        X, y = transformer.transform(df, drop_incomplete=True)
+
+    batch = new[-1]
+    feat_out = append_partition(X, feat_path, batch)
+    append_partition(pd.DataFrame({"rating": y}), target_path, batch)
+    append_partition(transformer.clean(df), clean_path, batch)
+    if form_state is not None:
+        rolling_form.save_state(form_state)
+    save_watermark(state_path, partitions=partitions, transformer=transformer_path, form=form,
+                   compact=compact)
+    print(f"Features appended to {feat_out} (shape: {X.shape})")
+    return len(X)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clean merged ratings and build model features.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only prepare merged partitions added since the last run")
+    parser.add_argument("--full-rebuild", action="store_true",
+                        help="with --incremental: ignore the watermark and rebuild all features")
+    parser.add_argument("--wide-dtypes", action="store_true",
+                        help="keep float64/int64/bool features instead of float32/uint8")
+    parser.add_argument("--form", action="store_true",
+                        help="add per-player rolling form features from earlier matches (rolling_form.py)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="report the peak Python heap of feature building (tracemalloc, slower)")
+    args = parser.parse_args(argv)
+
+    os.makedirs(os.path.dirname(FEAT), exist_ok=True)
+    os.makedirs(os.path.dirname(TRANSFORMER), exist_ok=True)
+    with stage("prepare"):
+        if args.incremental:
+            run_incremental(full_rebuild=args.full_rebuild, form=args.form,
+                            compact=not args.wide_dtypes)
+        else:
+            run_full(compact=not args.wide_dtypes, trace_memory=args.trace_memory, form=args.form)
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# rolling_form.py
+#
+# Player-form features: what each player's previous matches looked like.
+#
+# For every row (one player in one match) and every form statistic (rating,
+# minutes, a few per-90 rates), computed only from that player's *earlier*
+# rows. The current match never leaks into its own features:
+#
+#   form_ewm_<stat>     exponentially weighted mean, halflife in matches
+#   form_last<N>_<stat> mean of the last N matches (NaN values skipped)
+#   form_matches        matches played before this one
+#   form_days_since     days since the previous match
+#
+# One pass over all rows sorts them by (player, date). After that everything
+# is whole-array NumPy: the last-N means are N shifted sums, and the EWM
+# recurrence advances the k-th match of every player at once. The only
+# Python loop is as long as the longest career, not the number of rows.
+#
+# The per-player state after a pass is small: the EWM of each stat, the last
+# N values, the match count and the last date. It is saved to
+# data/processed/_state/player_form.parquet. compute(df, state) seeds the pass
+# with that state, prepending one seed row (the EWM) and N history rows (the
+# last values) per player. A new matchday therefore costs O(new rows + players)
+# rather than O(history), and gives exactly the features a full recomputation
+# would. That holds as long as new rows are not dated before a player's last
+# recorded match, which incremental ingest guarantees because it only appends
+# rows newer than its watermark.
+#
+#   python src/features/rolling_form.py                  # full pass over the merged table
+#   python src/features/rolling_form.py --incremental    # only rows after the saved state
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.storage import read_table, write_table
+from common.watermark import STATE_DIR, load_watermark, save_watermark
+
+STATS = ["rating", "minutesPlayed", "goals_per90", "assists_per90", "shots_ontarget_per90",
+         "keypasses_per90", "touches_per90", "passes_acc_per90", "tackles_per90"]
+HALFLIFE = 5.0     # matches
+LAST_N = 5
+PLAYER = "player_name"
+
+STATE_PATH = os.path.join(STATE_DIR, "player_form.parquet")
+INPUT = os.path.join("data", "processed", "player_ratings_merged")
+OUTPUT = os.path.join("data", "processed", "player_form")
+
+_SEED, _HIST, _NEW = 0, 1, 2      # row kinds of the combined frame, in sort order
+
+
+def form_columns(stats=STATS, last_n=LAST_N):
+    return ([f"form_ewm_{s}" for s in stats] + [f"form_last{last_n}_{s}" for s in stats]
+            + ["form_matches", "form_days_since"])
+
+
+def available_stats(df, stats=STATS):
+    """The stats of `stats` that `df` has the columns for."""
+    return [s for s in stats
+            if (s[:-len("_per90")] if s.endswith("_per90") else s) in df.columns
+            and (not s.endswith("_per90") or "minutesPlayed" in df.columns)]
+
+
+def match_values(df, stats):
+    """(rows × stats) float64 values of each row's own match; per-90 at 0 minutes → NaN."""
+    out = np.empty((len(df), len(stats)))
+    minutes = pd.to_numeric(df["minutesPlayed"], errors="coerce").to_numpy(np.float64) \
+        if "minutesPlayed" in df.columns else None
+    for j, s in enumerate(stats):
+        if s.endswith("_per90"):
+            counts = pd.to_numeric(df[s[:-len("_per90")]], errors="coerce").to_numpy(np.float64)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                out[:, j] = np.where(minutes > 0, counts / minutes * 90, np.nan)
+        else:
+            out[:, j] = pd.to_numeric(df[s], errors="coerce").to_numpy(np.float64)
+    return out
+
+
+def _state_rows(state, players, stats, last_n):
+    """Seed and history rows for the players of `players` that have a saved state."""
+    state = state[state[PLAYER].isin(players)]
+    k = len(state)
+    if not k:
+        return None
+    seed = pd.DataFrame({PLAYER: state[PLAYER].to_numpy(), "_kind": _SEED,
+                         "_order": 0, "date": pd.to_datetime(state["last_date"]).to_numpy()})
+    for j, s in enumerate(stats):
+        seed[f"x{j}"] = np.nan
+        seed[f"e{j}"] = state[f"ewm_{s}"].to_numpy(np.float64)
+    # history slots oldest first: lag N … lag 1
+    hist = pd.DataFrame({PLAYER: np.repeat(state[PLAYER].to_numpy(), last_n), "_kind": _HIST,
+                         "_order": np.tile(np.arange(last_n), k),
+                         "date": pd.NaT})
+    for j, s in enumerate(stats):
+        lags = state[[f"{s}_lag{i}" for i in range(last_n, 0, -1)]].to_numpy(np.float64)
+        hist[f"x{j}"] = lags.reshape(-1)
+        hist[f"e{j}"] = np.nan
+    return pd.concat([seed, hist], ignore_index=True)
+
+
+def _lag(a, k, start):
+    """a shifted down by k rows within each group (rows before the group start → NaN)."""
+    out = np.full_like(a, np.nan)
+    out[k:] = a[:len(a) - k]
+    out[np.arange(len(a)) - k < start] = np.nan
+    return out
+
+
+def _ewm_through(values, starts, sizes, alpha):
+    """EWM (adjust=False, NaNs skipped) of every row's group up to and including that row.
+
+    Runs the recurrence for the k-th row of every group at once, so the Python
+    loop is as long as the longest career, not the number of rows or players.
+    """
+    out = np.empty_like(values)
+    by_size = np.argsort(-sizes, kind="stable")
+    g_starts, g_sizes = starts[by_size], sizes[by_size]
+    m = np.full((len(sizes), values.shape[1]), np.nan)
+    for k in range(int(g_sizes[0]) if len(g_sizes) else 0):
+        active = np.searchsorted(-g_sizes, -k, side="left")     # groups with more than k rows
+        rows = g_starts[:active] + k
+        x, cur = values[rows], m[:active]
+        step = np.where(np.isnan(cur), x, alpha * x + (1 - alpha) * cur)
+        m[:active] = cur = np.where(np.isnan(x), cur, step)
+        out[rows] = cur
+    return out
+
+
+def compute(df, state=None, stats=None, halflife=HALFLIFE, last_n=LAST_N):
+    """Form features of the rows of `df` (same index) and the updated per-player state.
+
+    With `state` (from a previous call) the players' history continues from it;
+    `df` then holds only rows newer than that history.
+    """
+    stats = available_stats(df, stats or STATS)
+    alpha = 1 - np.exp(np.log(0.5) / halflife)
+    S = len(stats)
+    if not len(df):
+        return pd.DataFrame(columns=form_columns(stats, last_n), index=df.index, dtype=float), state
+
+    vals = match_values(df, stats)
+    new = pd.DataFrame({PLAYER: df[PLAYER].to_numpy(), "_kind": _NEW,
+                        "_order": np.arange(len(df)), "date": pd.to_datetime(df["date"]).to_numpy()})
+    for j in range(S):
+        new[f"x{j}"] = vals[:, j]
+        new[f"e{j}"] = vals[:, j]
+    frame = new
+    if state is not None and len(state):
+        prior = _state_rows(state, new[PLAYER].unique(), stats, last_n)
+        if prior is not None:
+            frame = pd.concat([prior, new], ignore_index=True)
+    player = pd.factorize(frame[PLAYER])[0]
+    dates = frame["date"].to_numpy()
+    order = np.lexsort((frame["_order"].to_numpy(), dates, frame["_kind"].to_numpy(), player))
+    groups = player[order]
+    kind = frame["_kind"].to_numpy()[order]
+    dates = dates[order]
+    X = frame[[f"x{j}" for j in range(S)]].to_numpy(np.float64)[order]
+    E = frame[[f"e{j}" for j in range(S)]].to_numpy(np.float64)[order]
+
+    # frame is now sorted by player: contiguous groups
+    first = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    sizes = np.diff(np.r_[first, len(groups)])
+    start = np.repeat(first, sizes)                   # group start of every row
+    last_row = first + sizes - 1
+
+    # EWM through each row (the state's seed row first), shifted: prior matches only
+    ewm = _ewm_through(E, first, sizes, alpha)
+    prior_ewm = _lag(ewm, 1, start)
+    # mean of the previous last_n rows (history rows included), NaNs skipped
+    total, count = np.zeros_like(X), np.zeros_like(X)
+    for k in range(1, last_n + 1):
+        lagged = _lag(X, k, start)
+        seen_k = ~np.isnan(lagged)
+        total += np.where(seen_k, lagged, 0.0)
+        count += seen_k
+    with np.errstate(invalid="ignore"):
+        lastn = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+    # previous known date: the seed's last_date or the previous new row
+    has_date = ~np.isnat(dates)
+    known = np.maximum.accumulate(np.where(has_date, np.arange(len(dates)), -1))
+    prev = np.r_[-1, known[:-1]]
+    prev = np.where(prev >= start, prev, -1)
+    prev_date = np.where(prev >= 0, dates[np.maximum(prev, 0)], np.datetime64("NaT"))
+
+    is_new = kind == _NEW
+    n_prior = np.zeros(len(groups), dtype=np.int64)
+    if state is not None and len(state):
+        names = frame[PLAYER].to_numpy()[order]
+        n_prior = pd.Series(names).map(state.set_index(PLAYER)["n"]).fillna(0).to_numpy(np.int64)
+    played = n_prior + np.cumsum(is_new) - np.repeat(np.r_[0, np.cumsum(is_new)[last_row[:-1]]], sizes) - 1
+
+    rows = frame["_order"].to_numpy()[order][is_new]
+    feats = np.empty((len(df), 2 * S + 2))
+    feats[rows, :S] = prior_ewm[is_new]
+    feats[rows, S:2 * S] = lastn[is_new]
+    feats[rows, -2] = played[is_new]
+    feats[rows, -1] = ((dates - prev_date) / np.timedelta64(1, "D"))[is_new]
+    features = pd.DataFrame(feats, columns=form_columns(stats, last_n), index=df.index)
+
+    # ── state after these rows ──
+    new_state = pd.DataFrame({PLAYER: frame[PLAYER].to_numpy()[order][first]})
+    for j, s in enumerate(stats):
+        new_state[f"ewm_{s}"] = ewm[last_row, j]
+    for i in range(1, last_n + 1):                    # lag i = i-th most recent non-seed row
+        rows_i = last_row - (i - 1)
+        ok = (rows_i >= first) & (kind[np.maximum(rows_i, 0)] != _SEED)
+        for j, s in enumerate(stats):
+            new_state[f"{s}_lag{i}"] = np.where(ok, X[np.maximum(rows_i, 0), j], np.nan)
+    new_state["n"] = played[last_row] + 1
+    new_state["last_date"] = dates[last_row]
+    if state is not None and len(state):
+        kept = state[~state[PLAYER].isin(new_state[PLAYER])]
+        new_state = pd.concat([kept, new_state], ignore_index=True)
+    return features, new_state.sort_values(PLAYER, ignore_index=True)
+
+
+def _params(stats, halflife, last_n):
+    return {"stats": list(stats), "halflife": halflife, "last_n": last_n}
+
+
+def load_state(path=STATE_PATH, stats=STATS, halflife=HALFLIFE, last_n=LAST_N):
+    """The saved state, or None if missing or computed with other parameters."""
+    wm = load_watermark(path + ".json")
+    if wm is None or not os.path.isfile(path):
+        return None
+    if {k: wm.get(k) for k in ("stats", "halflife", "last_n")} != _params(stats, halflife, last_n):
+        return None
+    return pd.read_parquet(path)
+
+
+def save_state(state, path=STATE_PATH, stats=STATS, halflife=HALFLIFE, last_n=LAST_N):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    state.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    save_watermark(path + ".json", players=len(state), last_date=state["last_date"].max(),
+                   **_params(stats, halflife, last_n))
+
+
+def add_form(df, state=None, **params):
+    """`df` with the form columns appended, plus the updated state."""
+    features, new_state = compute(df, state, **params)
+    return pd.concat([df, features], axis=1), new_state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-player rolling form features.")
+    parser.add_argument("--input", default=INPUT, help="merged ratings table")
+    parser.add_argument("--output", default=OUTPUT, help="form features, row-aligned with --input")
+    parser.add_argument("--state", default=STATE_PATH)
+    parser.add_argument("--incremental", action="store_true",
+                        help="continue from the saved state with the rows dated after it")
+    args = parser.parse_args(argv)
+
+    df = read_table(args.input)
+    state = load_state(args.state) if args.incremental else None
+    if state is not None:
+        df = df[pd.to_datetime(df["date"]) > pd.Timestamp(state["last_date"].max())]
+        print(f"Continuing from {len(state)} player states: {len(df)} new rows")
+    t0 = time.perf_counter()
+    features, state = compute(df, state)
+    elapsed = time.perf_counter() - t0
+    out = write_table(features.reset_index(drop=True), args.output)
+    save_state(state, args.state)      # only once the features it continues from are written
+    print(f"Form features for {len(features)} rows ({len(state)} players) in {elapsed:.2f}s → {out}")
+
+
+if __name__ == "__main__":
+    main()
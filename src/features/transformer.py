@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# transformer.py
+#
+# Fitted version of the cleaning + feature engineering in prepare_data.py.
+# Fitting captures everything that used to be recomputed from whatever batch
+# happened to be loaded (medians, the one-hot layout, the per-90 column list),
+# so transforming a single row gives exactly the row the training data had.
+
+import os
+import numpy as np
+import pandas as pd
+import joblib
+
+from common.profiling import span
+from features import feature_engine as fe
+
+STATS_TO_SCALE = [
+    'goals', 'assists', 'shots_ontarget', 'shots_offtarget', 'shotsblocked',
+    'chances2score', 'drib_success', 'drib_unsuccess', 'keypasses',
+    'touches', 'passes_acc', 'passes_inacc', 'crosses_acc', 'crosses_inacc',
+    'lballs_acc', 'lballs_inacc', 'grduels_w', 'grduels_l',
+    'aerials_w', 'aerials_l', 'poss_lost', 'fouls', 'wasfouled',
+    'clearances', 'stop_shots', 'interceptions', 'tackles', 'dribbled_past',
+    'tballs_acc', 'tballs_inacc', 'countattack', 'offsides'
+]
+CAT_COLS  = ["competition", "pos", "pos_role"]
+INT_COLS  = ["win", "lost", "is_home_team"]
+# target ('rating'), original time/identifier columns ('date', 'match') and the
+# text columns ('player_name', 'team') that are never features
+META_COLS = ["rating", "date", "match", "player_name", "team"]
+MINUTES   = "minutesPlayed"
+
+TRANSFORMER_FILE = "feature_transformer.pkl"
+
+
+def default_path(model_path):
+    """Where the transformer lives for a given model artifact (same directory)."""
+    return os.path.join(os.path.dirname(model_path) or ".", TRANSFORMER_FILE)
+
+
+class FeatureTransformer:
+    """Raw merged rows → model feature matrix, with training statistics frozen at fit.
+
+    Attributes set by `fit`:
+      raw_medians_      fill values for raw numeric columns
+      per90_cols_       count columns turned into per-90 rates
+      passthrough_cols_ raw columns copied into the features as-is
+      categories_       {column: categories}; the first one is dropped like
+                        get_dummies(drop_first=True)
+      feature_columns_  exact output column order
+      feature_medians_  fill values for NaN/inf features (e.g. per-90 at 0 minutes)
+    """
+
+    def __init__(self, compact=True):
+        # compact: float32 numerics and uint8 flags/one-hots (see feature_engine.py);
+        # False reproduces the original float64/int64/bool layout.
+        self.compact = compact
+
+    def fit(self, df):
+        self.fit_transform(df)
+        return self
+
+    def fit_transform(self, df):
+        numeric = [c for c in df.select_dtypes(include="number").columns if c != "rating"]
+        self.raw_medians_ = df[numeric].median()
+        self.per90_cols_ = [c for c in STATS_TO_SCALE if c in df.columns]
+        complete = self._complete(df)
+        self.categories_ = {
+            c: df.loc[complete, c].astype("category").cat.categories.tolist()
+            for c in CAT_COLS if c in df.columns
+        }
+        dropped = set(self.per90_cols_) | set(self.categories_) | set(META_COLS) | {MINUTES}
+        self.passthrough_cols_ = [c for c in df.columns if c not in dropped]
+        self.feature_columns_ = (
+            self.passthrough_cols_
+            + [f"{c}_per90" for c in self.per90_cols_]
+            + [f"{c}_{v}" for c, cats in self.categories_.items() for v in cats[1:]]
+        )
+        X, y = self.transform(df, drop_incomplete=True, complete=complete)
+        self.feature_medians_ = X.replace([np.inf, -np.inf], np.nan).median(numeric_only=True) \
+                                 .astype("float64")
+        return X, y
+
+    def transform(self, df, drop_incomplete=False, complete=None):
+        """Build features for `df`; returns (X, y) where y is None without a 'rating' column.
+
+        `drop_incomplete=True` reproduces the training-time cleaning, which drops
+        rows that still hold nulls after median filling. Inference keeps every
+        row: unseen categories encode as all zeros.
+        """
+        if drop_incomplete:
+            complete = self._complete(df) if complete is None else complete
+            if not complete.all():
+                df = df[complete]
+        ftype = np.float32 if self.compact else np.float64
+        ftype_dummy = np.uint8 if self.compact else bool
+
+        with span("per90", rows=len(df)):
+            counts = fe.numeric_block(df, self.per90_cols_,
+                                      self.raw_medians_.reindex(self.per90_cols_), ftype)
+            minutes = fe.numeric_block(df, [MINUTES], [self.raw_medians_.get(MINUTES, np.nan)],
+                                       np.float64)[:, 0]
+            per90 = fe.per90_block(counts, minutes)
+        with span("onehot", rows=len(df)):
+            dummies = fe.onehot_block(df, self.categories_, ftype_dummy)
+
+        with span("passthrough", rows=len(df)):
+            passthrough = self._passthrough(df, ftype)
+        X = pd.concat([
+            passthrough,
+            fe.frame(per90, [f"{c}_per90" for c in self.per90_cols_], df.index),
+            fe.frame(dummies, [f"{c}_{v}" for c, cats in self.categories_.items() for v in cats[1:]],
+                     df.index),
+        ], axis=1, copy=False)
+        y = df["rating"].to_numpy() if "rating" in df.columns else None
+        return X, y
+
+    def clean(self, df):
+        """The training rows `transform(drop_incomplete=True)` keeps, as raw columns with
+        numeric gaps filled by the training medians — row-aligned with its features."""
+        complete = self._complete(df)
+        rows = df if complete.all() else df[complete]
+        numeric = [c for c in self.raw_medians_.index if c in rows.columns]
+        return rows.fillna(self.raw_medians_[numeric].to_dict())
+
+    def complete(self, df):
+        """Mask of the rows `transform(drop_incomplete=True)` keeps. Before fitting,
+        `df`'s own numeric medians stand in for the training ones."""
+        if hasattr(self, "raw_medians_"):
+            return self._complete(df)
+        numeric = [c for c in df.select_dtypes(include="number").columns if c != "rating"]
+        return self._complete(df, df[numeric].median())
+
+    def _complete(self, df, medians=None):
+        """Rows without nulls once numeric columns are median-filled."""
+        medians = self.raw_medians_ if medians is None else medians
+        numeric = [c for c in medians.index if c in df.columns]
+        ok = df.drop(columns=numeric).notna().all(axis=1).to_numpy()
+        no_median = medians[numeric].isna().to_numpy()  # all-NaN columns stay NaN
+        if no_median.any():
+            ok &= df[np.array(numeric)[no_median]].notna().all(axis=1).to_numpy()
+        return ok
+
+    def _passthrough(self, df, ftype):
+        cols = {}
+        for c in self.passthrough_cols_:
+            if c in INT_COLS:  # bool flags; a missing flag at inference counts as 0
+                s = pd.to_numeric(df[c], errors="coerce") if c in df.columns else pd.Series(0, index=df.index)
+                cols[c] = s.fillna(0).to_numpy().astype(np.uint8 if self.compact else int)
+            elif c in self.raw_medians_.index and self.compact:
+                cols[c] = fe.numeric_block(df, [c], [self.raw_medians_[c]], ftype)[:, 0]
+            elif c in self.raw_medians_.index and c in df.columns:
+                cols[c] = df[c].fillna(self.raw_medians_[c]).to_numpy()
+            else:
+                cols[c] = df[c].to_numpy() if c in df.columns else np.full(len(df), np.nan)
+        return pd.DataFrame(cols, index=df.index)
+
+    def clean_features(self, X):
+        """Align an engineered feature frame to the training layout and fill NaN/inf
+        with the training medians — what every script used to do with X.median()."""
+        X = X.reindex(columns=self.feature_columns_)
+        X = X.replace([np.inf, -np.inf], np.nan)
+        return X.fillna(self.feature_medians_.reindex(self.feature_columns_).fillna(0))
+
+    def prepare(self, df):
+        """Raw rows or already-engineered features → clean model input, one row per input row."""
+        if any(c in df.columns for c in self.categories_) or MINUTES in df.columns:
+            df, _ = self.transform(df)
+        return self.clean_features(df)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        joblib.dump(self, path)
+        return path
+
+    @staticmethod
+    def load(path):
+        return joblib.load(path)
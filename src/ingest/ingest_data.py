@@ -3,17 +3,80 @@
 
 
 import os
+import sys
+import glob
+import shutil
+import argparse
+import tempfile
+import numpy as np
 import pandas as pd
 import sqlite3
 
-def main():
-    RAW_CSV    = os.path.join("data", "raw", "data_football_ratings.csv")
-    SQLITE_DB  = os.path.join("data", "raw", "database.sqlite")
-    OUTPUT_CSV = os.path.join("data", "processed", "player_ratings_merged.csv")
-    os.makedirs(os.path.dirname(OUTPUT_CSV), exist_ok=True)
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
 
-    # 1) Load & filter ratings CSV
-    ratings_df = pd.read_csv(RAW_CSV)
+from common.hashing import file_digest
+from common.profiling import span, stage
+from common.storage import (TableWriter, append_partition, list_partitions, read_table,
+                            remove_table, write_table)
+from common.watermark import load_watermark, save_watermark, watermark_path
+
+RAW_CSV    = os.path.join("data", "raw", "data_football_ratings.csv")
+SQLITE_DB  = os.path.join("data", "raw", "database.sqlite")
+OUTPUT     = os.path.join("data", "processed", "player_ratings_merged")
+
+ATTR_COLUMNS = [
+    "overall_rating", "potential", "acceleration", "sprint_speed", "finishing",
+    "short_passing", "stamina", "agility", "vision", "dribbling", "marking",
+    "interceptions", "heading_accuracy", "positioning",
+]
+
+# Rows come back in a fixed order (date, then player/snapshot id) so the
+# as-of match picks the same snapshot on ties however the rows are fetched.
+ATTR_SQL = """
+    SELECT
+      p.player_name,
+      pa.date            AS attr_date,
+      {attr_cols},
+      p.player_api_id    AS _api_id,
+      pa.id              AS _attr_id
+    FROM Player AS p
+    JOIN Player_Attributes AS pa
+      ON p.player_api_id = pa.player_api_id
+    {where}
+    ORDER BY pa.date, p.player_api_id, pa.id
+"""
+
+# Backward as-of selection done inside SQLite: for every distinct
+# (player_name, rating date) pick the latest snapshot on or before that date,
+# breaking ties exactly like merge_asof over ATTR_SQL's ordering (last wins).
+ASOF_SQL = """
+    SELECT
+      k.player_name,
+      k.rating_date,
+      {attr_cols}
+    FROM temp.rating_keys AS k
+    JOIN Player_Attributes AS pa ON pa.id = (
+      SELECT pa2.id
+      FROM Player AS p2
+      JOIN Player_Attributes AS pa2
+        ON pa2.player_api_id = p2.player_api_id
+      WHERE p2.player_name = k.player_name
+        AND pa2.date <= k.rating_date
+      ORDER BY pa2.date DESC, p2.player_api_id DESC, pa2.id DESC
+      LIMIT 1
+    )
+"""
+
+INDEXES = [
+    ("idx_player_attributes_api_date", "Player_Attributes", ("player_api_id", "date")),
+    ("idx_player_name",                "Player",            ("player_name",)),
+]
+
+
+def clean_ratings(ratings_df):
+    """Keep WhoScored ratings and normalise column names/types."""
     ratings_df = ratings_df[ratings_df["rater"] == "WhoScored"].copy()
     ratings_df.drop(columns=["rater", "is_human"], inplace=True)
     ratings_df.rename(columns={
@@ -21,55 +84,371 @@ def main():
         "original_rating": "rating"
     }, inplace=True)
     ratings_df["date"] = pd.to_datetime(ratings_df["date"], format="%d/%m/%Y")
+    return ratings_df
 
-    # 2) Load player attributes from SQLite
-    conn = sqlite3.connect(SQLITE_DB)
-    player_attrs = pd.read_sql_query("""
-        SELECT
-          p.player_name,
-          pa.date            AS attr_date,
-          pa.overall_rating,
-          pa.potential,
-          pa.acceleration,
-          pa.sprint_speed,
-          pa.finishing,
-          pa.short_passing,
-          pa.stamina,
-          pa.agility,
-          pa.vision,
-          pa.dribbling,
-          pa.marking,
-          pa.interceptions,
-          pa.heading_accuracy,
-          pa.positioning
-        FROM Player AS p
-        JOIN Player_Attributes AS pa
-          ON p.player_api_id = pa.player_api_id
-    """, conn)
-    conn.close()
+
+def connect(sqlite_db, create_indexes=False):
+    """Open the raw database read-only unless we were asked to add indexes to it."""
+    if create_indexes:
+        conn = sqlite3.connect(sqlite_db)
+    else:
+        conn = sqlite3.connect(f"file:{os.path.abspath(sqlite_db)}?mode=ro", uri=True)
+    ensure_indexes(conn, create=create_indexes)
+    return conn
+
+
+def _has_index(conn, table, columns):
+    for _, name, *_ in conn.execute(f"PRAGMA index_list({table})").fetchall():
+        cols = [r[2] for r in conn.execute(f"PRAGMA index_info({name})").fetchall()]
+        if cols[:len(columns)] == list(columns):
+            return True
+    return False
+
+
+def ensure_indexes(conn, create=False):
+    """Verify (or create) the indexes the name/date lookups depend on."""
+    missing = [(name, table, cols) for name, table, cols in INDEXES
+               if not _has_index(conn, table, cols)]
+    if missing and not create:
+        print("Warning: missing index on " +
+              ", ".join(f"{table}({', '.join(cols)})" for _, table, cols in missing) +
+              " — lookups will scan; rerun with --create-indexes")
+    elif missing:
+        for name, table, cols in missing:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({', '.join(cols)})")
+            print(f"Created index {name} on {table}({', '.join(cols)})")
+        conn.commit()
+    return [name for name, _, _ in missing]
+
+
+def register_names(conn, names):
+    """(Re)fill the temp table that narrows attribute queries to rated players."""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS rating_names (player_name TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM temp.rating_names")
+    conn.executemany("INSERT OR IGNORE INTO temp.rating_names VALUES (?)",
+                     ((n,) for n in names))
+
+
+def load_player_attrs(conn, names=None, until=None):
+    """Load attribute snapshots, optionally only for `names` and up to `until`."""
+    attr_cols = ",\n      ".join(f"pa.{c}" for c in ATTR_COLUMNS)
+    clauses, params, join = [], [], ""
+    if until is not None:
+        clauses.append("pa.date <= ?")
+        params.append(pd.Timestamp(until).strftime("%Y-%m-%d %H:%M:%S"))
+    if names is not None:
+        register_names(conn, names)
+        join = "JOIN temp.rating_names AS rn ON rn.player_name = p.player_name"
+    where = join + ("\n    WHERE " + " AND ".join(clauses) if clauses else "")
+
+    with span("sqlite_query") as sp:
+        player_attrs = pd.read_sql_query(ATTR_SQL.format(attr_cols=attr_cols, where=where), conn,
+                                         params=params)
+        sp.set(rows=len(player_attrs))
     player_attrs["attr_date"] = pd.to_datetime(player_attrs["attr_date"])
+    return player_attrs
+
+
+def asof_merge(ratings_df, player_attrs):
+    """Attach to each rating the latest attribute snapshot on or before its date."""
+    # Sort by the 'on' key only (required for merge_asof). A stable sort keeps
+    # the file order within a date, which the streaming mode relies on.
+    ratings_df = ratings_df.sort_values("date", kind="stable").reset_index(drop=True)
+    player_attrs = player_attrs.sort_values("attr_date", kind="stable").reset_index(drop=True)
+    # Unmatched players give NaN, so attributes are float whatever the chunk
+    player_attrs[ATTR_COLUMNS] = player_attrs[ATTR_COLUMNS].astype("float64")
+
+    with span("merge_asof", rows=len(ratings_df), snapshots=len(player_attrs)):
+        merged_df = pd.merge_asof(
+            left=ratings_df,
+            right=player_attrs,
+            left_on="date",
+            right_on="attr_date",
+            by="player_name",
+            direction="backward"
+        )
+    merged_df.drop(columns=["attr_date", "_api_id", "_attr_id"], inplace=True, errors="ignore")
+    return merged_df
+
 
-    # 3) Sort by the 'on' key only (required for merge_asof)
-    ratings_df = ratings_df.sort_values("date").reset_index(drop=True)
-    player_attrs = player_attrs.sort_values("attr_date").reset_index(drop=True)
-
-    # 4) Perform the as-of merge, grouping by player_name
-    merged_df = pd.merge_asof(
-        left=ratings_df,
-        right=player_attrs,
-        left_on="date",
-        right_on="attr_date",
-        by="player_name",
-        direction="backward"
+def sql_asof_merge(conn, ratings_df):
+    """Same result as asof_merge, but the as-of selection runs in SQLite so only
+    one snapshot per (player, rating date) is ever transferred."""
+    ratings_df = ratings_df.sort_values("date", kind="stable").reset_index(drop=True)
+    keys = pd.DataFrame({
+        "player_name": ratings_df["player_name"],
+        "rating_date": ratings_df["date"].dt.strftime("%Y-%m-%d %H:%M:%S"),
+    }).drop_duplicates()
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS rating_keys "
+                 "(player_name TEXT, rating_date TEXT, PRIMARY KEY (player_name, rating_date))")
+    conn.execute("DELETE FROM temp.rating_keys")
+    conn.executemany("INSERT INTO temp.rating_keys VALUES (?, ?)",
+                     keys.itertuples(index=False, name=None))
+
+    attr_cols = ",\n      ".join(f"pa.{c}" for c in ATTR_COLUMNS)
+    with span("sqlite_query", keys=len(keys)) as sp:
+        matched = pd.read_sql_query(ASOF_SQL.format(attr_cols=attr_cols), conn)
+        sp.set(rows=len(matched))
+    matched["rating_date"] = pd.to_datetime(matched["rating_date"])
+    matched[ATTR_COLUMNS] = matched[ATTR_COLUMNS].astype("float64")
+
+    merged_df = ratings_df.merge(
+        matched.rename(columns={"rating_date": "date"}),
+        on=["player_name", "date"], how="left", sort=False
     )
-    merged_df.drop(columns=["attr_date"], inplace=True)
+    return merged_df
+
+
+def merge_attributes(conn, ratings_df, asof="pandas", window_start=None):
+    """As-of attach attributes to `ratings_df`, touching only its players."""
+    if asof == "sql":
+        return sql_asof_merge(conn, ratings_df)
+    player_attrs = load_player_attrs(conn, names=ratings_df["player_name"].unique(),
+                                     until=ratings_df["date"].max())
+    if window_start is not None:
+        player_attrs = _relevant_snapshots(player_attrs, window_start)
+    return asof_merge(ratings_df, player_attrs)
+
+
+def run_full(raw_csv=RAW_CSV, sqlite_db=SQLITE_DB, output=OUTPUT,
+             asof="pandas", create_indexes=False):
+    # 1) Load & filter ratings CSV
+    with span("read_csv") as sp:
+        ratings_df = clean_ratings(pd.read_csv(raw_csv))
+        sp.set(rows=len(ratings_df))
 
-    # 5) (Optional) Drop rows without any matched attributes
+    # 2-3) Load the rated players' attributes from SQLite and as-of merge them,
+    #      grouping by player_name
+    conn = connect(sqlite_db, create_indexes=create_indexes)
+    merged_df = merge_attributes(conn, ratings_df, asof=asof)
+    conn.close()
+
+    # 4) (Optional) Drop rows without any matched attributes
     # merged_df = merged_df[merged_df["overall_rating"].notna()]
 
-    # 6) Save the result
-    merged_df.to_csv(OUTPUT_CSV, index=False)
-    print(f"Merged data saved to {OUTPUT_CSV} — shape {merged_df.shape}")
+    # 5) Save the result
+    with span("write", rows=len(merged_df)):
+        out_path = write_table(merged_df, output)
+    print(f"Merged data saved to {out_path} — shape {merged_df.shape}")
+    return merged_df.shape
+
+
+# ── Streaming mode ──────────────────────────────────────────────────────────
+# Pass 1 reads the ratings CSV in bounded chunks and spills each chunk into
+# per-window (e.g. per-month) pickles. Pass 2 walks the windows in date order,
+# loads only the snapshots of the players in that window, merges and appends
+# to the output. Peak memory is one chunk or one window, not the full history.
+# --max-memory-mb only sizes the chunks: a window is loaded whole, so pick a
+# --window (e.g. W for weeks) whose matches fit in memory.
+
+def _estimate_chunk_rows(raw_csv, max_memory_mb, sample_rows=2000):
+    sample = pd.read_csv(raw_csv, nrows=sample_rows)
+    bytes_per_row = max(1, sample.memory_usage(deep=True).sum() / max(len(sample), 1))
+    # a chunk is parsed, filtered and split, so leave room for ~4 copies
+    return max(1000, int(max_memory_mb * 1024 ** 2 / (4 * bytes_per_row)))
+
+
+def _promote(dtypes, frame):
+    for col, dt in frame.dtypes.items():
+        if col not in dtypes:
+            dtypes[col] = dt
+        elif dtypes[col] != dt:
+            try:
+                dtypes[col] = np.result_type(dtypes[col], dt)
+            except TypeError:
+                dtypes[col] = np.dtype(object)
+
+
+def _relevant_snapshots(player_attrs, window_start):
+    """Drop snapshots superseded before the window: per player keep the last one
+    on or before `window_start` plus every snapshot inside the window."""
+    before = player_attrs["attr_date"] <= window_start
+    last_before = player_attrs[before].groupby("player_name", sort=False).tail(1).index
+    keep = ~before
+    keep[last_before] = True
+    return player_attrs[keep]
+
+
+def run_streaming(raw_csv=RAW_CSV, sqlite_db=SQLITE_DB, output=OUTPUT,
+                  max_memory_mb=512, chunk_rows=None, window="M",
+                  asof="pandas", create_indexes=False):
+    chunk_rows = chunk_rows or _estimate_chunk_rows(raw_csv, max_memory_mb)
+    print(f"Streaming ingest: chunk_rows={chunk_rows}, window={window}, "
+          f"chunk memory≈{max_memory_mb} MB")
+
+    spill_dir = tempfile.mkdtemp(prefix="ingest_spill_", dir=os.path.dirname(output) or ".")
+    try:
+        # Pass 1: chunk → filter → spill by window
+        dtypes, row_offset = {}, 0
+        with span("read_csv_spill") as sp:
+            for i, chunk in enumerate(pd.read_csv(raw_csv, chunksize=chunk_rows)):
+                chunk = clean_ratings(chunk)
+                chunk["_row"] = np.arange(row_offset, row_offset + len(chunk))
+                row_offset += len(chunk)
+                _promote(dtypes, chunk)
+                for period, part in chunk.groupby(chunk["date"].dt.to_period(window), sort=False):
+                    # "2015-08-03/2015-08-09" for weeks: name the dir by the start date instead
+                    part_dir = os.path.join(spill_dir, period.start_time.strftime("%Y%m%d"))
+                    os.makedirs(part_dir, exist_ok=True)
+                    part.to_pickle(os.path.join(part_dir, f"part-{i:06d}.pkl"))
+            sp.set(rows=row_offset)
+        dtypes.pop("_row", None)
+
+        # Pass 2: windows in date order → narrow attribute load → merge → append
+        conn = connect(sqlite_db, create_indexes=create_indexes)
+        n_rows, n_cols = 0, None
+        with TableWriter(output) as writer:
+            for key in sorted(os.listdir(spill_dir)):  # YYYYMMDD names sort by date
+                parts = sorted(glob.glob(os.path.join(spill_dir, key, "part-*.pkl")))
+                ratings_df = pd.concat([pd.read_pickle(p) for p in parts], ignore_index=True)
+                ratings_df = (ratings_df.sort_values(["date", "_row"], kind="stable")
+                                        .drop(columns="_row")
+                                        .astype(dtypes))
+                with span("window", rows=len(ratings_df)):
+                    merged_df = merge_attributes(conn, ratings_df, asof=asof,
+                                                 window_start=ratings_df["date"].min())
+                    with span("write"):
+                        writer.write(merged_df)
+                n_rows += len(merged_df)
+                n_cols = merged_df.shape[1]
+                shutil.rmtree(os.path.join(spill_dir, key))
+        conn.close()
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    print(f"Merged data saved to {writer.path} — shape ({n_rows}, {n_cols})")
+    return n_rows, n_cols
+
+
+# ── Incremental mode ────────────────────────────────────────────────────────
+# The merged table becomes a partitioned dataset (one `batch=<last date>`
+# directory per run) and a watermark records the last match date merged plus
+# the content hash of both sources. A new run only merges rating rows dated
+# on or after the watermark, minus the watermark day's rows already stored
+# (same match and player), so late fixtures of that day are not lost.
+# A changed database (attributes can be revised
+# retroactively), a ratings file that changed without any newer match (an
+# older row was edited), a missing store or --full-rebuild rebuilds from
+# scratch. Edits to older rows that arrive together with newer matches are
+# not detected; use --full-rebuild after correcting history.
+
+def _read_new_ratings(raw_csv, after, chunk_rows=200_000):
+    """Cleaned ratings dated on or after `after` (all of them when None)."""
+    frames = []
+    for chunk in pd.read_csv(raw_csv, chunksize=chunk_rows):
+        chunk = clean_ratings(chunk)
+        if after is not None:
+            chunk = chunk[chunk["date"] >= after]
+        frames.append(chunk)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _drop_stored(ratings_df, output, day):
+    """`ratings_df` without the rows of `day` that the store already holds."""
+    on_day = (ratings_df["date"] == day).to_numpy()
+    if not on_day.any():
+        return ratings_df
+    # rows of the watermark day can only sit in the batches named after it
+    batches = [p for p in list_partitions(output) if p >= f"batch={day:%Y-%m-%d}"]
+    stored = read_table(output, columns=["date", "match", "player_name"], partitions=batches)
+    stored = stored[pd.to_datetime(stored["date"]) == day]
+    keys = ["match", "player_name"]
+    seen = pd.MultiIndex.from_frame(ratings_df[keys]).isin(pd.MultiIndex.from_frame(stored[keys]))
+    return ratings_df[~(on_day & seen)].reset_index(drop=True)
+
+
+def _batch_name(output, last_date):
+    """`batch=<last date>`, suffixed .1, .2, … if a batch of that date exists (still sorts by date)."""
+    name = base = f"batch={last_date:%Y-%m-%d}"
+    existing = set(list_partitions(output))
+    n = 0
+    while name in existing:
+        n += 1
+        name = f"{base}.{n}"
+    return name
+
+
+def run_incremental(raw_csv=RAW_CSV, sqlite_db=SQLITE_DB, output=OUTPUT,
+                    full_rebuild=False, asof="pandas", create_indexes=False,
+                    state_path=None):
+    state_path = state_path or watermark_path("ingest")
+    sources = {"ratings": file_digest(raw_csv), "database": file_digest(sqlite_db)}
+    wm = load_watermark(state_path)
+
+    reason = None
+    if full_rebuild:
+        reason = "requested"
+    elif wm is None or not list_partitions(output):
+        reason = "no previous incremental run"
+    elif wm["sources"].get("database") != sources["database"]:
+        reason = "attribute database changed"
+    if reason is None and wm["sources"] == sources:
+        print(f"Ingest up to date (watermark {wm['last_date']}) — nothing to do")
+        return 0
+
+    after = None if reason else pd.Timestamp(wm["last_date"])
+    with span("read_csv") as sp:
+        ratings_df = _read_new_ratings(raw_csv, after)
+        if after is not None:
+            ratings_df = _drop_stored(ratings_df, output, after)
+        if reason is None and ratings_df.empty:
+            # the ratings file changed but holds no new row: an older one was edited
+            reason = "ratings changed before the watermark"
+            after = None
+            ratings_df = _read_new_ratings(raw_csv, after)
+        sp.set(rows=len(ratings_df))
+    if reason:
+        print(f"Full rebuild of {output} ({reason})")
+        remove_table(output)
+    if ratings_df.empty:
+        print(f"No ratings in {raw_csv} — store left empty")
+        return 0
+
+    conn = connect(sqlite_db, create_indexes=create_indexes)
+    merged_df = merge_attributes(conn, ratings_df, asof=asof)
+    conn.close()
+
+    last_date = merged_df["date"].max()
+    with span("write", rows=len(merged_df)):
+        out_path = append_partition(merged_df, output, _batch_name(output, last_date))
+    total = (0 if reason else wm.get("rows", 0)) + len(merged_df)
+    save_watermark(state_path, last_date=last_date.isoformat(), sources=sources, rows=total)
+    print(f"Appended {len(merged_df)} rows to {out_path} — {total} rows total, "
+          f"watermark {last_date.date()}")
+    return len(merged_df)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge WhoScored ratings with as-of player attributes.")
+    parser.add_argument("--stream", action="store_true",
+                        help="chunked, bounded-memory ingest (same output as the default mode)")
+    parser.add_argument("--max-memory-mb", type=float, default=512,
+                        help="approximate memory per CSV chunk for --stream; a whole --window is "
+                             "still loaded at once (default: 512)")
+    parser.add_argument("--chunk-rows", type=int, default=None,
+                        help="CSV rows per chunk for --stream (default: derived from --max-memory-mb)")
+    parser.add_argument("--window", default="M",
+                        help="pandas period alias for --stream merge windows (default: M = month)")
+    parser.add_argument("--asof", choices=["pandas", "sql"], default="pandas",
+                        help="where the backward as-of lookup runs (default: pandas merge_asof)")
+    parser.add_argument("--create-indexes", action="store_true",
+                        help="add the (player_api_id, date) / player_name indexes to the database")
+    parser.add_argument("--incremental", action="store_true",
+                        help="merge only ratings newer than the stored watermark into the partitioned store")
+    parser.add_argument("--full-rebuild", action="store_true",
+                        help="with --incremental: ignore the watermark and rebuild the store")
+    args = parser.parse_args(argv)
+
+    os.makedirs(os.path.dirname(OUTPUT), exist_ok=True)
+    with stage("ingest"):
+        if args.incremental:
+            run_incremental(full_rebuild=args.full_rebuild, asof=args.asof,
+                            create_indexes=args.create_indexes)
+        elif args.stream:
+            run_streaming(max_memory_mb=args.max_memory_mb, chunk_rows=args.chunk_rows,
+                          window=args.window, asof=args.asof, create_indexes=args.create_indexes)
+        else:
+            run_full(asof=args.asof, create_indexes=args.create_indexes)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# backends.py
+#
+# Interchangeable regressors for the rating model.
+#
+#   rf        RandomForestRegressor(n_estimators=100), the historical model
+#   lightgbm  LGBMRegressor, leaf-wise histogram boosting
+#   xgboost   XGBRegressor(tree_method="hist")
+#   hgb       sklearn HistGradientBoostingRegressor (no extra dependency)
+#
+# Every backend is a plain sklearn-compatible estimator, so the artifact is
+# still one joblib pickle at models/rating_model.pkl, and every predict path
+# (predict_rating, batch_score, the service) loads it unchanged. `n_jobs` sets
+# the thread count. rf, lightgbm and xgboost take it as a parameter; hgb runs
+# on OpenMP, which fit_model() caps through threadpoolctl.
+#
+# lightgbm and xgboost are imported only when their backend is requested.
+
+import numpy as np
+from threadpoolctl import threadpool_limits
+
+BACKENDS = ("rf", "lightgbm", "xgboost", "hgb")
+
+
+def _rf(n_jobs, random_state, **params):
+    from sklearn.ensemble import RandomForestRegressor
+    return RandomForestRegressor(**{"n_estimators": 100, **params},
+                                 n_jobs=n_jobs, random_state=random_state)
+
+
+def _lightgbm(n_jobs, random_state, **params):
+    from lightgbm import LGBMRegressor
+    defaults = {"n_estimators": 500, "learning_rate": 0.05, "num_leaves": 31,
+                "subsample": 0.8, "subsample_freq": 1, "colsample_bytree": 0.8, "verbose": -1,
+                "importance_type": "gain"}   # comparable to the forest's impurity importances
+    return LGBMRegressor(**{**defaults, **params}, n_jobs=n_jobs, random_state=random_state)
+
+
+def _xgboost(n_jobs, random_state, **params):
+    from xgboost import XGBRegressor
+    defaults = {"n_estimators": 500, "learning_rate": 0.05, "max_depth": 8,
+                "subsample": 0.8, "colsample_bytree": 0.8}
+    return XGBRegressor(**{**defaults, **params}, tree_method="hist",
+                        n_jobs=n_jobs, random_state=random_state)
+
+
+def _hgb(n_jobs, random_state, **params):
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    defaults = {"max_iter": 500, "learning_rate": 0.05, "max_leaf_nodes": 31,
+                "early_stopping": False}
+    return HistGradientBoostingRegressor(**{**defaults, **params}, random_state=random_state)
+
+
+_FACTORIES = {"rf": _rf, "lightgbm": _lightgbm, "xgboost": _xgboost, "hgb": _hgb}
+
+
+def make_model(backend="rf", n_jobs=-1, random_state=42, **params):
+    """An unfitted estimator for `backend`; `params` override its defaults."""
+    if backend not in _FACTORIES:
+        raise ValueError(f"unknown backend '{backend}' (expected one of {BACKENDS})")
+    return _FACTORIES[backend](n_jobs, random_state, **params)
+
+
+def backend_of(model):
+    """Backend name of a fitted model (the inverse of make_model)."""
+    name = type(model).__name__
+    for backend, cls in (("rf", "RandomForestRegressor"), ("lightgbm", "LGBMRegressor"),
+                         ("xgboost", "XGBRegressor"), ("hgb", "HistGradientBoostingRegressor")):
+        if name == cls:
+            return backend
+    raise ValueError(f"{name} is not one of the rating-model backends {BACKENDS}")
+
+
+def n_trees(model):
+    """Trees in a fitted forest, or boosting rounds of a fitted GBM."""
+    backend = backend_of(model)
+    if backend == "rf":
+        return len(model.estimators_)
+    if backend == "lightgbm":
+        return model.booster_.current_iteration()
+    if backend == "xgboost":
+        return model.get_booster().num_boosted_rounds()
+    return model.n_iter_
+
+
+def _thread_limit(n_jobs):
+    return None if n_jobs is None or n_jobs < 1 else n_jobs
+
+
+def fit_model(model, X, y, n_jobs=-1, **fit_params):
+    """Fit with OpenMP/BLAS pools capped at `n_jobs` threads (-1: all cores)."""
+    with threadpool_limits(limits=_thread_limit(n_jobs)):
+        return model.fit(X, y, **fit_params)
+
+
+def feature_importances(model, X=None, y=None, n_repeats=3, max_rows=2_000, random_state=42):
+    """Importances normalised to sum to 1.
+
+    Models without `feature_importances_` (hgb) fall back to permutation
+    importance on at most `max_rows` rows of (X, y).
+    """
+    imp = getattr(model, "feature_importances_", None)
+    if imp is None:
+        if X is None or y is None:
+            raise ValueError(f"{type(model).__name__} has no feature_importances_; pass X and y")
+        from sklearn.inspection import permutation_importance
+        rows = np.random.default_rng(random_state).permutation(len(X))[:max_rows]
+        Xs = X.iloc[rows] if hasattr(X, "iloc") else X[rows]
+        imp = permutation_importance(model, Xs, np.asarray(y)[rows], n_repeats=n_repeats,
+                                     scoring="neg_mean_absolute_error",
+                                     random_state=random_state).importances_mean
+        imp = np.clip(imp, 0, None)
+    imp = np.asarray(imp, dtype=np.float64)
+    total = imp.sum()
+    return imp / total if total > 0 else imp
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# benchmark_backends.py
+#
+# Compare the training backends of model/backends.py on the cached 80/20
+# split: fit time, predict latency (one row and the whole test set), pickled
+# model size and test MAE/RMSE. With --max-mae, it also names the fastest
+# backend that meets that accuracy bar.
+#
+#   python src/model/benchmark_backends.py --n-jobs 4 --max-mae 0.50
+#   → reports/backend_benchmark.json, reports/backend_benchmark.csv
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+import joblib
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.dataset import load_dataset
+from model.backends import BACKENDS, make_model, fit_model
+
+# ── Paths ─────────────────────────────────────────────────────────────
+ROOT   = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+FEAT   = os.path.join(ROOT, "data", "processed", "player_ratings_features")
+TARGET = os.path.join(ROOT, "data", "processed", "player_ratings_target")
+OUT    = os.path.join(ROOT, "reports", "backend_benchmark")
+
+RANK_BY = ("fit_s", "predict_row_ms", "predict_batch_ms")
+
+
+def _best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def model_nbytes(model):
+    """Size of the model's joblib pickle: what models/rating_model.pkl would take."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.pkl")
+        joblib.dump(model, path)
+        return os.path.getsize(path)
+
+
+def benchmark(backend, X_train, X_test, y_train, y_test, n_jobs=-1, repeat=20):
+    """One result row for `backend` fitted and scored on the given split."""
+    model = make_model(backend, n_jobs=n_jobs, random_state=42)
+    t0 = time.perf_counter()
+    fit_model(model, X_train, y_train, n_jobs=n_jobs)
+    fit_s = time.perf_counter() - t0
+
+    pred = model.predict(X_test)
+    err = pred - np.asarray(y_test)
+    row = X_test.iloc[:1]
+    return {
+        "backend": backend,
+        "model": type(model).__name__,
+        "fit_s": fit_s,
+        "predict_row_ms": _best_of(lambda: model.predict(row), repeat) * 1000,
+        "predict_batch_ms": _best_of(lambda: model.predict(X_test), max(1, repeat // 10)) * 1000,
+        "model_bytes": model_nbytes(model),
+        "mae": float(np.mean(np.abs(err))),
+        "rmse": float(np.sqrt(np.mean(err ** 2))),
+    }
+
+
+def pick(results, max_mae, rank_by="predict_batch_ms"):
+    """Fastest result (by `rank_by`) whose MAE is within `max_mae`, or None."""
+    ok = [r for r in results if r["mae"] <= max_mae]
+    return min(ok, key=lambda r: r[rank_by]) if ok else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the training backends on one split.")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--n-jobs", type=int, default=-1, help="training threads (-1: all cores)")
+    parser.add_argument("--repeat", type=int, default=20, help="timing repeats for single-row predict")
+    parser.add_argument("--max-mae", type=float, default=None, help="accuracy bar for the recommendation")
+    parser.add_argument("--rank-by", choices=RANK_BY, default="predict_batch_ms")
+    parser.add_argument("--output", default=OUT, help="output stem (.json and .csv are written)")
+    args = parser.parse_args(argv)
+
+    ds = load_dataset(FEAT, TARGET)
+    X_train, X_test, y_train, y_test = ds.split()
+    print(f"Train samples: {len(X_train)}, Test samples: {len(X_test)}, threads: {args.n_jobs}")
+
+    results = []
+    for backend in args.backends:
+        try:
+            r = benchmark(backend, X_train, X_test, y_train, y_test, args.n_jobs, args.repeat)
+        except ImportError as e:
+            print(f"  {backend:<9} skipped ({e})")
+            continue
+        results.append(r)
+        print(f"  {backend:<9} fit {r['fit_s']:7.2f}s   predict 1 row {r['predict_row_ms']:7.2f} ms, "
+              f"{len(X_test)} rows {r['predict_batch_ms']:8.1f} ms   "
+              f"{r['model_bytes'] / 2**20:7.1f} MB   MAE {r['mae']:.4f}  RMSE {r['rmse']:.4f}")
+
+    report = {"n_train": len(X_train), "n_test": len(X_test), "n_jobs": args.n_jobs,
+              "results": results}
+    if args.max_mae is not None:
+        best = pick(results, args.max_mae, args.rank_by)
+        report.update(max_mae=args.max_mae, rank_by=args.rank_by,
+                      recommended=best["backend"] if best else None)
+        if best:
+            print(f"\nFastest by {args.rank_by} with MAE ≤ {args.max_mae}: {best['backend']}")
+        else:
+            print(f"\nNo backend reaches MAE ≤ {args.max_mae}")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output + ".json", "w") as f:
+        json.dump(report, f, indent=2)
+    pd.DataFrame(results).to_csv(args.output + ".csv", index=False)
+    print(f"Results -> {args.output}.json / .csv")
+
+
+if __name__ == "__main__":
+    main()
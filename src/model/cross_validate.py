@@ -3,43 +3,57 @@
 
 
 import os
-import pandas as pd
-import numpy as np
+import sys
+import json
+import argparse
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import cross_val_score
-from sklearn.metrics import make_scorer, mean_squared_error
-
-PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-FEAT_CSV     = os.path.join(PROJECT_ROOT, "data", "processed", "player_ratings_features.csv")
-TARGET_CSV   = os.path.join(PROJECT_ROOT, "data", "processed", "player_ratings_target.csv")
-
-# custom RMSE scorer
-def rmse(y_true, y_pred):
-    return np.sqrt(mean_squared_error(y_true, y_pred))
-rmse_scorer = make_scorer(rmse, greater_is_better=False)  # negative for sklearn
 
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
 
-def main():
-    # 1) Load engineered features and target
-    X = pd.read_csv(FEAT_CSV)
-    y = pd.read_csv(TARGET_CSV)["rating"].values
+from common.dataset import load_dataset
+from model.cv_engine import SPLITTERS, run_cv
 
-    # Handle any remaining infinities / NaNs
-    X.replace([np.inf, -np.inf], np.nan, inplace=True)
-    X.fillna(X.median(), inplace=True)
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+FEAT         = os.path.join(PROJECT_ROOT, "data", "processed", "player_ratings_features")
+TARGET       = os.path.join(PROJECT_ROOT, "data", "processed", "player_ratings_target")
+REPORTS      = os.path.join(PROJECT_ROOT, "reports")
 
-    # 2) Define model
-    rf = RandomForestRegressor(n_estimators=100, random_state=42)
 
-    # 3) 5‑fold CV
-    mae_scores = cross_val_score(rf, X, y, cv=5, scoring="neg_mean_absolute_error", n_jobs=-1)
-    rmse_scores = cross_val_score(rf, X, y, cv=5, scoring=rmse_scorer, n_jobs=-1)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="K-fold cross-validation of the baseline forest.")
+    parser.add_argument("--splitter", choices=SPLITTERS, default="kfold",
+                        help="kfold (contiguous folds, as before), group (by match) or time (by date)")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--n-jobs", type=int, default=-1, help="folds fitted in parallel")
+    parser.add_argument("--n-estimators", type=int, default=100)
+    args = parser.parse_args(argv)
 
-    mae_mean, mae_std = -mae_scores.mean(), mae_scores.std()
-    rmse_mean, rmse_std = -rmse_scores.mean(), rmse_scores.std()
+    # 1) Load engineered features and target (cleaned once, cached by common.dataset)
+    ds = load_dataset(FEAT, TARGET)
 
-    print(f"5‑fold CV MAE :  {mae_mean:.4f} ± {mae_std:.4f}")
-    print(f"5‑fold CV RMSE:  {rmse_mean:.4f} ± {rmse_std:.4f}")
+    # 2) Define model
+    rf = RandomForestRegressor(n_estimators=args.n_estimators, random_state=42)
+
+    # 3) One fit per fold; every metric comes from the same out-of-fold predictions
+    oof_path = os.path.join(REPORTS, f"cv_oof_{args.splitter}")
+    res = run_cv(rf, ds, args.splitter, args.folds, args.n_jobs, oof_path=oof_path)
+
+    k = args.folds
+    print(f"{k}‑fold CV MAE :  {res['mae_mean']:.4f} ± {res['mae_std']:.4f}")
+    print(f"{k}‑fold CV RMSE:  {res['rmse_mean']:.4f} ± {res['rmse_std']:.4f}")
+    print(f"Out-of-fold MAE {res['oof_mae']:.4f}, RMSE {res['oof_rmse']:.4f} "
+          f"over {res['n_tested']} rows ({args.splitter} splitter, {res['wall_s']:.1f}s)")
+    for title, key in (("rating band", "by_band"), ("position", "by_position")):
+        if res.get(key):
+            print(f"\nMAE by {title}")
+            for name, m in res[key].items():
+                print(f"  {name:>4}: {m['mae']:.4f}  (n={m['n']})")
+
+    with open(os.path.join(REPORTS, f"cv_{args.splitter}.json"), "w") as f:
+        json.dump(res, f, indent=2)
+    print(f"\nOOF predictions -> {res['oof_path']}")
 
 if __name__ == "__main__":
     main()
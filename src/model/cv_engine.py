@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# cv_engine.py
+#
+# Cross-validation that fits every fold exactly once and derives all metrics
+# (MAE, RMSE, per rating band, per position, per competition) from the same
+# out-of-fold (OOF) predictions.
+#
+# Folds run in parallel on a joblib process pool. The feature matrix is the
+# memory-mapped X.npy of the shared dataset cache (common/dataset.py); joblib
+# pickles a np.memmap as a reference to its file, so every worker maps the
+# same pages instead of receiving a copy.
+#
+# Splitters:
+#   kfold  KFold without shuffling — the folds cross_val_score(cv=5) used
+#   group  GroupKFold on `match`, so no match is split across train and test
+#   time   TimeSeriesSplit over rows ordered by `date` (train on the past,
+#          test on the next block); the first block is never predicted
+
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.model_selection import GroupKFold, KFold, TimeSeriesSplit
+
+from common.storage import write_table
+from eval.slicing import assign_bands, slice_metrics, get_slice
+
+SPLITTERS = ("kfold", "group", "time")
+
+def make_folds(kind, n_rows, n_splits=5, meta=None):
+    """List of (train, test) original-row positions for splitter `kind`."""
+    rows = np.arange(n_rows)
+    if kind == "kfold":
+        return list(KFold(n_splits).split(rows))
+    if meta is None:
+        raise ValueError(f"the '{kind}' splitter needs the cleaned-rows context (match/date)")
+    if kind == "group":
+        return list(GroupKFold(n_splits).split(rows, groups=meta["match"].to_numpy()))
+    if kind == "time":
+        order = np.argsort(pd.to_datetime(meta["date"]).to_numpy(), kind="stable")
+        return [(order[tr], order[te]) for tr, te in TimeSeriesSplit(n_splits).split(order)]
+    raise ValueError(f"unknown splitter '{kind}' (expected one of {SPLITTERS})")
+
+
+def _fit_fold(estimator, X, y, layout, fold, train, test):
+    """Fit one fold; `layout` maps original row positions to rows of X."""
+    t0 = time.perf_counter()
+    tr = layout[train]                   # keep original row order: same fit as cross_val_score
+    model = clone(estimator).fit(X[tr], y[tr])
+    fit_s = time.perf_counter() - t0
+    preds = model.predict(X[layout[test]])
+    return fold, test, preds, fit_s
+
+
+def oof_predict(estimator, X, y, folds, layout=None, n_jobs=-1):
+    """Out-of-fold predictions (NaN for never-tested rows), fold ids and per-fold fit times."""
+    n = len(y) if layout is None else len(layout)
+    layout = np.arange(n) if layout is None else layout
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_fold)(estimator, X, y, layout, k, tr, te) for k, (tr, te) in enumerate(folds))
+    oof = np.full(n, np.nan)
+    fold_of = np.full(n, -1, dtype=np.int16)
+    fit_s = np.zeros(len(folds))
+    for k, test, preds, secs in results:
+        oof[test] = preds
+        fold_of[test] = k
+        fit_s[k] = secs
+    return oof, fold_of, fit_s
+
+
+def _as_dict(part, key):
+    return {str(r[key]): {"mae": float(r["mae"]), "n": int(r["n"])} for _, r in part.iterrows()}
+
+
+def summarize(y_true, oof, fold_of, meta=None):
+    """Fold-wise and pooled metrics plus per-band/position/competition MAE from one OOF vector."""
+    tested = fold_of >= 0
+    y_t, p_t = y_true[tested], oof[tested]
+    keys = {"fold": fold_of[tested], "band": assign_bands(y_t), "all": np.zeros(len(y_t), np.int8)}
+    slices = ["fold", "band", "all"]
+    if meta is not None:
+        for col in ("pos", "competition"):
+            if col in meta.columns:
+                keys[col] = meta[col].to_numpy()[tested]
+                slices.append(col)
+    table = slice_metrics(y_t, p_t, keys, slices)
+
+    by_fold = get_slice(table, "fold")
+    folds = [{"fold": int(r["fold"]), "n": int(r["n"]), "mae": float(r["mae"]),
+              "rmse": float(r["rmse"])} for _, r in by_fold.iterrows()]
+    pooled = get_slice(table, "all").iloc[0]
+    out = {
+        "n_tested": int(tested.sum()),
+        "mae_mean": float(by_fold["mae"].mean()), "mae_std": float(by_fold["mae"].std(ddof=0)),
+        "rmse_mean": float(by_fold["rmse"].mean()), "rmse_std": float(by_fold["rmse"].std(ddof=0)),
+        "oof_mae": float(pooled["mae"]), "oof_rmse": float(pooled["rmse"]),
+        "folds": folds,
+        "by_band": _as_dict(get_slice(table, "band"), "band"),
+    }
+    for col, key in (("pos", "by_position"), ("competition", "by_competition")):
+        if col in keys:
+            out[key] = _as_dict(get_slice(table, col), col)
+    return out
+
+
+def save_oof(path, y_true, oof, fold_of, meta=None):
+    """Persist OOF predictions (one row per original row) for later reuse; returns the written path."""
+    df = pd.DataFrame({"row": np.arange(len(y_true)), "fold": fold_of,
+                       "rating": y_true, "oof_pred": oof})
+    if meta is not None:
+        keep = [c for c in ("match", "date", "player_name", "pos", "competition") if c in meta.columns]
+        df = pd.concat([df, meta[keep].reset_index(drop=True)], axis=1)
+    return write_table(df, path)
+
+
+def run_cv(estimator, ds, splitter="kfold", n_splits=5, n_jobs=-1, oof_path=None):
+    """Cross-validate `estimator` on a cached Dataset in one fit per fold."""
+    try:
+        meta = ds.meta("all")
+    except FileNotFoundError:
+        if splitter != "kfold":
+            raise
+        meta = None
+    y = np.asarray(ds.target("all"), dtype=np.float64)
+    folds = make_folds(splitter, len(y), n_splits, meta)
+    # ds.X holds the rows in train-then-test order; map original positions onto it
+    t0 = time.perf_counter()
+    oof, fold_of, fit_s = oof_predict(estimator, ds.X, np.asarray(ds.y), folds,
+                                      layout=ds.original_order, n_jobs=n_jobs)
+    result = summarize(y, oof, fold_of, meta)
+    result.update(splitter=splitter, n_splits=n_splits, wall_s=time.perf_counter() - t0,
+                  fit_s=fit_s.tolist())
+    if oof_path:
+        result["oof_path"] = save_oof(oof_path, y, oof, fold_of, meta)
+    return result
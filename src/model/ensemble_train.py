@@ -1,59 +1,75 @@
-#ensemble_train.py
+#!/usr/bin/env python3
+# ensemble_train.py
+#
+# Stacked ensemble of base learners on the engineered features (see
+# model/stacking.py). Base-learner fits are cached, so re-running with another
+# meta-learner, or with one more learner, only fits what is new.
+#
+#   python src/model/ensemble_train.py                              # rf + lightgbm, linear stack
+#   python src/model/ensemble_train.py --learners rf lightgbm hgb --meta mean
+#   python src/model/ensemble_train.py --params '{"rf": {"n_estimators": 300}}'
 
 import os
-import pandas as pd
-import numpy as np
-from sklearn.ensemble import RandomForestRegressor, VotingRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_absolute_error, mean_squared_error
+import sys
+import json
+import argparse
+
 import joblib
-from lightgbm import LGBMRegressor
-
-def main():
-    # Determine project structure paths
-    script_dir = os.path.dirname(__file__)
-    project_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
-    data_file = os.path.join(project_root, 'data', 'raw', 'data_football_ratings.csv')
-    
-    # Load the dataset
-    df = pd.read_csv(data_file)
-    target_column = 'target'
-    if target_column not in df.columns:
-        raise ValueError(f"Target column '{target_column}' not found in data")
-    
-    # Prepare features and target
-    X = df.drop(columns=[target_column], errors='ignore')
-    if 'pos' in X.columns:
-        X = X.drop(columns=['pos'])
-    y = df[target_column]
-    
-    # Split into training and test sets
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
-    )
-    
-    # Initialize individual regressors
-    rf = RandomForestRegressor(random_state=42)
-    lgbm = LGBMRegressor(random_state=42)
-    ensemble = VotingRegressor([('rf', rf), ('lgbm', lgbm)])
-    
-    # Train the ensemble
-    ensemble.fit(X_train, y_train)
-    
-    # Predict on the test set
-    y_pred = ensemble.predict(X_test)
-    
-    # Evaluate performance
-    mae = mean_absolute_error(y_test, y_pred)
-    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-    print(f"Ensemble Model MAE:  {mae:.4f}")
-    print(f"Ensemble Model RMSE: {rmse:.4f}")
-    
-    # Save the trained ensemble model
-    models_dir = os.path.join(project_root, 'models')
-    os.makedirs(models_dir, exist_ok=True)
-    joblib.dump(ensemble, os.path.join(models_dir, 'voting_ensemble.pkl'))
-    print("Trained ensemble model saved to 'models/voting_ensemble.pkl'.")
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.dataset import load_dataset
+from common.profiling import span, stage
+from model.stacking import LEARNERS, METAS, build
+
+ROOT   = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+PROC   = os.path.join(ROOT, "data", "processed")
+FEAT   = os.path.join(PROC, "player_ratings_features")
+TARGET = os.path.join(PROC, "player_ratings_target")
+MODEL  = os.path.join(ROOT, "models", "stacked_ensemble.pkl")
+REPORT = os.path.join(ROOT, "reports", "ensemble.json")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train a stacked ensemble with cached base learners.")
+    parser.add_argument("--learners", nargs="+", choices=sorted(LEARNERS), default=["rf", "lightgbm"])
+    parser.add_argument("--params", default="{}",
+                        help='JSON overrides per learner, e.g. \'{"rf": {"n_estimators": 300}}\'')
+    parser.add_argument("--meta", choices=METAS, default="linear")
+    parser.add_argument("--folds", type=int, default=5, help="folds for the out-of-fold predictions")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="base-learner fits run at once")
+    parser.add_argument("--tree-jobs", type=int, default=1, help="threads per base-learner fit")
+    parser.add_argument("--output", default=MODEL)
+    args = parser.parse_args(argv)
+
+    overrides = json.loads(args.params)
+    unknown = set(overrides) - set(args.learners)
+    if unknown:
+        raise SystemExit(f"--params for learners not in --learners: {', '.join(sorted(unknown))}")
+    learners = {n: (LEARNERS[n][0], {**LEARNERS[n][1], **overrides.get(n, {})}) for n in args.learners}
+
+    with stage("ensemble", meta=args.meta):
+        ds = load_dataset(FEAT, TARGET)
+        with span("build", learners=len(learners)):
+            ensemble, report = build(ds, learners, args.meta, args.folds, args.n_jobs, args.tree_jobs)
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+        joblib.dump(ensemble, args.output)
+
+    print(f"\n{'member':<10} {'OOF MAE':>8} {'test MAE':>9} {'weight':>7}  cached")
+    for name, m in report["members"].items():
+        print(f"{name:<10} {m['oof_mae']:>8.4f} {m['test_mae']:>9.4f} {m['weight']:>7.3f}  "
+              f"{'yes' if m['cached'] else 'no'}")
+    print(f"{'ensemble':<10} {report['oof_mae']:>8.4f} {report['test_mae']:>9.4f}  "
+          f"({args.meta}, intercept {report['intercept']:.3f})")
+
+    report["model"] = args.output
+    os.makedirs(os.path.dirname(REPORT), exist_ok=True)
+    with open(REPORT, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nEnsemble saved to {args.output}\nReport -> {REPORT}")
+
 
 if __name__ == "__main__":
     main()
@@ -3,55 +3,48 @@
 
 
 import os
+import sys
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_absolute_error
-import joblib
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.dataset import load_dataset
+from eval.prediction_store import PredictionStore
+from eval.slicing import slice_metrics, format_slice
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-CLEAN_CSV    = os.path.join(PROJECT_ROOT, "data", "processed", "player_ratings_cleaned.csv")
-FEAT_CSV     = os.path.join(PROJECT_ROOT, "data", "processed", "player_ratings_features.csv")
+CLEAN        = os.path.join(PROJECT_ROOT, "data", "processed", "player_ratings_cleaned")
+FEAT         = os.path.join(PROJECT_ROOT, "data", "processed", "player_ratings_features")
+TARGET       = os.path.join(PROJECT_ROOT, "data", "processed", "player_ratings_target")
 MODEL_PATH   = os.path.join(PROJECT_ROOT, "models", "rating_model.pkl")
 REPORT_PATH  = os.path.join(PROJECT_ROOT, "reports", "residuals_by_position.png")
+SLICES_PATH  = os.path.join(PROJECT_ROOT, "reports", "errors_by_position.csv")
 
 
 def main():
-    # 1) Load cleaned data (for pos + rating)
-    cleaned_df = pd.read_csv(CLEAN_CSV)
-    if "pos" not in cleaned_df.columns or "rating" not in cleaned_df.columns:
-        raise ValueError("'pos' or 'rating' column missing in cleaned cleaned_df")
-
-    # 2) Load engineered feature matrix (matches the model)
-    X_all = pd.read_csv(FEAT_CSV)
-    y_all = cleaned_df["rating"].values  # same ordering because features built from this
-    pos_all = cleaned_df["pos"].values
-
-    # 3) Train/test split with same seed
-    X_train, X_test, y_train, y_test, pos_train, pos_test = train_test_split(
-        X_all, y_all, pos_all, test_size=0.2, random_state=42
-    )
-
-    # 4) Load trained model
-    model = joblib.load(MODEL_PATH)
+    # 1)–3) Cleaned feature matrix, its cached train/test split and the
+    #        row-aligned positions from the cleaned rows
+    ds = load_dataset(FEAT, TARGET, CLEAN)
+    X_train, X_test, y_train, y_test = ds.split()
+    pos_test = ds.meta("test", ["pos"])["pos"].values
 
-    # 5) Predict on test
-    y_pred = model.predict(X_test)
+    # 4)–5) Test predictions of the trained model (stored, or computed once)
+    y_pred = PredictionStore().predict_split(ds, "test", MODEL_PATH)
 
-    # 6) Compute MAE per position
-    df_res = pd.DataFrame({
-        "pos": pos_test,
-        "y_true": y_test,
-        "y_pred": y_pred
-    })
+    # 6) MAE / RMSE / bias per position in one pass
+    table = slice_metrics(y_test, y_pred, {"pos": pos_test})
     print("\nMAE by player position:")
-    for p, grp in df_res.groupby("pos"):
-        mae = mean_absolute_error(grp["y_true"], grp["y_pred"])
-        print(f"  {p}: {mae:.4f}")
+    for line in format_slice(table, "pos", width=0, metrics=("mae", "rmse", "bias")):
+        print(f"  {line}")
+    os.makedirs(os.path.dirname(SLICES_PATH), exist_ok=True)
+    table.to_csv(SLICES_PATH, index=False)
+    print(f"Per-position metrics saved to {SLICES_PATH}")
 
     # 7) Residual boxplot
-    df_res["residual"] = df_res["y_true"] - df_res["y_pred"]
+    import matplotlib.pyplot as plt    # only needed for the plot
+    df_res = pd.DataFrame({"pos": pos_test, "residual": y_test - y_pred})
     plt.figure(figsize=(10, 6))
     df_res.boxplot(column="residual", by="pos", rot=45)
     plt.title("Residuals by Position (test set)")
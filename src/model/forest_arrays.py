@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# forest_arrays.py
+#
+# Array-backed inference for the RandomForest artifacts.
+#
+# All trees of a fitted forest are flattened into one set of contiguous node
+# arrays (feature, threshold, left, value), and traversal is vectorized over
+# every (row, tree) pair at once. This avoids sklearn's per-estimator dispatch,
+# which dominates small batches. The arrays are saved as plain .npy files, so
+# loading is an np.load(mmap_mode="r") instead of an unpickle.
+#
+# Layout: each tree is renumbered breadth-first so the two children of a node
+# are adjacent (right = left + 1). One step is then
+#     node = left[node] + (x[feature[node]] > threshold[node])
+# Leaves point to themselves with threshold +inf, so finished pairs stay put
+# until they are compacted away.
+#
+# Thresholds are stored as float32, rounded *down* from sklearn's float64.
+# sklearn casts X to float32 before comparing, and for any float32 x,
+# x <= t  ⇔  x <= round_down32(t), so the float32 thresholds are lossless.
+# Leaf values stay float64 unless --float32-leaves halves them (predictions
+# then differ from sklearn's by float32 rounding, ~1e-7 relative).
+#
+# meta.json is the artifact's header: tree counts, feature names, leaf dtype,
+# and where the model came from (the pickle's digest, the cached dataset it
+# was trained on, and the feature transformer's path, digest and NaN fill
+# values). Loaders check it to catch a model scored with the wrong transformer
+# or evaluated on another split. The module imports nothing but NumPy, so
+# loading and scoring a forest never pays for pandas or sklearn.
+#
+# The .npy arrays are stored uncompressed so every process maps the same page
+# cache. For cold storage, --compress also writes <model>.forest.npz, a single
+# zip of the same arrays plus the header. It loads into private memory (no
+# mmap); unpack() turns it back into a directory.
+#
+#   python src/model/forest_arrays.py --model models/rating_model.pkl --benchmark
+#   → models/rating_model.forest/  (loadable wherever a model path is accepted)
+#   python src/model/forest_arrays.py --model models/rating_model.pkl --float32-leaves --compress
+
+import os, sys, json, time, shutil, argparse
+
+import numpy as np
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.hashing import file_digest
+
+ARRAYS = ("feature", "threshold", "left", "value", "missing_left", "roots")
+META_FILE = "meta.json"
+FOREST_SUFFIX = ".forest"
+COMPRESSED_SUFFIX = ".forest.npz"
+FORMAT_VERSION = 2    # 2: header fields and leaf_dtype
+COMPACT_EVERY = 4     # traversal steps between dropping (row, tree) pairs that reached a leaf
+
+
+def _threshold32(threshold):
+    t32 = threshold.astype(np.float32)
+    above = t32.astype(np.float64) > threshold
+    t32[above] = np.nextafter(t32[above], np.float32(-np.inf))
+    return t32
+
+
+def _breadth_first(tree):
+    """Old node ids in breadth-first order, with both children of a node adjacent."""
+    cl, cr = tree.children_left, tree.children_right
+    order, frontier = [], np.array([0])
+    while frontier.size:
+        order.append(frontier)
+        internal = frontier[cl[frontier] != -1]
+        frontier = np.column_stack([cl[internal], cr[internal]]).ravel()
+    return np.concatenate(order)
+
+
+def is_forest_dir(path):
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+def is_forest_npz(path):
+    return path.endswith(COMPRESSED_SUFFIX) and os.path.isfile(path)
+
+
+def read_header(path):
+    """The meta.json header of a forest directory or .forest.npz; None for anything else."""
+    if is_forest_dir(path):
+        with open(os.path.join(path, META_FILE)) as f:
+            return json.load(f)
+    if is_forest_npz(path):
+        with np.load(path) as z:
+            return json.loads(str(z["meta"]))
+    return None
+
+
+class ForestArrays:
+    """A fitted tree ensemble as flat node arrays with a vectorised `predict`."""
+
+    def __init__(self, arrays, meta):
+        self.arrays = arrays
+        self.meta = meta
+        self.feature_names_in_ = np.array(meta["feature_names"], dtype=object) \
+            if meta.get("feature_names") else None
+        self.n_features_in_ = meta["n_features"]
+        # plain ndarray views: np.take on a np.memmap subclass pays for the wrapper every step
+        self._feature = np.asarray(arrays["feature"], dtype=np.intp)
+        self._left = np.asarray(arrays["left"], dtype=np.intp)
+        self._threshold = np.asarray(arrays["threshold"])
+        self._missing_left = np.asarray(arrays["missing_left"])
+        self._value = np.asarray(arrays["value"])
+
+    # ── conversion ──
+    @classmethod
+    def from_model(cls, model, leaf_dtype=np.float64, **header):
+        """Flatten a fitted RandomForest/ExtraTrees regressor (or a single tree).
+
+        `header` (source_sha256, dataset, transformer, …) is stored in the meta.
+        """
+        estimators = getattr(model, "estimators_", [model])
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("only single-output regressors can be flattened")
+        parts = {k: [] for k in ARRAYS if k != "roots"}
+        roots, offset, max_depth = [], 0, 0
+        for est in estimators:
+            t = est.tree_
+            n = t.node_count
+            order = _breadth_first(t)
+            new_id = np.empty(n, dtype=np.int64)
+            new_id[order] = np.arange(n)
+            leaf = t.children_left[order] == -1
+            left = np.where(leaf, np.arange(n), new_id[np.where(leaf, 0, t.children_left[order])])
+            mgl = getattr(t, "missing_go_to_left", None)
+            mgl = np.zeros(n, np.uint8) if mgl is None else np.asarray(mgl, dtype=np.uint8)[order]
+            parts["feature"].append(np.where(leaf, 0, t.feature[order]).astype(np.intp))
+            parts["threshold"].append(np.where(leaf, np.float32(np.inf),
+                                               _threshold32(t.threshold[order])))
+            parts["left"].append((left + offset).astype(np.intp))
+            parts["value"].append(t.value[order, 0, 0].astype(leaf_dtype))
+            parts["missing_left"].append(np.where(leaf, 1, mgl).astype(np.uint8))
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, int(t.max_depth))
+        arrays = {k: np.concatenate(v) for k, v in parts.items()}
+        arrays["roots"] = np.array(roots, dtype=np.int32)
+        names = getattr(model, "feature_names_in_", None)
+        meta = {
+            "format": FORMAT_VERSION,
+            "source": type(model).__name__,
+            "n_trees": len(estimators),
+            "n_nodes": int(offset),
+            "max_depth": max_depth,
+            "n_features": int(model.n_features_in_),
+            "feature_names": [str(c) for c in names] if names is not None else None,
+            "leaf_dtype": np.dtype(leaf_dtype).name,
+            **header,
+        }
+        return cls(arrays, meta)
+
+    # ── persistence ──
+    def save(self, directory):
+        """Write the directory next to any old one, then swap it in.
+
+        Processes that still map the old arrays keep reading them until they reload.
+        """
+        directory = directory.rstrip(os.sep)
+        tmp = f"{directory}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for k, a in self.arrays.items():
+            np.save(os.path.join(tmp, f"{k}.npy"), np.ascontiguousarray(a))
+        with open(os.path.join(tmp, META_FILE), "w") as f:
+            json.dump(self.meta, f, indent=2)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.rename(tmp, directory)
+        return directory
+
+    def save_compressed(self, path):
+        """Cold-storage copy: one compressed .forest.npz with the header inside."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:      # a file object: savez would append ".npz" to a name
+            np.savez_compressed(f, meta=np.array(json.dumps(self.meta)),
+                                **{k: np.ascontiguousarray(a) for k, a in self.arrays.items()})
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        arrays = {k: np.load(os.path.join(directory, f"{k}.npy"), mmap_mode=mmap_mode)
+                  for k in ARRAYS}
+        return cls(arrays, meta)
+
+    @classmethod
+    def load_compressed(cls, path):
+        with np.load(path) as z:
+            return cls({k: z[k] for k in ARRAYS}, json.loads(str(z["meta"])))
+
+    # ── inference ──
+    def _matrix(self, X):
+        if hasattr(X, "columns"):          # a DataFrame; pandas itself is never imported here
+            if self.feature_names_in_ is not None:
+                missing = [c for c in self.feature_names_in_ if c not in X.columns]
+                if missing:
+                    raise KeyError(f"X lacks {len(missing)} of the forest's features: "
+                                   f"{', '.join(map(str, missing[:10]))}{', …' if len(missing) > 10 else ''}")
+                X = X[list(self.feature_names_in_)]
+            X = X.to_numpy(dtype=np.float32, na_value=np.nan)
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, the forest expects {self.n_features_in_}")
+        return X
+
+    def apply(self, X):
+        """Leaf index of every (tree, row) pair, shape (trees, rows)."""
+        feature, left = self._feature, self._left
+        threshold, missing_left = self._threshold, self._missing_left
+        roots = np.asarray(self.arrays["roots"], dtype=np.intp)
+        n, d = X.shape
+        flat = X.ravel()
+        has_nan = bool(np.isnan(flat).any())
+        # tree-major order keeps consecutive gathers inside one tree's nodes
+        node = np.repeat(roots, n)
+        base = np.tile(np.arange(n, dtype=np.intp) * d, len(roots))
+        pos = np.arange(node.size)
+        leaves = np.empty(node.size, dtype=np.intp)
+        step = 0
+        while node.size:
+            x = np.take(flat, base + np.take(feature, node, mode="clip"), mode="clip")
+            go_right = x > np.take(threshold, node, mode="clip")
+            if has_nan:
+                go_right |= np.isnan(x) & (np.take(missing_left, node, mode="clip") == 0)
+            node = np.take(left, node, mode="clip") + go_right
+            step += 1
+            if step % COMPACT_EVERY == 0:
+                done = np.take(left, node, mode="clip") == node
+                if done.any():
+                    leaves[pos[done]] = node[done]
+                    keep = ~done
+                    node, base, pos = node[keep], base[keep], pos[keep]
+        return leaves.reshape(len(roots), n)
+
+    def predict(self, X, block_rows=1_000):
+        X = self._matrix(X)
+        value = self._value
+        out = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), block_rows):
+            leaves = self.apply(X[start:start + block_rows])
+            out[start:start + block_rows] = value[leaves].mean(axis=0, dtype=np.float64)
+        return out
+
+
+def load_forest_or_model(path):
+    """A flattened forest directory, a .forest.npz or a pickled model, whichever `path` is."""
+    if os.path.isdir(path) and is_forest_dir(path):
+        return ForestArrays.load(path)
+    if is_forest_npz(path):
+        return ForestArrays.load_compressed(path)
+    import joblib
+    return joblib.load(path)
+
+
+def unpack(path, directory=None):
+    """Expand a .forest.npz into a mappable forest directory; returns the directory."""
+    directory = directory or path[:-len(".npz")]
+    return ForestArrays.load_compressed(path).save(directory)
+
+
+def provenance(model_path, transformer_path=None, dataset=None):
+    """Header fields tying a flattened forest to its pickle, training split and transformer."""
+    header = {"source_sha256": file_digest(model_path), "dataset": dataset}
+    if transformer_path and os.path.isfile(transformer_path):
+        from features.transformer import FeatureTransformer
+        t = FeatureTransformer.load(transformer_path)
+        fill = t.feature_medians_.reindex(t.feature_columns_).fillna(0)
+        header["transformer"] = {"path": os.path.basename(transformer_path),
+                                 "sha256": file_digest(transformer_path),
+                                 # NaN/inf fill values, for scoring without the transformer
+                                 "feature_medians": {str(c): float(v) for c, v in fill.items()}}
+    return header
+
+
+def export(model, model_path, transformer_path=None, dataset=None, leaf_dtype=np.float64,
+           compress=False):
+    """Write <model>.forest next to a just-saved pickle; returns its path.
+
+    Models that cannot be flattened (the boosting backends) get None, and a
+    stale .forest from an earlier forest under the same name is removed so
+    loaders do not prefer it over the new pickle. So is a stale .forest.npz
+    when `compress` is off.
+    """
+    stem = os.path.splitext(model_path)[0]
+    if not all(hasattr(est, "tree_") for est in getattr(model, "estimators_", [model])):
+        for old in (stem + FOREST_SUFFIX, stem + COMPRESSED_SUFFIX):
+            if os.path.isdir(old):
+                shutil.rmtree(old)
+            elif os.path.isfile(old):
+                os.remove(old)
+        return None
+    forest = ForestArrays.from_model(model, leaf_dtype,
+                                     **provenance(model_path, transformer_path, dataset))
+    if compress:
+        forest.save_compressed(stem + COMPRESSED_SUFFIX)
+    elif os.path.isfile(stem + COMPRESSED_SUFFIX):
+        os.remove(stem + COMPRESSED_SUFFIX)
+    return forest.save(stem + FOREST_SUFFIX)
+
+
+def _bench(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flatten a fitted forest into mmap-able arrays.")
+    parser.add_argument("--model", required=True, help="pickled RandomForest artifact")
+    parser.add_argument("--output", default=None, help=f"output directory (default: <model>{FOREST_SUFFIX})")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="check parity and time sklearn vs array predict on the feature table")
+    parser.add_argument("--features", default=os.path.join("data", "processed", "player_ratings_features"))
+    parser.add_argument("--float32-leaves", action="store_true", help="store leaf values as float32")
+    parser.add_argument("--compress", action="store_true",
+                        help=f"also write a compressed <model>{COMPRESSED_SUFFIX} for cold storage")
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.splitext(args.model)[0] + FOREST_SUFFIX
+    t0 = time.perf_counter()
+    import joblib
+    from common.storage import read_table
+    model = joblib.load(args.model)
+    t_pickle = time.perf_counter() - t0
+    from features.transformer import default_path
+    header = provenance(args.model, default_path(args.model))
+    forest = ForestArrays.from_model(model, np.float32 if args.float32_leaves else np.float64, **header)
+    forest.save(output)
+    t0 = time.perf_counter()
+    forest = ForestArrays.load(output)
+    t_mmap = time.perf_counter() - t0
+    print(f"Flattened {forest.meta['n_trees']} trees / {forest.meta['n_nodes']:,} nodes → {output}")
+    print(f"Load: pickle {t_pickle * 1000:.1f} ms, mmap arrays {t_mmap * 1000:.1f} ms")
+    if args.compress:
+        packed = forest.save_compressed(os.path.splitext(args.model)[0] + COMPRESSED_SUFFIX)
+        print(f"Compressed copy: {os.path.getsize(packed) / 2**20:.1f} MB → {packed}")
+
+    if args.benchmark:
+        X = read_table(args.features)
+        X = X.replace([np.inf, -np.inf], np.nan).fillna(X.median(numeric_only=True))
+        X = X[list(model.feature_names_in_)] if hasattr(model, "feature_names_in_") else X
+        diff = np.abs(model.predict(X) - forest.predict(X)).max()
+        print(f"Max |sklearn - arrays| over {len(X)} rows: {diff:.2e}")
+        for n in sorted({1, 64, 1024, len(X)}):
+            rows = X.iloc[:n]
+            repeat = 50 if n < 1024 else 5
+            t_sk = _bench(lambda: model.predict(rows), repeat)
+            t_fa = _bench(lambda: forest.predict(rows), repeat)
+            print(f"{n:>8} rows: sklearn {t_sk * 1000:8.2f} ms   arrays {t_fa * 1000:8.2f} ms"
+                  f"   ({t_sk / t_fa:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
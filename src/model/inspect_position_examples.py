@@ -3,60 +3,50 @@
 
 
 import os
-import numpy as np
-import pandas as pd
-import joblib
-from sklearn.model_selection import train_test_split
+import sys
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.dataset import load_dataset
+from eval.prediction_store import PredictionStore
+from eval.slicing import assign_bands
+from predict.position_router import PositionRouter
 
 # ── Project‑relative paths ───────────────────────────────────────────
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 PROC = os.path.join(ROOT, "data", "processed")
-FEAT_CSV   = os.path.join(PROC, "player_ratings_features.csv")
-TARGET_CSV = os.path.join(PROC, "player_ratings_target.csv")
-CLEAN_CSV  = os.path.join(PROC, "player_ratings_cleaned.csv")
+FEAT       = os.path.join(PROC, "player_ratings_features")
+TARGET     = os.path.join(PROC, "player_ratings_target")
+CLEAN      = os.path.join(PROC, "player_ratings_cleaned")
 BASEMODEL  = os.path.join(ROOT, "models", "rating_model.pkl")
 MODELDIR   = os.path.join(ROOT, "models")
 
-# ── Load data ────────────────────────────────────────────────────────
-X = pd.read_csv(FEAT_CSV)
-y = pd.read_csv(TARGET_CSV)["rating"].values
-clean = pd.read_csv(CLEAN_CSV)  # has pos, team, competition, minutes
-
-X.replace([np.inf, -np.inf], np.nan, inplace=True)
-X.fillna(X.median(), inplace=True)
-
-# Recreate the same 80/20 split as training
-X_tr, X_te, y_tr, y_te, clean_tr, clean_te = train_test_split(
-    X, y, clean, test_size=0.2, random_state=42)
-X_te = X_te.reset_index(drop=True)
-clean_te = clean_te.reset_index(drop=True)
-
-# ── Helper: load pos‑specific model or fallback ─────────────────────
-def model_for_pos(pos):
-    f = os.path.join(MODELDIR, f"rf_pos_{pos}.pkl")
-    return joblib.load(f) if os.path.exists(f) else joblib.load(BASEMODEL)
-
 # rating bands we want to sample
-BANDS = [ (5.75, 6.25), (6.75, 7.25), (7.75, 10.01) ]
+BANDS = [ ("≈6", 5.75, 6.25), ("≈7", 6.75, 7.25), ("≥8", 7.75, 10.01) ]
 
-rows = []
-for pos in sorted(clean_te["pos"].unique()):
-    mask_pos = clean_te["pos"] == pos
-    df_pos   = clean_te[mask_pos]
-    X_pos    = X_te[mask_pos]
-    if df_pos.empty:
-        continue
+def main():
+    # ── Load data ────────────────────────────────────────────────────────
+    # Same cleaned 80/20 split as training, from the shared dataset cache
+    ds = load_dataset(FEAT, TARGET, CLEAN)
+    X_te = ds.features("test")
+    clean_te = ds.meta("test", ["pos", "team", "competition", "minutesPlayed", "rating"])
 
-    model = model_for_pos(pos)
+    # ── Pick the first test row of every (position, band) ───────────────
+    banded = clean_te.assign(band=assign_bands(clean_te["rating"], BANDS)).dropna(subset=["band"])
+    picks = (banded.groupby(["pos", "band"], observed=True).head(1)
+                   .sort_values(["pos", "band"]).index)
 
-    for lo, hi in BANDS:
-        band_rows = df_pos[(df_pos["rating"] >= lo) & (df_pos["rating"] < hi)]
-        if band_rows.empty:
-            continue
-        row = band_rows.iloc[0]  # pick first
-        pred = model.predict(X_pos.loc[[row.name]])[0]
+    # ── Score all picks in one routed batch (pos-specific model or fallback) ──
+    router = PositionRouter(MODELDIR, BASEMODEL, store=PredictionStore())
+    preds = router.predict(X_te.loc[picks], clean_te.loc[picks, "pos"].values)
+
+    rows = []
+    for i, pred in zip(picks, preds):
+        row = clean_te.loc[i]
         rows.append({
-            "pos": pos,
+            "pos": row["pos"],
             "competition": row["competition"],
             "team": row["team"],
             "minutes": int(row["minutesPlayed"]),
@@ -65,9 +55,12 @@ for pos in sorted(clean_te["pos"].unique()):
             "abs_err": abs(row["rating"] - pred)
         })
 
-# ── Display ─────────────────────────────────────────────────────────
-print("\nPosition‑specific model sample predictions")
-print(f"{'Pos':3}  {'Competition':18} {'Team':18}  Min  True  Pred  AbsErr")
-for r in rows:
-    print(f"{r['pos']:3}  {r['competition'][:18]:18} {r['team'][:18]:18}  {r['minutes']:3d}  "
-          f"{r['true']:.2f}  {r['pred']:.2f}   {r['abs_err']:.2f}")
+    # ── Display ─────────────────────────────────────────────────────────
+    print("\nPosition‑specific model sample predictions")
+    print(f"{'Pos':3}  {'Competition':18} {'Team':18}  Min  True  Pred  AbsErr")
+    for r in rows:
+        print(f"{r['pos']:3}  {r['competition'][:18]:18} {r['team'][:18]:18}  {r['minutes']:3d}  "
+              f"{r['true']:.2f}  {r['pred']:.2f}   {r['abs_err']:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -3,58 +3,58 @@
 
 
 
-import os, pandas as pd, numpy as np, joblib
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_absolute_error
+import os, sys, pandas as pd
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.dataset import load_dataset
+from eval.prediction_store import PredictionStore
+from eval.slicing import assign_bands, slice_metrics, format_slice
 
 # ── Paths ───────────────────────────────────────────────────────────
 ROOT       = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-FEAT_CSV   = os.path.join(ROOT, "data", "processed", "player_ratings_features.csv")
-TARGET_CSV = os.path.join(ROOT, "data", "processed", "player_ratings_target.csv")
-CLEAN_CSV  = os.path.join(ROOT, "data", "processed", "player_ratings_cleaned.csv")
+FEAT       = os.path.join(ROOT, "data", "processed", "player_ratings_features")
+TARGET     = os.path.join(ROOT, "data", "processed", "player_ratings_target")
+CLEAN      = os.path.join(ROOT, "data", "processed", "player_ratings_cleaned")
 MODEL_PATH = os.path.join(ROOT, "models", "rating_model.pkl")
 
+TIERS = [("≈6", 5.75, 6.25), ("≈7", 6.75, 7.25), ("≈8", 7.75, 8.25), ("≈9", 8.75, 9.25)]
+
 # ── Helper to grab ≤2 rows in each rating band ───────────────────────
-def pick_examples(df_test, bands):
-    picks = []
-    for lo, hi in bands:
-        band = df_test[(df_test["rating"] >= lo) & (df_test["rating"] < hi)]
-        picks.append(band.head(2))        # take first 2 rows in band
-    return pd.concat(picks, ignore_index=True)
+def pick_examples(df_test, tiers):
+    tier = assign_bands(df_test["rating"], tiers)
+    # first 2 rows of each tier, keeping test-row labels to fetch their features
+    return df_test[pd.notna(tier)].groupby(tier[pd.notna(tier)], observed=True).head(2)
 
 def main():
     # 1) Load data
-    X = pd.read_csv(FEAT_CSV)
-    y = pd.read_csv(TARGET_CSV)["rating"].values
-    cleaned = pd.read_csv(CLEAN_CSV)
-
-    # 2) Recreate 80/20 train-test split (same seed as training)
-    X_train, X_test, y_train, y_test, clean_train, clean_test = train_test_split(
-        X, y, cleaned, test_size=0.2, random_state=42
-    )
-    # Reset indices so they align 1-to-1
-    X_test = X_test.reset_index(drop=True)
-    clean_test = clean_test.reset_index(drop=True)
+    # 2) Cached 80/20 split (same seed as training); meta rows align 1-to-1
+    ds = load_dataset(FEAT, TARGET, CLEAN)
+    X_train, X_test, y_train, y_test = ds.split()
+    clean_test = ds.meta("test", ["competition", "team", "pos", "minutesPlayed"])
 
     # 3) Build a test DataFrame with context + true rating
     test_df = clean_test.copy()
     test_df["rating"] = y_test
 
     # 4) Select examples in four rating tiers
-    tiers = [(5.75, 6.25), (6.75, 7.25), (7.75, 8.25), (8.75, 9.25)]
-    samp_df = pick_examples(test_df, tiers)
+    samp_df = pick_examples(test_df, TIERS)
     if samp_df.empty:
         print("No examples found in the requested tiers.")
         return
 
-    # 5) Get corresponding feature rows
-    feat_rows = X_test.loc[samp_df.index]
+    # 5) Test-set predictions (for the tier summary), shared with the other reports
+    preds = PredictionStore().predict_split(ds, "test", MODEL_PATH)
 
-    # 6) Load model and predict
-    model = joblib.load(MODEL_PATH)
-    preds = model.predict(feat_rows)
+    # 6) Error of every tier, then the picked rows
+    table = slice_metrics(y_test, preds, {"tier": assign_bands(y_test, TIERS)})
+    print("\nTest-set error by rating tier")
+    for line in format_slice(table, "tier", metrics=("mae", "bias")):
+        print(line)
 
-    samp_df["pred_rating"] = preds
+    samp_df["pred_rating"] = preds[samp_df.index]
     samp_df["abs_err"] = (samp_df["rating"] - samp_df["pred_rating"]).abs()
 
     # 7) Display results
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# lineage.py
+#
+# Version history of a model artifact. It is kept next to the model as
+# <model>.lineage.json (models/rating_model.lineage.json), one entry per
+# full fit (train_model.py) or incremental update (update_model.py):
+#
+#   version      1, 2, … in the order the artifact was written
+#   kind         "full" or "update"
+#   parent       version the update started from (None for a full fit)
+#   until        latest match date the model has seen
+#   sha256       digest of the artifact written, so a model replaced behind
+#                the history's back is detected
+#
+# plus whatever the writer adds (rows, trees, MAEs, timings).
+
+import os
+import json
+import datetime as dt
+
+from common.hashing import file_digest
+
+
+def lineage_path(model_path):
+    return os.path.splitext(model_path)[0] + ".lineage.json"
+
+
+def load_lineage(model_path):
+    """The model's entries, oldest first ([] if it has no history)."""
+    path = lineage_path(model_path)
+    if not os.path.isfile(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def current(model_path):
+    """Latest entry if it still describes the artifact on disk, else None."""
+    entries = load_lineage(model_path)
+    if not entries or not os.path.isfile(model_path):
+        return None
+    last = entries[-1]
+    return last if last.get("sha256") == file_digest(model_path) else None
+
+
+def record(model_path, kind, **fields):
+    """Append an entry for the artifact just written to `model_path`; returns it."""
+    entries = load_lineage(model_path)
+    entry = {"version": entries[-1]["version"] + 1 if entries else 1, "kind": kind,
+             "parent": entries[-1]["version"] if entries and kind == "update" else None,
+             "created_at": dt.datetime.now().isoformat(timespec="seconds"),
+             "sha256": file_digest(model_path), **fields}
+    entries.append(entry)
+    path = lineage_path(model_path)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(entries, f, indent=2, default=str)
+    os.replace(tmp, path)
+    return entry
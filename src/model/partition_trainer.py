@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# partition_trainer.py
+#
+# Train one specialist model per value of a partition key (pos, competition,
+# pos_role, …) in parallel.
+#
+# The feature matrix is never copied to the workers. Every worker maps the
+# dataset cache's X.npy / y.npy (common/dataset.py) read-only, so all
+# processes share the same page-cache pages. A task carries only the row
+# numbers of its partition. Workers gather their own rows and fit.
+#
+# Parallelism is split two ways: --procs partitions train at the same time,
+# each forest with --tree-jobs threads. By default procs × tree_jobs = all
+# cores: many small partitions favour processes, a few big ones favour trees.
+# Tasks start largest first, so the biggest partition does not end up alone
+# at the tail.
+#
+# Each partition keeps the historical train_pos_models.py protocol: its rows
+# in table order, its own train_test_split(test_size=0.2, random_state=42)
+# and random_state=42. Models and MAEs are therefore the same whatever the
+# parallel layout. Artifacts go to models/<backend>_<key>_<value>.pkl (e.g.
+# rf_pos_FW.pkl, as position_router.py expects), forests also as the mmap-able
+# <name>.forest directory the router prefers. A summary table goes to
+# reports/partition_<key>.csv.
+#
+#   python src/model/partition_trainer.py --key pos --n-estimators 200
+#   python src/model/partition_trainer.py --key competition --procs 2 --tree-jobs 4
+
+import os, re, sys, time, argparse, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.dataset import load_dataset
+from common.profiling import span, stage
+from features.transformer import default_path
+from model.backends import BACKENDS, make_model, fit_model
+from model.forest_arrays import export
+
+ROOT     = os.path.abspath(os.path.join(SRC, ".."))
+PROC     = os.path.join(ROOT, "data", "processed")
+FEAT     = os.path.join(PROC, "player_ratings_features")
+TARGET   = os.path.join(PROC, "player_ratings_target")
+CLEAN    = os.path.join(PROC, "player_ratings_cleaned")
+MODELDIR = os.path.join(ROOT, "models")
+REPORTS  = os.path.join(ROOT, "reports")
+
+
+def model_name(backend, key, value):
+    """Artifact stem for one partition, e.g. rf_pos_FW or rf_competition_Serie_A_2017-18."""
+    return f"{backend}_{key}_{re.sub(r'[^A-Za-z0-9_.-]+', '_', str(value))}"
+
+
+def partitions(ds, key, min_rows=10):
+    """{value: row numbers in the cached X.npy} for every `key` value, rows in table order.
+
+    Values with fewer than `min_rows` rows are returned separately as {value: n}.
+    """
+    values = ds.meta("all", [key])[key].to_numpy()
+    rows = ds.original_order          # table order → cached layout
+    groups, small = {}, {}
+    present = pd.notna(values)
+    for value in np.unique(values[present]):
+        idx = np.flatnonzero(values == value)
+        if len(idx) < min_rows:
+            small[value] = len(idx)
+        else:
+            groups[value] = rows[idx]
+    return groups, small
+
+
+def plan(n_tasks, procs=None, tree_jobs=None, cpus=None):
+    """(processes, threads per model); unset parts fill the machine."""
+    cpus = cpus or os.cpu_count() or 1
+    procs = max(1, min(procs or cpus, n_tasks))
+    tree_jobs = tree_jobs or max(1, cpus // procs)
+    return procs, tree_jobs
+
+
+# ── worker side ──
+_ARRAYS = {}    # dataset directory -> (X, y, columns), mapped once per process
+
+
+def _arrays(directory, columns):
+    if directory not in _ARRAYS:
+        _ARRAYS[directory] = (np.load(os.path.join(directory, "X.npy"), mmap_mode="r"),
+                              np.load(os.path.join(directory, "y.npy"), mmap_mode="r"),
+                              columns)
+    return _ARRAYS[directory]
+
+
+def train_partition(task):
+    """Fit, score and save the model of one partition; returns its summary row."""
+    X, y, columns = _arrays(task["dataset"], task["columns"])
+    t0 = time.perf_counter()
+    X_tr = pd.DataFrame(X[task["train"]], columns=columns, copy=False)
+    X_te = pd.DataFrame(X[task["test"]], columns=columns, copy=False)
+    y_tr, y_te = y[task["train"]], y[task["test"]]
+
+    model = make_model(task["backend"], n_jobs=task["tree_jobs"], random_state=42, **task["params"])
+    fit_model(model, X_tr, y_tr, n_jobs=task["tree_jobs"])
+    fit_s = time.perf_counter() - t0
+    mae = float(np.mean(np.abs(y_te - model.predict(X_te))))
+    joblib.dump(model, task["path"])
+    export(model, task["path"], default_path(task["path"]), os.path.basename(task["dataset"]))
+    return {task["key"]: task["value"], "rows": len(task["train"]) + len(task["test"]),
+            "train": len(task["train"]), "test": len(task["test"]), "mae": round(mae, 4),
+            "fit_s": round(fit_s, 2), "model_mb": round(os.path.getsize(task["path"]) / 2**20, 2),
+            "model": os.path.relpath(task["path"], ROOT), "pid": os.getpid()}
+
+
+def train_partitions(ds, key, backend="rf", params=None, procs=None, tree_jobs=None,
+                     min_rows=10, model_dir=MODELDIR, log=print):
+    """Train every partition of `ds` by `key`; returns the summary table (one row per model)."""
+    groups, small = partitions(ds, key, min_rows)
+    for value, n in small.items():
+        log(f"skipping {key}={value}: {n} rows < --min-rows {min_rows}")
+    if not groups:
+        raise SystemExit(f"no {key} partition has at least {min_rows} rows")
+    procs, tree_jobs = plan(len(groups), procs, tree_jobs)
+    os.makedirs(model_dir, exist_ok=True)
+
+    tasks = []
+    for value, rows in groups.items():
+        train, test = train_test_split(rows, test_size=0.2, random_state=42)
+        tasks.append({"dataset": ds.directory, "columns": ds.columns, "key": key, "value": value,
+                      "train": train, "test": test, "backend": backend, "params": params or {},
+                      "tree_jobs": tree_jobs,
+                      "path": os.path.join(model_dir, model_name(backend, key, value) + ".pkl")})
+    tasks.sort(key=lambda t: -len(t["train"]))     # longest first
+    log(f"{len(tasks)} {key} partition(s) on {procs} process(es) × {tree_jobs} tree thread(s)")
+
+    results = []
+    if procs == 1:
+        for task in tasks:
+            results.append(train_partition(task))
+            log(f"{task['value']}: MAE = {results[-1]['mae']:.4f}  (rows={results[-1]['rows']})")
+    else:
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        with ProcessPoolExecutor(procs, mp_context=ctx) as pool:
+            futures = [pool.submit(train_partition, task) for task in tasks]
+            for fut in as_completed(futures):
+                r = fut.result()
+                results.append(r)
+                log(f"{r[key]}: MAE = {r['mae']:.4f}  (rows={r['rows']})")
+    return pd.DataFrame(results).sort_values(key).reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train one model per partition key value, in parallel.")
+    parser.add_argument("--key", default="pos",
+                        help="partition column of the cleaned rows (pos, competition, pos_role, …)")
+    parser.add_argument("--backend", choices=BACKENDS, default="rf")
+    parser.add_argument("--n-estimators", type=int, default=None,
+                        help="trees/boosting rounds per model (default: the backend's own)")
+    parser.add_argument("--procs", type=int, default=None,
+                        help="partitions trained at once (default: all cores, at most one per partition)")
+    parser.add_argument("--tree-jobs", type=int, default=None,
+                        help="threads per model (default: the cores left over by --procs)")
+    parser.add_argument("--min-rows", type=int, default=10, help="skip smaller partitions")
+    parser.add_argument("--model-dir", default=MODELDIR)
+    args = parser.parse_args(argv)
+
+    params = {}
+    if args.n_estimators is not None:
+        params["max_iter" if args.backend == "hgb" else "n_estimators"] = args.n_estimators
+
+    with stage(f"partition_{args.key}", backend=args.backend):
+        ds = load_dataset(FEAT, TARGET, CLEAN)
+        available = ds.meta("test").columns
+        if args.key not in available:
+            raise SystemExit(f"unknown partition key '{args.key}' "
+                             f"(cleaned rows have {', '.join(available)})")
+        t0 = time.perf_counter()
+        with span("train_partitions"):
+            summary = train_partitions(ds, args.key, args.backend, params, args.procs,
+                                       args.tree_jobs, args.min_rows, args.model_dir)
+        wall = time.perf_counter() - t0
+
+    os.makedirs(REPORTS, exist_ok=True)
+    out = os.path.join(REPORTS, f"partition_{args.key}.csv")
+    summary.to_csv(out, index=False)
+    print()
+    print(summary.drop(columns=["pid"]).to_string(index=False))
+    print(f"\n{len(summary)} models in {wall:.1f}s wall "
+          f"({summary['fit_s'].sum():.1f}s of fitting) → {out}")
+    return summary
+
+
+if __name__ == "__main__":
+    main()
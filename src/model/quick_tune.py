@@ -3,47 +3,78 @@
 
 
 import os
-import pandas as pd
-import numpy as np
-from scipy.stats import randint, uniform
+import sys
+import json
+import time
+import argparse
+from scipy.stats import randint
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import RandomizedSearchCV
 
-# ── Paths ─────────────────────────────────────────────────────────────
-ROOT       = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-FEAT_CSV   = os.path.join(ROOT, "data", "processed", "player_ratings_features.csv")
-TARGET_CSV = os.path.join(ROOT, "data", "processed", "player_ratings_target.csv")
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
 
-# ── Load data ─────────────────────────────────────────────────────────
-X = pd.read_csv(FEAT_CSV)
-y = pd.read_csv(TARGET_CSV)["rating"].values
+from common.dataset import load_dataset
+from model.tuning import TrialStore, rung_schedule, space_key, successive_halving
 
-# Clean infinities / NaNs just in case
-X.replace([np.inf, -np.inf], np.nan, inplace=True)
-X.fillna(X.median(), inplace=True)
+# ── Paths ─────────────────────────────────────────────────────────────
+ROOT       = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+FEAT       = os.path.join(ROOT, "data", "processed", "player_ratings_features")
+TARGET     = os.path.join(ROOT, "data", "processed", "player_ratings_target")
+STORE      = os.path.join(ROOT, "reports", "tuning.sqlite")
+BEST       = os.path.join(ROOT, "reports", "tuning_best.json")
 
-# ── Define model & parameter distributions ───────────────────────────
-rf = RandomForestRegressor(random_state=42)
-param_dist = {
+# ── Parameter distributions ──────────────────────────────────────────
+PARAM_DIST = {
     "n_estimators": randint(100, 401),      # 100‑400
     "max_depth":    [None, 10, 20, 40],
     "min_samples_leaf": randint(1, 5)      # 1‑4
 }
 
-search = RandomizedSearchCV(
-    rf,
-    param_distributions=param_dist,
-    n_iter=20,                  # 20 random combos → quick
-    cv=3,
-    scoring="neg_mean_absolute_error",
-    random_state=42,
-    n_jobs=-1,
-    verbose=2
-)
-
-print("Running RandomizedSearchCV — this should finish in a few minutes…")
-search.fit(X, y)
-
-best_mae = -search.best_score_
-print("\nBest MAE : {:.4f}".format(best_mae))
-print("Best params:", search.best_params_)
+
+def study_space(ds, cv, candidates, eta, min_fraction):
+    """Search space of a study on `ds`. It names the cached dataset, so stored
+    trials of re-prepared data are refused instead of resumed."""
+    return dict(space_key(PARAM_DIST), dataset=os.path.basename(ds.directory), rows=len(ds.y), cv=cv,
+                candidates=candidates, eta=eta, min_fraction=min_fraction)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Successive-halving random search for the forest.")
+    parser.add_argument("--study", default="rf_quick_tune", help="name in the trial store; re-run to resume")
+    parser.add_argument("--store", default=STORE, help="SQLite trial store")
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--eta", type=int, default=3, help="keep the best 1/eta per rung")
+    parser.add_argument("--min-fraction", type=float, default=1 / 9,
+                        help="data and tree fraction of the first rung")
+    parser.add_argument("--cv", type=int, default=3)
+    parser.add_argument("--n-jobs", type=int, default=-1, help="trials run concurrently")
+    parser.add_argument("--fresh", action="store_true", help="discard stored trials of this study")
+    args = parser.parse_args(argv)
+
+    # ── Load data (cleaned once and cached by common.dataset) ──
+    ds = load_dataset(FEAT, TARGET)
+
+    os.makedirs(os.path.dirname(args.store), exist_ok=True)
+    store = TrialStore(args.store)
+    space = study_space(ds, args.cv, args.candidates, args.eta, args.min_fraction)
+    store.open_study(args.study, space, fresh=args.fresh)
+    rungs = " → ".join(f"{n}@{f:.0%}" for n, f in rung_schedule(args.candidates, args.eta, args.min_fraction))
+    print(f"Successive halving over {args.candidates} configs (configs@data: {rungs})")
+
+    t0 = time.perf_counter()
+    best = successive_halving(RandomForestRegressor(random_state=42), PARAM_DIST, ds.X, ds.y,
+                              store, args.study, n_candidates=args.candidates, eta=args.eta,
+                              min_fraction=args.min_fraction, cv=args.cv, n_jobs=args.n_jobs)
+    store.close()
+
+    print(f"\nBest MAE : {best['mean_mae']:.4f}  ({time.perf_counter() - t0:.1f}s this run)")
+    print("Best params:", best["params"])
+    os.makedirs(os.path.dirname(BEST), exist_ok=True)
+    with open(BEST, "w") as f:
+        json.dump({"study": args.study, **best}, f, indent=2)
+    print(f"Trials -> {args.store}\nBest -> {BEST}")
+
+
+if __name__ == "__main__":
+    main()
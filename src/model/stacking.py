@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# stacking.py
+#
+# Stacked ensembles over the engineered feature matrix, with base-learner
+# outputs cached so the ensemble can change without refitting its members.
+#
+# A base learner is a backend (model/backends.py) plus parameters. For the
+# cached dataset split (common/dataset.py) each learner contributes:
+#
+#   oof.npy     out-of-fold predictions for the training rows (KFold on
+#               the training part, one fit per fold)
+#   test.npy    predictions for the test rows from a fit on the whole
+#               training part
+#   model.pkl   that full-training-part model
+#
+# These live under data/processed/_cache/stacking/<dataset>/<name>-<config>/,
+# where <config> hashes the backend, its parameters and the fold layout. A new
+# dataset or changed parameters get a new directory. Adding a learner only fits
+# that learner. Changing the meta-learner fits nothing but the meta-learner.
+# Starting on a new dataset removes the caches of all but the KEEP_DATASETS
+# most recently used datasets.
+#
+# All missing (learner, fold) fits run side by side on one joblib pool. As in
+# cv_engine.py, the memory-mapped X.npy goes to the workers as a reference to
+# its file, not as a copy.
+#
+# The meta-learner maps the stacked OOF columns to the rating:
+#   mean    plain average (what the old VotingRegressor did)
+#   linear  non-negative least squares weights plus an intercept
+#
+# StackedEnsemble bundles the members and the meta weights into one artifact
+# with a plain predict(X). It validates X once and scores every member on each
+# row block in a single pass over the input.
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import warnings
+
+import joblib
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import KFold
+
+from common.dataset import CACHE_DIR, KEEP_DATASETS, prune, touch
+from model.backends import make_model, fit_model
+
+STACK_DIR = os.path.join(CACHE_DIR, "stacking")
+METAS = ("mean", "linear")
+
+# name -> (backend, params); the first two are the old VotingRegressor members
+LEARNERS = {
+    "rf": ("rf", {"n_estimators": 100}),
+    "lightgbm": ("lightgbm", {}),
+    "hgb": ("hgb", {}),
+    "xgboost": ("xgboost", {}),
+}
+
+
+def config_key(backend, params, n_splits, seed):
+    """Hash of everything that determines a base learner's cached outputs."""
+    blob = json.dumps({"backend": backend, "params": params, "folds": n_splits, "seed": seed},
+                      sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()[:12]
+
+
+def make_folds(n_train, n_splits=5, seed=42):
+    """(train, test) positions within the training part for the OOF fits."""
+    return list(KFold(n_splits, shuffle=True, random_state=seed).split(np.arange(n_train)))
+
+
+def _fit_member(backend, params, X, y, train, test, n_jobs, keep_model=False):
+    """One base fit; returns its predictions for `test` and, with `keep_model`, the model.
+
+    Fold models are thrown away, so only the full fit ships its model back from the worker.
+    """
+    model = make_model(backend, n_jobs=n_jobs, random_state=42, **params)
+    fit_model(model, X[train], y[train], n_jobs=n_jobs)
+    return model.predict(X[test]), (model if keep_model else None)
+
+
+class BaseCache:
+    """Cached OOF/test predictions and full models of base learners for one dataset."""
+
+    def __init__(self, ds, n_splits=5, seed=42, cache_dir=STACK_DIR):
+        self.ds = ds
+        self.n_splits = n_splits
+        self.seed = seed
+        self.cache_dir = cache_dir
+        self.directory = os.path.join(cache_dir, os.path.basename(ds.directory))
+
+    def path(self, name, backend, params):
+        return os.path.join(self.directory,
+                            f"{name}-{config_key(backend, params, self.n_splits, self.seed)}")
+
+    def has(self, name, backend, params):
+        return os.path.isfile(os.path.join(self.path(name, backend, params), "info.json"))
+
+    def load(self, name, backend, params):
+        """(oof, test predictions, path) of a cached learner; the model stays on disk."""
+        d = self.path(name, backend, params)
+        return np.load(os.path.join(d, "oof.npy")), np.load(os.path.join(d, "test.npy")), d
+
+    def fit_missing(self, learners, n_jobs=-1, tree_jobs=1, log=print):
+        """Fit every learner of {name: (backend, params)} that is not cached yet, all folds at once."""
+        todo = {n: spec for n, spec in learners.items() if not self.has(n, *spec)}
+        if os.path.isdir(self.directory):
+            touch(self.directory)
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            prune(self.cache_dir, "dataset-", KEEP_DATASETS, protect=[self.directory])
+        if not todo:
+            return []
+        ds = self.ds
+        n_train = ds.n_train
+        train_all, test_all = np.arange(n_train), np.arange(n_train, len(ds))
+        folds = make_folds(n_train, self.n_splits, self.seed)
+        # one task per (learner, fold) plus one full fit per learner
+        tasks = [(name, k, tr, te) for name in todo for k, (tr, te) in enumerate(folds)]
+        tasks += [(name, "full", train_all, test_all) for name in todo]
+        log(f"Fitting {', '.join(todo)}: {len(tasks)} fits on {n_jobs} job(s)")
+        t0 = time.perf_counter()
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(_fit_member)(todo[name][0], todo[name][1], ds.X, ds.y, tr, te, tree_jobs,
+                                 keep_model=k == "full")
+            for name, k, tr, te in tasks)
+        wall = time.perf_counter() - t0
+
+        for name, (backend, params) in todo.items():
+            oof = np.full(n_train, np.nan)
+            for (n, k, _, te), (preds, model) in zip(tasks, results):
+                if n != name:
+                    continue
+                if k == "full":
+                    test_pred, full_model = preds, model
+                else:
+                    oof[te] = preds
+            self._save(name, backend, params, oof, test_pred, full_model, wall)
+        return list(todo)
+
+    def _save(self, name, backend, params, oof, test_pred, model, wall):
+        final = self.path(name, backend, params)
+        tmp = f"{final}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "oof.npy"), oof)
+        np.save(os.path.join(tmp, "test.npy"), test_pred)
+        joblib.dump(model, os.path.join(tmp, "model.pkl"))
+        with open(os.path.join(tmp, "info.json"), "w") as f:
+            json.dump({"name": name, "backend": backend, "params": params,
+                       "folds": self.n_splits, "seed": self.seed, "batch_wall_s": round(wall, 2),
+                       "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")}, f, indent=2, default=str)
+        shutil.rmtree(final, ignore_errors=True)
+        os.rename(tmp, final)
+
+
+def fit_meta(P, y, meta="linear"):
+    """(weights, intercept) combining the columns of `P` into a prediction of `y`."""
+    if meta == "mean":
+        return np.full(P.shape[1], 1.0 / P.shape[1]), 0.0
+    if meta == "linear":
+        lr = LinearRegression(positive=True).fit(P, y)
+        return lr.coef_.astype(np.float64), float(lr.intercept_)
+    raise ValueError(f"unknown meta-learner '{meta}' (expected one of {METAS})")
+
+
+class StackedEnsemble:
+    """Base models plus linear meta weights, scored together in one pass over X."""
+
+    def __init__(self, names, models, weights, intercept, columns=None):
+        self.names = list(names)
+        self.models = list(models)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.columns = columns
+
+    def member_predictions(self, X, block_rows=65_536):
+        """(rows × members) predictions, one row block at a time."""
+        if hasattr(X, "columns") and self.columns is not None:
+            X = X[self.columns]
+        X = np.ascontiguousarray(np.asarray(X, dtype=np.float32))  # validated/cast once for all members
+        P = np.empty((len(X), len(self.models)))
+        with warnings.catch_warnings():
+            # columns are aligned above; LightGBM records "Column_i" names even for arrays
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            for start in range(0, len(X), block_rows):
+                block = X[start:start + block_rows]
+                for j, model in enumerate(self.models):
+                    P[start:start + block_rows, j] = model.predict(block)
+        return P
+
+    def predict(self, X):
+        return self.member_predictions(X) @ self.weights + self.intercept
+
+
+def build(ds, learners, meta="linear", n_splits=5, n_jobs=-1, tree_jobs=1,
+          cache_dir=STACK_DIR, log=print):
+    """Fit (or reuse) the base learners, fit the meta-learner; returns (ensemble, report)."""
+    cache = BaseCache(ds, n_splits, cache_dir=cache_dir)
+    fitted = cache.fit_missing(learners, n_jobs=n_jobs, tree_jobs=tree_jobs, log=log)
+    y_train, y_test = np.asarray(ds.target("train")), np.asarray(ds.target("test"))
+
+    names, oofs, tests, dirs = [], [], [], []
+    for name, spec in learners.items():
+        oof, test_pred, d = cache.load(name, *spec)
+        names.append(name)
+        oofs.append(oof)
+        tests.append(test_pred)
+        dirs.append(d)
+    P_oof, P_test = np.column_stack(oofs), np.column_stack(tests)
+    weights, intercept = fit_meta(P_oof, y_train, meta)
+
+    def mae(a, b):
+        return float(np.mean(np.abs(a - b)))
+
+    members = {n: {"oof_mae": round(mae(P_oof[:, j], y_train), 4),
+                   "test_mae": round(mae(P_test[:, j], y_test), 4),
+                   "weight": round(float(weights[j]), 4), "cached": n not in fitted,
+                   "cache": dirs[j]}
+               for j, n in enumerate(names)}
+    report = {"meta": meta, "intercept": round(intercept, 4), "folds": n_splits,
+              "members": members,
+              "oof_mae": round(mae(P_oof @ weights + intercept, y_train), 4),
+              "test_mae": round(mae(P_test @ weights + intercept, y_test), 4),
+              "fitted": fitted}
+    models = [joblib.load(os.path.join(d, "model.pkl")) for d in dirs]
+    ensemble = StackedEnsemble(names, models, weights, intercept, columns=list(ds.columns))
+    return ensemble, report
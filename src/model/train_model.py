@@ -2,20 +2,41 @@
 # train_model.py
 
 import os
-import pandas as pd
+import sys
+import argparse
 import numpy as np
 import joblib
-import matplotlib.pyplot as plt
 
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
 
-def main():
+from common.dataset import load_dataset
+from common.profiling import span, stage
+from features.transformer import default_path
+from model.backends import BACKENDS, make_model, fit_model, feature_importances, n_trees
+from model.forest_arrays import export
+from model import lineage
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the rating model.")
+    parser.add_argument("--backend", choices=BACKENDS, default="rf",
+                        help="regressor to train (see model/backends.py)")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="training threads (-1: all cores)")
+    args = parser.parse_args(argv)
+    with stage("train", backend=args.backend):
+        train(args)
+
+
+def train(args):
     # Paths
-    FEAT_CSV    = os.path.join("data", "processed", "player_ratings_features.csv")
-    TARGET_CSV  = os.path.join("data", "processed", "player_ratings_target.csv")
+    FEAT        = os.path.join("data", "processed", "player_ratings_features")
+    TARGET      = os.path.join("data", "processed", "player_ratings_target")
+    CLEAN       = os.path.join("data", "processed", "player_ratings_cleaned")
+    CACHE_DIR   = os.path.join("data", "processed", "_cache")
     MODEL_PATH  = os.path.join("models", "rating_model.pkl")
     METRICS_TXT = os.path.join("reports", "metrics.txt")
     FI_PNG      = os.path.join("reports", "feature_importances.png")
@@ -24,31 +45,27 @@ def main():
     os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
     os.makedirs(os.path.dirname(METRICS_TXT), exist_ok=True)
 
-    # 1) Load data
-    X = pd.read_csv(FEAT_CSV)
-    y = pd.read_csv(TARGET_CSV)["rating"].values
-
-    # 1.1) Clean infinite and NaN values
-    X.replace([np.inf, -np.inf], np.nan, inplace=True)
-    X.fillna(X.median(), inplace=True)
-    X = X.clip(lower=-1e6, upper=1e6).astype(np.float64)
-
-    # 2) Train/Test split
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
-    )
+    # 1) Load the cleaned (inf/NaN → median, clipped) data and 2) its cached 80/20 split
+    with span("load_dataset"):
+        ds = load_dataset(FEAT, TARGET, CLEAN, cache_dir=CACHE_DIR)
+        X_train, X_test, y_train, y_test = ds.split()
     print(f"Train samples: {len(X_train)}, Test samples: {len(X_test)}")
 
     # 3) Train the model
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
+    model = make_model(args.backend, n_jobs=args.n_jobs, random_state=42)
+    with span("fit", rows=len(X_train), features=X_train.shape[1]):
+        fit_model(model, X_train, y_train, n_jobs=args.n_jobs)
+    print(f"Trained {args.backend} backend ({type(model).__name__})")
 
-    # Save model artifact
-    joblib.dump(model, MODEL_PATH)
-    print(f"Model saved to {MODEL_PATH}")
+    # Save model artifact (plus the mmap-able forest directory for forests)
+    with span("save_model"):
+        joblib.dump(model, MODEL_PATH)
+        forest = export(model, MODEL_PATH, default_path(MODEL_PATH), os.path.basename(ds.directory))
+    print(f"Model saved to {MODEL_PATH}" + (f" (+ {forest})" if forest else ""))
 
     # 4) Evaluate
-    y_pred = model.predict(X_test)
+    with span("predict", rows=len(X_test)):
+        y_pred = model.predict(X_test)
     mae = mean_absolute_error(y_test, y_pred)
     # Compute RMSE manually to avoid sklearn version issues
     rmse = mean_squared_error(y_test, y_pred)
@@ -58,24 +75,36 @@ def main():
     with open(METRICS_TXT, "w") as f:
         f.write(f"MAE:  {mae:.4f}\n")
         f.write(f"RMSE: {rmse:.4f}\n")
+        f.write(f"Backend: {args.backend}\n")
     print(f"Metrics written to {METRICS_TXT}")
     print(f"MAE: {mae:.4f}, RMSE: {rmse:.4f}")
 
+    # Start the lineage update_model.py builds on (until = latest match trained on)
+    try:
+        until = str(ds.meta("train", ["date"])["date"].max().date())
+    except (FileNotFoundError, KeyError):
+        until = None
+    lineage.record(MODEL_PATH, "full", backend=args.backend, until=until, rows=len(X_train),
+                   trees=n_trees(model), test_mae=round(float(mae), 4))
+
     # 5) Feature importances
-    importances = model.feature_importances_
-    feat_names = X.columns
+    with span("importances"):
+        importances = feature_importances(model, X_test, y_test)
+    feat_names = ds.columns
     top_idx = np.argsort(importances)[::-1][:15]
 
-    plt.figure(figsize=(8, 6))
-    plt.title("Top 15 Feature Importances")
-    plt.barh(
-        [feat_names[i] for i in top_idx[::-1]],
-        importances[top_idx][::-1]
-    )
-    plt.xlabel("Importance")
-    plt.tight_layout()
-    plt.savefig(FI_PNG)
-    plt.close()
+    with span("report"):
+        import matplotlib.pyplot as plt    # only needed for the plot
+        plt.figure(figsize=(8, 6))
+        plt.title("Top 15 Feature Importances")
+        plt.barh(
+            [feat_names[i] for i in top_idx[::-1]],
+            importances[top_idx][::-1]
+        )
+        plt.xlabel("Importance")
+        plt.tight_layout()
+        plt.savefig(FI_PNG)
+        plt.close()
     print(f"Feature importances plot saved to {FI_PNG}")
 
 if __name__ == '__main__':
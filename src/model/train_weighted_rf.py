@@ -2,43 +2,53 @@
 # train_weighted_rf.py
 
 import os
+import sys
 import numpy as np
-import pandas as pd
 import joblib
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.dataset import load_dataset
+from features.transformer import default_path
+from model.forest_arrays import export
+
 # ── Paths ────────────────────────────────────────────────────────────
 ROOT       = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-FEAT_CSV   = os.path.join(ROOT, "data", "processed", "player_ratings_features.csv")
-TARGET_CSV = os.path.join(ROOT, "data", "processed", "player_ratings_target.csv")
+FEAT       = os.path.join(ROOT, "data", "processed", "player_ratings_features")
+TARGET     = os.path.join(ROOT, "data", "processed", "player_ratings_target")
 MODEL_PATH = os.path.join(ROOT, "models", "rating_model_weighted.pkl")
 
-# ── Load feature matrix and target ───────────────────────────────────
-X = pd.read_csv(FEAT_CSV)
-y = pd.read_csv(TARGET_CSV)["rating"].values
-X.replace([np.inf, -np.inf], np.nan, inplace=True)
-X.fillna(X.median(), inplace=True)
+# ── Sample weights (tails get larger weight) ─────────────────────────
+def tail_weights(y):
+    return np.where(y > 8, 3, np.where(y < 6, 2, 1))
+
 
-# ── Define sample weights (tails get larger weight) ──────────────────
-weights = np.where(y > 8, 3, np.where(y < 6, 2, 1))
+def main():
+    # ── Load feature matrix and target ───────────────────────────────
+    # (cleaned and split once, cached by common.dataset)
+    ds = load_dataset(FEAT, TARGET)
+    X_train, X_test, y_train, y_test = ds.split()
+    w_train = tail_weights(y_train)
 
-# ── Train / test split ───────────────────────────────────────────────
-X_train, X_test, y_train, y_test, w_train, w_test = train_test_split(
-    X, y, weights, test_size=0.2, random_state=42)
+    # ── Train weighted RandomForest ──────────────────────────────────
+    rf = RandomForestRegressor(n_estimators=200, random_state=42)
+    rf.fit(X_train, y_train, sample_weight=w_train)
 
-# ── Train weighted RandomForest ──────────────────────────────────────
-rf = RandomForestRegressor(n_estimators=200, random_state=42)
-rf.fit(X_train, y_train, sample_weight=w_train)
+    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+    joblib.dump(rf, MODEL_PATH)
+    export(rf, MODEL_PATH, default_path(MODEL_PATH), os.path.basename(ds.directory))
+    print("Weighted RF saved →", MODEL_PATH)
 
-os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-joblib.dump(rf, MODEL_PATH)
-print("Weighted RF saved →", MODEL_PATH)
+    # ── Evaluate ─────────────────────────────────────────────────────
+    pred = rf.predict(X_test)
+    mae = mean_absolute_error(y_test, pred)
+    rmse = np.sqrt(mean_squared_error(y_test, pred))
+    print(f"Weighted RF  MAE={mae:.4f}  RMSE={rmse:.4f}")
 
-# ── Evaluate ─────────────────────────────────────────────────────────
-pred = rf.predict(X_test)
-mae = mean_absolute_error(y_test, pred)
-rmse = np.sqrt(mean_squared_error(y_test, pred))
-print(f"Weighted RF  MAE={mae:.4f}  RMSE={rmse:.4f}")
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# tuning.py
+#
+# Resumable successive-halving search with a SQLite trial store.
+#
+# All candidates start on a small budget: a fraction of the rows and the same
+# fraction of their n_estimators. After each rung only the best 1/eta are
+# kept, and their budget grows eta-fold until the survivors see all the data
+# and their full forest. Weak configurations are thus dropped after a few
+# cheap fits instead of paying for full-size CV.
+#
+# Every finished trial (params, budget, fold scores, fit time) is written to
+# the store as soon as it returns. Re-running the same study skips trials
+# that are already recorded, so an interrupted search resumes where it
+# stopped. Candidates are drawn with a fixed seed, which makes a re-run
+# propose exactly the same configurations. Trials run concurrently on a
+# joblib process pool that maps the dataset cache's X.npy.
+
+import json
+import math
+import time
+import sqlite3
+import hashlib
+import datetime as dt
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.model_selection import KFold, ParameterSampler
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS studies (
+    name        TEXT PRIMARY KEY,
+    space       TEXT NOT NULL,
+    created_at  TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trials (
+    study        TEXT NOT NULL,
+    config_id    TEXT NOT NULL,
+    rung         INTEGER NOT NULL,
+    params       TEXT NOT NULL,
+    fraction     REAL NOT NULL,
+    n_estimators INTEGER,
+    fold_scores  TEXT NOT NULL,
+    mean_mae     REAL NOT NULL,
+    fit_seconds  REAL NOT NULL,
+    finished_at  TEXT NOT NULL,
+    PRIMARY KEY (study, config_id, rung)
+);
+"""
+
+
+def _describe(value):
+    if not hasattr(value, "dist"):          # a list of choices
+        return value
+    args = [*map(repr, value.args), *(f"{k}={v!r}" for k, v in sorted(value.kwds.items()))]
+    return f"{value.dist.name}({', '.join(args)})"
+
+
+def space_key(param_distributions):
+    """JSON-ready form of a search space; scipy distributions become "name(args)"."""
+    return {k: _describe(v) for k, v in param_distributions.items()}
+
+
+def config_id(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+class TrialStore:
+    """SQLite-backed record of a study's search space and finished trials."""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def open_study(self, name, space, fresh=False):
+        """Create `name`, or reopen it if its search space is unchanged."""
+        space_json = json.dumps(space, sort_keys=True, default=str)
+        if fresh:
+            self.conn.execute("DELETE FROM trials WHERE study = ?", (name,))
+            self.conn.execute("DELETE FROM studies WHERE name = ?", (name,))
+        row = self.conn.execute("SELECT space FROM studies WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            self.conn.execute("INSERT INTO studies VALUES (?, ?, ?)",
+                              (name, space_json, dt.datetime.now().isoformat(timespec="seconds")))
+        elif row[0] != space_json:
+            raise ValueError(f"study '{name}' exists with a different search space; "
+                             "pick another --study name or pass --fresh")
+        self.conn.commit()
+
+    def get(self, study, cid, rung):
+        row = self.conn.execute(
+            "SELECT mean_mae, fold_scores, fit_seconds FROM trials "
+            "WHERE study = ? AND config_id = ? AND rung = ?", (study, cid, rung)).fetchone()
+        if row is None:
+            return None
+        return {"mean_mae": row[0], "fold_scores": json.loads(row[1]), "fit_seconds": row[2]}
+
+    def record(self, study, cid, rung, params, fraction, n_estimators, fold_scores, fit_seconds):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (study, cid, rung, json.dumps(params, sort_keys=True, default=str), fraction,
+             n_estimators, json.dumps(fold_scores), float(np.mean(fold_scores)), fit_seconds,
+             dt.datetime.now().isoformat(timespec="seconds")))
+        self.conn.commit()
+
+    def trials(self, study):
+        rows = self.conn.execute(
+            "SELECT config_id, rung, params, fraction, n_estimators, mean_mae, fit_seconds "
+            "FROM trials WHERE study = ? ORDER BY rung, mean_mae", (study,)).fetchall()
+        keys = ("config_id", "rung", "params", "fraction", "n_estimators", "mean_mae", "fit_seconds")
+        return [dict(zip(keys, r), params=json.loads(r[2])) for r in rows]
+
+    def close(self):
+        self.conn.close()
+
+
+def rung_schedule(n_candidates, eta=3, min_fraction=1 / 9):
+    """[(n_configs, fraction)] per rung; the last rung always uses all the data."""
+    n_rungs = max(1, int(math.floor(math.log(1 / min_fraction, eta) + 1e-9)) + 1)
+    schedule, n = [], n_candidates
+    for r in range(n_rungs):
+        schedule.append((n, min(1.0, min_fraction * eta ** r)))
+        n = max(1, math.ceil(n / eta))
+    schedule[-1] = (schedule[-1][0], 1.0)
+    return schedule
+
+
+def _run_trial(estimator, params, X, y, rows, n_estimators, cv, seed):
+    """CV-score one configuration on `rows` of the (memory-mapped) X/y."""
+    est = clone(estimator).set_params(**params)
+    if n_estimators is not None:
+        est.set_params(n_estimators=n_estimators)
+    scores = []
+    t0 = time.perf_counter()
+    for tr, te in KFold(cv, shuffle=True, random_state=seed).split(rows):
+        tr, te = np.sort(rows[tr]), np.sort(rows[te])
+        est.fit(X[tr], y[tr])
+        scores.append(float(np.mean(np.abs(est.predict(X[te]) - y[te]))))
+    return scores, time.perf_counter() - t0
+
+
+def successive_halving(estimator, param_distributions, X, y, store, study,
+                       n_candidates=20, eta=3, min_fraction=1 / 9, cv=3,
+                       n_jobs=-1, seed=42, min_trees=10, log=print):
+    """Run (or resume) a study; returns the best config's record from the last rung."""
+    candidates = [dict(p) for p in ParameterSampler(param_distributions, n_candidates,
+                                                    random_state=seed)]
+    for p in candidates:  # numpy scalars → plain Python for JSON and set_params
+        for k, v in p.items():
+            p[k] = v.item() if hasattr(v, "item") else v
+    rows_perm = np.random.default_rng(seed).permutation(len(y))
+    alive = candidates
+    schedule = rung_schedule(n_candidates, eta, min_fraction)
+
+    for rung, (n_keep, fraction) in enumerate(schedule):
+        alive = alive[:n_keep]
+        rows = rows_perm[:max(cv * 2, int(round(fraction * len(y))))]
+        budget = {}
+        for p in alive:
+            full = p.get("n_estimators")
+            budget[config_id(p)] = None if full is None else max(min_trees, int(round(full * fraction)))
+
+        todo = [p for p in alive if store.get(study, config_id(p), rung) is None]
+        log(f"Rung {rung}: {len(alive)} configs on {len(rows)} rows ({fraction:.0%}), "
+            f"{len(alive) - len(todo)} already in the store")
+        jobs = (delayed(_run_trial)(estimator, p, X, y, rows, budget[config_id(p)], cv, seed)
+                for p in todo)
+        results = Parallel(n_jobs=n_jobs, return_as="generator")(jobs)
+        for p, (scores, secs) in zip(todo, results):
+            store.record(study, config_id(p), rung, p, fraction, budget[config_id(p)], scores, secs)
+            log(f"  {config_id(p)}  MAE {np.mean(scores):.4f}  ({secs:.1f}s)  {p}")
+
+        scored = sorted(alive, key=lambda p: store.get(study, config_id(p), rung)["mean_mae"])
+        alive = scored
+    best = alive[0]
+    return dict(store.get(study, config_id(best), len(schedule) - 1), params=best,
+                config_id=config_id(best))
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# update_model.py
+#
+# Refresh models/rating_model.pkl with the latest matchdays instead of
+# retraining it on every season.
+#
+# The model learns from the training rows dated after its lineage `until`
+# (model/lineage.py; or --since), plus --window-days of older context:
+#
+#   rf        warm start: --add-trees new trees are fitted on those rows and
+#             appended to the forest. Every tree remembers the version that
+#             grew it (tree_versions_). Trees grown more than --max-age
+#             versions ago are evicted, then the oldest beyond --max-trees.
+#   lightgbm, xgboost, hgb
+#             boosting continues from the current model for --add-trees
+#             rounds on those rows. Boosted trees correct each other, so
+#             none can be dropped. Once the model would pass --max-trees it
+#             is refit from scratch instead, as train_model.py would.
+#
+# Accuracy is measured on the test rows dated after the previous `until`, rows
+# no version of the model has trained on. The whole test part is reported too,
+# but it is optimistic once a grown dataset has been re-split. --compare also
+# fits a full retrain of the same backend and records both MAEs and fit times.
+# With --max-gap the retrain is kept when the update trails it by more than
+# that.
+#
+#   python src/model/update_model.py                        # after prepare_data.py --incremental
+#   python src/model/update_model.py --add-trees 30 --max-trees 300 --max-age 8
+#   python src/model/update_model.py --compare --max-gap 0.01
+#
+# Each run appends to models/rating_model.lineage.json and writes
+# reports/update_model.json.
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.dataset import load_dataset
+from common.profiling import span, stage
+from features.transformer import default_path
+from model.backends import backend_of, n_trees, make_model, fit_model
+from model.forest_arrays import export
+from model import lineage
+
+ROOT   = os.path.abspath(os.path.join(SRC, ".."))
+PROC   = os.path.join(ROOT, "data", "processed")
+FEAT   = os.path.join(PROC, "player_ratings_features")
+TARGET = os.path.join(PROC, "player_ratings_target")
+CLEAN  = os.path.join(PROC, "player_ratings_cleaned")
+MODEL  = os.path.join(ROOT, "models", "rating_model.pkl")
+REPORT = os.path.join(ROOT, "reports", "update_model.json")
+
+ADD_TREES = {"rf": 20, "lightgbm": 50, "xgboost": 50, "hgb": 50}
+
+
+def _mae(y, pred):
+    return round(float(np.mean(np.abs(np.asarray(y) - pred))), 4) if len(y) else None
+
+
+def grow_forest(model, X, y, add, version, max_trees=None, max_age=None, n_jobs=-1):
+    """Append `add` trees fitted on (X, y) to a random forest, then evict; returns (added, evicted)."""
+    versions = list(getattr(model, "tree_versions_", [version - 1] * len(model.estimators_)))
+    # a fresh seed per version, so the new trees do not replay the bootstrap draws of old ones
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + add,
+                     random_state=42 + version, n_jobs=n_jobs)
+    fit_model(model, X, y, n_jobs=n_jobs)
+    versions += [version] * add
+
+    keep = np.arange(len(versions))                           # oldest first
+    if max_age is not None:
+        keep = keep[np.asarray(versions)[keep] > version - max_age]
+    if max_trees is not None:
+        keep = keep[-max_trees:]
+    model.estimators_ = [model.estimators_[i] for i in keep]
+    model.tree_versions_ = [versions[i] for i in keep]
+    model.set_params(warm_start=False, n_estimators=len(keep))
+    return add, len(versions) - len(keep)
+
+
+def continue_boosting(model, X, y, add, n_jobs=-1):
+    """A GBM with `add` more rounds fitted on (X, y) on top of `model`."""
+    backend = backend_of(model)
+    if backend == "hgb":
+        model.set_params(warm_start=True, max_iter=model.n_iter_ + add)
+        fit_model(model, X, y, n_jobs=n_jobs)
+        model.set_params(warm_start=False)
+        return model
+    new = clone(model).set_params(n_estimators=add, n_jobs=n_jobs)
+    if backend == "lightgbm":
+        return fit_model(new, X, y, n_jobs=n_jobs, init_model=model.booster_)
+    return fit_model(new, X, y, n_jobs=n_jobs, xgb_model=model.get_booster())
+
+
+def full_fit(backend, X, y, n_jobs=-1):
+    """What train_model.py fits for `backend`; returns (model, seconds)."""
+    t0 = time.perf_counter()
+    model = make_model(backend, n_jobs=n_jobs, random_state=42)
+    fit_model(model, X, y, n_jobs=n_jobs)
+    return model, time.perf_counter() - t0
+
+
+def update(model, ds, since, version, add=None, window_days=28, max_trees=None, max_age=None,
+           n_jobs=-1, log=print):
+    """Update `model` with the training rows of `ds` after `since`; returns (model, entry)."""
+    backend = backend_of(model)
+    add = add or ADD_TREES[backend]
+    since = pd.Timestamp(since)
+    dates = ds.meta("train", ["date"])["date"]
+    rows = np.flatnonzero((dates > since - pd.Timedelta(days=window_days)).to_numpy())
+    fresh = int((dates > since).sum())
+    if not fresh:
+        raise SystemExit(f"no training rows after {since.date()}; nothing to update")
+    X = ds.features("train").iloc[rows]
+    y = np.asarray(ds.target("train"))[rows]
+    entry = {"backend": backend, "since": str(since.date()), "until": str(dates.max().date()),
+             "rows": len(rows), "new_rows": fresh, "window_days": window_days,
+             "trees_before": n_trees(model)}
+    log(f"{fresh} new training rows after {since.date()} ({len(rows)} with context)")
+
+    t0 = time.perf_counter()
+    if backend == "rf":
+        added, evicted = grow_forest(model, X, y, add, version, max_trees, max_age, n_jobs)
+        entry.update(added=added, evicted=evicted)
+    elif max_trees is not None and n_trees(model) + add > max_trees:
+        log(f"{n_trees(model)} + {add} rounds would pass --max-trees {max_trees}; refitting")
+        model, _ = full_fit(backend, ds.features("train"), ds.target("train"), n_jobs)
+        entry.update(refit=True, rows=ds.n_train, added=n_trees(model), evicted=entry["trees_before"])
+    else:
+        model = continue_boosting(model, X, y, add, n_jobs)
+        entry.update(added=add, evicted=0)
+        if max_age is not None:
+            log("--max-age applies to forests only; boosted trees are kept")
+    entry.update(trees=n_trees(model), fit_s=round(time.perf_counter() - t0, 2))
+    return model, entry
+
+
+def evaluate(model, ds, since):
+    """MAE on the test rows after `since` (never trained on) and on the whole test part."""
+    X_te, y_te = ds.features("test"), np.asarray(ds.target("test"))
+    new = (ds.meta("test", ["date"])["date"] > pd.Timestamp(since)).to_numpy()
+    pred = model.predict(X_te)
+    return {"new_test_rows": int(new.sum()), "new_test_mae": _mae(y_te[new], pred[new]),
+            "test_mae": _mae(y_te, pred)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update the rating model with recent matches.")
+    parser.add_argument("--model", default=MODEL)
+    parser.add_argument("--output", default=None, help="where to write the update (default: --model)")
+    parser.add_argument("--since", default=None,
+                        help="learn from matches after this date (default: the model's lineage 'until')")
+    parser.add_argument("--window-days", type=int, default=28,
+                        help="days of older matches fitted along with the new ones")
+    parser.add_argument("--add-trees", type=int, default=None,
+                        help=f"trees/boosting rounds to add (default: {ADD_TREES})")
+    parser.add_argument("--max-trees", type=int, default=None,
+                        help="cap on the model size (default: 3× the last full fit)")
+    parser.add_argument("--max-age", type=int, default=None,
+                        help="rf: evict trees grown more than this many versions ago")
+    parser.add_argument("--compare", action="store_true", help="also fit a full retrain and compare")
+    parser.add_argument("--max-gap", type=float, default=None,
+                        help="with --compare: keep the retrain if the update's MAE is worse by more")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="training threads (-1: all cores)")
+    args = parser.parse_args(argv)
+    output = args.output or args.model
+
+    history = lineage.load_lineage(args.model)
+    head = lineage.current(args.model)
+    since = args.since or (head or {}).get("until")
+    if since is None:
+        raise SystemExit(f"{args.model} has no matching lineage ({lineage.lineage_path(args.model)}); "
+                         "pass --since or retrain with train_model.py")
+    version = (history[-1]["version"] if history else 0) + 1     # what lineage.record will assign
+    full = next((e for e in reversed(history) if e["kind"] == "full"), None)
+    max_trees = args.max_trees or (3 * full["trees"] if full and full.get("trees") else None)
+
+    with stage("update", since=since):
+        with span("load_dataset"):
+            ds = load_dataset(FEAT, TARGET, CLEAN)
+        with span("load_model"):
+            model = joblib.load(args.model)
+        with span("fit"):
+            model, entry = update(model, ds, since, version, args.add_trees, args.window_days,
+                                  max_trees, args.max_age, args.n_jobs)
+        with span("evaluate"):
+            entry.update(evaluate(model, ds, since))
+
+        if args.compare:
+            with span("full_retrain", rows=ds.n_train):
+                retrain, secs = full_fit(entry["backend"], ds.features("train"),
+                                         ds.target("train"), args.n_jobs)
+                ref = evaluate(retrain, ds, since)
+            key = "new_test_mae" if entry["new_test_rows"] else "test_mae"
+            gap = round(entry[key] - ref[key], 4)
+            entry["full_retrain"] = {**ref, "fit_s": round(secs, 2), "gap": gap}
+            print(f"Update {key} {entry[key]:.4f} vs full retrain {ref[key]:.4f} "
+                  f"({entry['fit_s']:.1f}s vs {secs:.1f}s)")
+            if args.max_gap is not None and gap > args.max_gap:
+                print(f"Gap {gap:.4f} > --max-gap {args.max_gap}; keeping the full retrain")
+                model = retrain
+                entry = {**entry, **ref, "refit": True, "rows": ds.n_train, "trees": n_trees(retrain),
+                         "added": n_trees(retrain), "evicted": entry["trees_before"]}
+
+        with span("save_model"):
+            os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+            tmp = output + ".tmp"
+            joblib.dump(model, tmp)
+            os.replace(tmp, output)
+            export(model, output, default_path(output), os.path.basename(ds.directory))
+        if output != args.model:
+            with open(lineage.lineage_path(output), "w") as f:
+                json.dump(history, f, indent=2)
+        entry = lineage.record(output, "full" if entry.get("refit") else "update", **entry)
+
+    os.makedirs(os.path.dirname(REPORT), exist_ok=True)
+    with open(REPORT, "w") as f:
+        json.dump(entry, f, indent=2, default=str)
+    print(f"v{entry['version']} ({entry['kind']}): {entry['trees_before']} → {entry['trees']} trees "
+          f"(+{entry['added']}, -{entry['evicted']}) on {entry['rows']} rows in {entry['fit_s']:.1f}s")
+    print(f"New test rows: {entry['new_test_rows']}, MAE {entry['new_test_mae']}; "
+          f"whole test part MAE {entry['test_mae']}")
+    print(f"Model saved to {output}\nLineage -> {lineage.lineage_path(output)}\nReport -> {REPORT}")
+    return entry
+
+
+if __name__ == "__main__":
+    main()
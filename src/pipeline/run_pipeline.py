@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# run_pipeline.py
+#
+# Run the pipeline as a DAG of stages with declared inputs and outputs.
+#
+# A stage is skipped when its outputs exist and nothing it depends on has
+# changed since its last successful run. "Depends on" means the content
+# hashes of its input files, of its code files and of its command line.
+# Stages whose inputs are produced by other stages wait for those. All other
+# stages run side by side, up to --jobs at a time. For example, the
+# per-position, weighted and CV stages all start as soon as prepare_data is
+# done.
+#
+# File digests are memoised by size + mtime (common.dataset.files_digest), so
+# a no-op re-run only stats the inputs. Every stage records its wall time and
+# peak RSS, taken from os.wait4's rusage. That covers the stage process
+# itself, not worker processes it forks. Per-stage output goes to
+# reports/pipeline_logs/<stage>.log; a summary goes to reports/pipeline_run.json.
+#
+#   python src/pipeline/run_pipeline.py                  # ingest → prepare → train → evaluate
+#   python src/pipeline/run_pipeline.py --all --jobs 3   # plus the optional models and CV
+#   python src/pipeline/run_pipeline.py train --force train
+
+import os, sys, glob, json, time, hashlib, argparse, subprocess
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common import profiling
+from common.dataset import CACHE_DIR, files_digest
+from common.storage import table_files
+
+ROOT = os.path.abspath(os.path.join(SRC, ".."))
+STATE = os.path.join(ROOT, "data", "processed", "_state", "pipeline.json")
+LOGS = os.path.join(ROOT, "reports", "pipeline_logs")
+SUMMARY = os.path.join(ROOT, "reports", "pipeline_run.json")
+DIGESTS = CACHE_DIR       # where files_digest memoises size/mtime → sha256
+
+RAW_CSV = "data/raw/data_football_ratings.csv"
+RAW_DB = "data/raw/database.sqlite"
+MERGED = "data/processed/player_ratings_merged"
+FEAT = "data/processed/player_ratings_features"
+TARGET = "data/processed/player_ratings_target"
+CLEAN = "data/processed/player_ratings_cleaned"
+TRANSFORMER = "models/feature_transformer.pkl"
+MODEL = "models/rating_model.pkl"
+
+
+class Stage:
+    """One script invocation with the files it reads, writes and is made of.
+
+    Paths are relative to the repository root. Table stems (see common.storage)
+    stand for all of their part files, and outputs may be glob patterns.
+    """
+
+    def __init__(self, name, script, inputs, outputs, code=(), args=(), default=False):
+        self.name = name
+        self.script = script
+        self.args = list(args)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.code = [script, "src/common", *code]
+        self.default = default
+
+    @property
+    def argv(self):
+        return [sys.executable, self.script, *self.args]
+
+
+STAGES = [
+    Stage("ingest", "src/ingest/ingest_data.py", [RAW_CSV, RAW_DB], [MERGED],
+          code=["src/ingest"], default=True),
+    Stage("prepare", "src/features/prepare_data.py", [MERGED], [FEAT, TARGET, CLEAN, TRANSFORMER],
+          code=["src/features"], default=True),
+    Stage("train", "src/model/train_model.py", [FEAT, TARGET, CLEAN],
+          [MODEL, "reports/metrics.txt", "reports/feature_importances.png"],
+          code=["src/model/backends.py", "src/model/forest_arrays.py", "src/model/lineage.py"],
+          default=True),
+    Stage("evaluate", "src/eval/full_evaluate.py", [MODEL, FEAT, TARGET, CLEAN],
+          ["reports/full_eval.txt", "reports/full_eval_slices.csv", "reports/residual_hist.png"],
+          code=["src/eval"], args=["--model", MODEL], default=True),
+    Stage("pos_models", "src/model/train_pos_models.py", [FEAT, TARGET, CLEAN],
+          ["models/rf_pos_*.pkl", "reports/partition_pos.csv"],
+          code=["src/model/partition_trainer.py", "src/model/backends.py",
+                "src/model/forest_arrays.py"]),
+    Stage("weighted", "src/model/train_weighted_rf.py", [FEAT, TARGET, CLEAN],
+          ["models/rating_model_weighted.pkl"], code=["src/model/forest_arrays.py"]),
+    Stage("ensemble", "src/model/ensemble_train.py", [FEAT, TARGET, CLEAN],
+          ["models/stacked_ensemble.pkl", "reports/ensemble.json"],
+          code=["src/model/stacking.py", "src/model/backends.py"]),
+    Stage("cross_validate", "src/model/cross_validate.py", [FEAT, TARGET, CLEAN],
+          ["reports/cv_kfold.json", "reports/cv_oof_kfold"],
+          code=["src/model/cv_engine.py", "src/eval/slicing.py"]),
+]
+
+
+# ── hashing ──
+def _files(path):
+    """Concrete files behind a declared path (table stem, directory, glob or file)."""
+    full = os.path.join(ROOT, path)
+    if any(ch in path for ch in "*?["):
+        return sorted(glob.glob(full))
+    if os.path.isdir(full) and not glob.glob(os.path.join(full, "part-*")):
+        return sorted(os.path.join(d, f) for d, _, fs in os.walk(full) for f in fs
+                      if f.endswith(".py") or not path.startswith("src"))
+    if os.path.isfile(full):
+        return [full]
+    try:
+        return table_files(full)
+    except FileNotFoundError:
+        return []
+
+
+def stage_key(stage):
+    """Hash of the stage's command line, code and input contents (None if an input is missing)."""
+    h = hashlib.sha256(json.dumps(stage.argv[1:]).encode())
+    for path in stage.code + stage.inputs:
+        files = _files(path)
+        if not files:
+            if path in stage.inputs:
+                return None
+            continue
+        h.update(path.encode())
+        h.update(files_digest(files, DIGESTS).encode())
+    return h.hexdigest()
+
+
+def outputs_exist(stage):
+    return all(_files(p) for p in stage.outputs)
+
+
+# ── graph ──
+def dependencies(stages):
+    """stage name -> names of the stages producing any of its inputs."""
+    producer = {out: s.name for s in stages for out in s.outputs}
+    return {s.name: sorted({producer[i] for i in s.inputs if i in producer} - {s.name})
+            for s in stages}
+
+
+def select(stages, targets):
+    """`targets` plus everything upstream of them, in declaration order."""
+    by_name = {s.name: s for s in stages}
+    unknown = set(targets) - set(by_name)
+    if unknown:
+        raise SystemExit(f"unknown stage(s): {', '.join(sorted(unknown))} "
+                         f"(expected {', '.join(by_name)})")
+    deps = dependencies(stages)
+    wanted, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            todo.extend(deps[name])
+    return [s for s in stages if s.name in wanted]
+
+
+def _load_state():
+    try:
+        with open(STATE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(state):
+    os.makedirs(os.path.dirname(STATE), exist_ok=True)
+    tmp = f"{STATE}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, STATE)
+
+
+# ── execution ──
+def _launch(stage):
+    os.makedirs(LOGS, exist_ok=True)
+    log = open(os.path.join(LOGS, f"{stage.name}.log"), "w")
+    proc = subprocess.Popen(stage.argv, cwd=ROOT, stdout=log, stderr=subprocess.STDOUT,
+                            env=dict(os.environ, PYTHONUNBUFFERED="1"))
+    log.close()
+    return proc
+
+
+def _tail(name, n=20):
+    with open(os.path.join(LOGS, f"{name}.log"), errors="replace") as f:
+        return f.readlines()[-n:]
+
+
+def run(stages, jobs=1, force=(), dry_run=False, log=print):
+    """Run (or skip) `stages`; returns {name: record} with status, wall_s and peak_rss_mb.
+
+    A failed stage blocks everything downstream of it; independent branches go on.
+    """
+    names = {s.name for s in stages}
+    deps = {n: [d for d in ds if d in names] for n, ds in dependencies(stages).items()}
+    state = _load_state()
+    results, running = {}, {}          # running: pid -> (stage, Popen, start, key)
+    pending = list(stages)             # declaration order is a topological order
+
+    while pending or running:
+        for stage in list(pending):
+            upstream = [results.get(d, {}).get("status") for d in deps[stage.name]]
+            if None in upstream:       # an upstream stage is still pending or running
+                continue
+            if len(running) >= max(1, jobs):
+                break
+            pending.remove(stage)
+            if any(u in ("failed", "blocked") for u in upstream):
+                results[stage.name] = {"status": "blocked"}
+                log(f"[{stage.name}] blocked by a failed upstream stage")
+                continue
+            # in a dry run, anything downstream of a stale stage is stale too
+            key = None if "would run" in upstream else stage_key(stage)
+            if (key is not None and stage.name not in force
+                    and state.get(stage.name, {}).get("key") == key and outputs_exist(stage)):
+                results[stage.name] = {"status": "skipped", "wall_s": 0.0}
+                log(f"[{stage.name}] up to date")
+            elif dry_run:
+                results[stage.name] = {"status": "would run"}
+                log(f"[{stage.name}] would run")
+            elif key is None:
+                missing = [p for p in stage.inputs if not _files(p)]
+                results[stage.name] = {"status": "failed", "error": f"missing inputs {missing}"}
+                log(f"[{stage.name}] missing inputs: {', '.join(missing)}")
+            else:
+                proc = _launch(stage)
+                running[proc.pid] = (stage, proc, time.perf_counter(), key)
+                log(f"[{stage.name}] started: {' '.join(stage.argv[1:])}")
+
+        if not running:
+            continue
+        pid, status, usage = os.wait4(-1, 0)
+        if pid not in running:
+            continue
+        stage, proc, start, key = running.pop(pid)
+        proc.returncode = code = os.waitstatus_to_exitcode(status)
+        rec = {"wall_s": round(time.perf_counter() - start, 3),
+               "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),   # ru_maxrss is in KiB on Linux
+               "user_s": round(usage.ru_utime, 3), "sys_s": round(usage.ru_stime, 3)}
+        if code == 0:
+            state[stage.name] = {"key": key, **rec, "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            _save_state(state)
+            results[stage.name] = {"status": "ran", **rec}
+            log(f"[{stage.name}] done in {rec['wall_s']:.1f}s, peak RSS {rec['peak_rss_mb']:.0f} MB")
+        else:
+            results[stage.name] = {"status": "failed", "exit_code": code, **rec}
+            log(f"[{stage.name}] FAILED (exit {code}); last lines of {LOGS}/{stage.name}.log:")
+            for line in _tail(stage.name):
+                log("    " + line.rstrip())
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the rating pipeline, skipping unchanged stages.")
+    parser.add_argument("targets", nargs="*",
+                        help="stages to bring up to date (with their upstream); default: the core path")
+    parser.add_argument("--all", action="store_true", help="every stage, including the optional models")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="stages run at the same time")
+    parser.add_argument("--force", nargs="*", default=None, metavar="STAGE",
+                        help="re-run these stages (no names: every selected stage)")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would run")
+    parser.add_argument("--list", action="store_true", help="print the stages and their dependencies")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        deps = dependencies(STAGES)
+        for s in STAGES:
+            after = f"  after {', '.join(deps[s.name])}" if deps[s.name] else ""
+            print(f"{s.name:<15}{'*' if s.default else ' '} {s.script}{after}")
+        print("(* = run by default)")
+        return 0
+
+    targets = [s.name for s in STAGES] if args.all else \
+        (args.targets or [s.name for s in STAGES if s.default])
+    stages = select(STAGES, targets)
+    force = {s.name for s in stages} if args.force == [] else set(args.force or ())
+
+    if profiling.enabled():     # one profile run id across every stage process
+        os.environ.setdefault(profiling.RUN_ENV, profiling.run_id())
+    t0 = time.perf_counter()
+    results = run(stages, jobs=args.jobs, force=force, dry_run=args.dry_run)
+    wall = time.perf_counter() - t0
+
+    print(f"\n{'stage':<15} {'status':<10} {'wall s':>8} {'peak RSS MB':>12}")
+    for s in stages:
+        r = results.get(s.name, {"status": "blocked"})
+        wall_s = f"{r['wall_s']:.1f}" if "wall_s" in r else "-"
+        rss = f"{r['peak_rss_mb']:.0f}" if "peak_rss_mb" in r else "-"
+        print(f"{s.name:<15} {r['status']:<10} {wall_s:>8} {rss:>12}")
+    print(f"total {wall:.1f}s")
+
+    if not args.dry_run:
+        os.makedirs(os.path.dirname(SUMMARY), exist_ok=True)
+        with open(SUMMARY, "w") as f:
+            json.dump({"wall_s": round(wall, 3), "jobs": args.jobs, "stages": results}, f, indent=2)
+    return 1 if any(r["status"] in ("failed", "blocked") for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# batch_score.py
+#
+# Chunked, parallel scoring for prediction files too large to load at once.
+#
+# The input is streamed in chunks of --chunk-rows. Each chunk is encoded
+# with the fitted FeatureTransformer and scored on a pool of worker processes.
+# Results are written in input order as soon as they are ready, and at most
+# `2 × workers` chunks are in flight, so memory stays flat.
+#
+# Sharing the model: on Linux the pool is forked after the model has been
+# loaded, so every worker reads the parent's copy-on-write pages instead of
+# unpickling its own. Elsewhere (spawn) each worker loads it with
+# joblib mmap_mode="r", which maps the numpy arrays of the pickle read-only.
+# A flattened forest directory (model/forest_arrays.py) is plain .npy files,
+# so there every worker maps the very same pages either way.
+#
+#   python src/predict/batch_score.py --model models/rating_model.pkl \
+#       --input data/processed/player_ratings_merged --output reports/predictions.parquet \
+#       --id-col player_name --id-col match --workers 4
+
+import os, sys, time, argparse, multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.storage import iter_table, TableWriter
+from predict.predict_rating import load_transformer
+from model.forest_arrays import ForestArrays, is_forest_dir, is_forest_npz
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+# ── worker state ──
+_MODEL = None
+_TRANSFORMER = None
+
+
+def _single_threaded(model):
+    # one process per core already; nested tree-level threads only oversubscribe
+    if hasattr(model, "n_jobs"):
+        model.n_jobs = 1
+    return model
+
+
+def _load_model(model_path):
+    if is_forest_dir(model_path):  # flattened forest: every process maps the same .npy pages
+        return ForestArrays.load(model_path, mmap_mode="r")
+    if is_forest_npz(model_path):
+        return ForestArrays.load_compressed(model_path)
+    return joblib.load(model_path, mmap_mode="r")
+
+
+def _init_worker(model_path, transformer_path):
+    global _MODEL, _TRANSFORMER
+    if _MODEL is None:  # spawned worker: nothing inherited from the parent
+        _MODEL = _single_threaded(_load_model(model_path))
+        _TRANSFORMER = load_transformer(model_path, transformer_path)
+
+
+def score_frame(model, transformer, df, id_cols=None):
+    """Predict one chunk; returns the id columns (or all prepared features) plus `predicted_rating`."""
+    X = transformer.prepare(df)
+    preds = model.predict(X)
+    out = df[list(id_cols)].reset_index(drop=True) if id_cols else X.reset_index(drop=True)
+    out["predicted_rating"] = preds
+    return out
+
+
+def _score_chunk(df, id_cols):
+    return score_frame(_MODEL, _TRANSFORMER, df, id_cols)
+
+
+def _output_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    return {".csv": "csv", ".parquet": "parquet"}.get(ext)
+
+
+def _check_id_cols(df, id_cols):
+    missing = [c for c in id_cols or () if c not in df.columns]
+    if missing:
+        raise KeyError(f"--id-col not found in input: {missing}")
+
+
+def score_file(model_path, input_path, output_path, transformer_path=None,
+               chunk_rows=DEFAULT_CHUNK_ROWS, workers=None, id_cols=None):
+    """Stream `input_path` through the model chunk by chunk; returns the number of rows scored."""
+    global _MODEL, _TRANSFORMER
+    workers = workers or os.cpu_count() or 1
+    t0 = time.perf_counter()
+
+    _TRANSFORMER = load_transformer(model_path, transformer_path)
+    if _TRANSFORMER is None:
+        # batch medians would change with the chunk size; only the fitted
+        # transformer imputes every row the same way regardless of chunking
+        raise SystemExit("Chunked scoring needs the fitted feature transformer "
+                         "(run prepare_data.py or pass --transformer)")
+    _MODEL = _load_model(model_path)
+    if workers > 1:
+        _single_threaded(_MODEL)
+
+    chunks = iter_table(input_path, chunk_rows)
+    with TableWriter(output_path, fmt=_output_format(output_path)) as writer:
+        if workers == 1:
+            for df in chunks:
+                _check_id_cols(df, id_cols)
+                writer.write(_score_chunk(df, id_cols))
+        else:
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+            max_inflight = 2 * workers
+            with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker,
+                                     initargs=(model_path, transformer_path)) as pool:
+                inflight = deque()
+                for df in chunks:
+                    _check_id_cols(df, id_cols)
+                    inflight.append(pool.submit(_score_chunk, df, id_cols))
+                    if len(inflight) >= max_inflight:
+                        writer.write(inflight.popleft().result())
+                while inflight:
+                    writer.write(inflight.popleft().result())
+        rows, path = writer.rows, writer.path
+
+    elapsed = time.perf_counter() - t0
+    print(f"Scored {rows} rows with {workers} worker(s) in {elapsed:.1f}s "
+          f"({rows / max(elapsed, 1e-9):,.0f} rows/s) → {path}")
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chunked, parallel batch scoring.")
+    parser.add_argument("--model",  required=True)
+    parser.add_argument("--input",  required=True, help="table stem, .parquet, .csv or dataset directory")
+    parser.add_argument("--output", required=True, help=".csv, .parquet or a stem (default format)")
+    parser.add_argument("--transformer", default=None,
+                        help="fitted feature transformer (default: feature_transformer.pkl next to --model)")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--id-col", action="append", default=None,
+                        help="write only these input columns plus predicted_rating (repeatable)")
+    args = parser.parse_args(argv)
+
+    score_file(args.model, args.input, args.output, args.transformer,
+               chunk_rows=args.chunk_rows, workers=args.workers, id_cols=args.id_col)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# position_router.py
+#
+# Serve the per-position specialists written by train_pos_models.py.
+#
+# A mixed batch is grouped by position in one vectorised pass
+# (factorize + stable argsort). Each group is scored by its position's model,
+# and the predictions are scattered back into input order. Positions without
+# a specialist (or with a missing position) go to the base model. Models are
+# loaded on first use into an LRU cache bounded by bytes, so a service only
+# holds the specialists its traffic actually needs. With a PredictionStore
+# (eval/prediction_store.py), rows a model has already scored are read back
+# instead of predicted, and that model is not loaded at all.
+#
+#   python src/predict/position_router.py --input data/processed/player_ratings_merged \
+#       --output reports/pos_predictions.csv --id-col player_name --cache-mb 1024
+
+import os, sys, time, argparse, threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.storage import read_table
+from model.forest_arrays import load_forest_or_model, FOREST_SUFFIX
+from predict.predict_rating import load_transformer
+
+ROOT = os.path.abspath(os.path.join(SRC, ".."))
+MODELDIR = os.path.join(ROOT, "models")
+BASEMODEL = os.path.join(MODELDIR, "rating_model.pkl")
+POS_MODEL = "rf_pos_{pos}"
+
+
+def artifact_nbytes(path):
+    """Memory cost estimate of a model artifact: its size on disk."""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return os.path.getsize(path)
+
+
+class ModelCache:
+    """Thread-safe LRU of loaded models keyed by artifact path, bounded by `max_bytes`.
+
+    The most recently used model is always kept, even if it alone exceeds the bound.
+    Models load outside the lock: other paths stay servable meanwhile, and threads
+    asking for a path that is being loaded wait for that one load.
+    """
+
+    def __init__(self, max_bytes=2 << 30, loader=load_forest_or_model):
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self._models = OrderedDict()   # path -> (model, nbytes)
+        self._loading = {}             # path -> Future of the model
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        with self._lock:
+            if path in self._models:
+                self._models.move_to_end(path)
+                self.hits += 1
+                return self._models[path][0]
+            pending = self._loading.get(path)
+            if pending is None:
+                self.misses += 1
+                self._loading[path] = future = Future()
+            else:
+                self.hits += 1
+        if pending is not None:
+            return pending.result()
+
+        try:
+            model, size = self.loader(path), artifact_nbytes(path)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[path]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[path]
+            self._models[path] = (model, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes and len(self._models) > 1:
+                _, (_, evicted) = self._models.popitem(last=False)
+                self.nbytes -= evicted
+                self.evictions += 1
+        future.set_result(model)
+        return model
+
+    def __contains__(self, path):
+        with self._lock:
+            return path in self._models
+
+    def stats(self):
+        with self._lock:
+            return {"models": list(self._models), "bytes": self.nbytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+
+class PositionRouter:
+    """Route rows to `rf_pos_<pos>` models, falling back to the base model."""
+
+    def __init__(self, model_dir=MODELDIR, base_model=BASEMODEL, max_bytes=2 << 30, cache=None,
+                 store=None):
+        self.model_dir = model_dir
+        self.base_model = base_model
+        self.cache = cache or ModelCache(max_bytes)
+        self.store = store
+
+    def model_path(self, pos):
+        """Artifact serving `pos`: flattened forest first, then pickle, then the base model."""
+        if isinstance(pos, str):
+            stem = os.path.join(self.model_dir, POS_MODEL.format(pos=pos))
+            for path in (stem + FOREST_SUFFIX, stem + ".pkl"):
+                if os.path.exists(path):
+                    return path
+        return self.base_model
+
+    def model_for_pos(self, pos):
+        return self.cache.get(self.model_path(pos))
+
+    def predict(self, X, pos):
+        """Predict every row of `X` with the model for its position; output is in input order."""
+        pos = np.asarray(pos, dtype=object)
+        if len(pos) != len(X):
+            raise ValueError(f"{len(pos)} positions for {len(X)} rows")
+        codes, uniques = pd.factorize(pos)             # missing position → -1
+        paths = [self.model_path(p) for p in uniques] + [self.base_model]
+        path_codes, path_names = pd.factorize(np.array(paths, dtype=object))
+        # positions sharing an artifact (e.g. several falling back) form one group
+        group = path_codes[codes]                      # codes == -1 picks the trailing base model
+        order = np.argsort(group, kind="stable")
+        bounds = np.cumsum(np.bincount(group, minlength=len(path_names)))
+
+        out = np.empty(len(X), dtype=np.float64)
+        start = 0
+        for g, end in enumerate(bounds):
+            if end > start:
+                rows = order[start:end]
+                part = X.iloc[rows] if isinstance(X, pd.DataFrame) else X[rows]
+                if self.store is not None:
+                    out[rows] = self.store.predict(path_names[g], part, loader=self.cache.get)
+                else:
+                    out[rows] = self.cache.get(path_names[g]).predict(part)
+            start = end
+        return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score raw rows with per-position models.")
+    parser.add_argument("--input", required=True, help="raw merged rows (needs a 'pos' column)")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--model-dir", default=MODELDIR)
+    parser.add_argument("--base-model", default=BASEMODEL)
+    parser.add_argument("--transformer", default=None,
+                        help="fitted feature transformer (default: next to --base-model)")
+    parser.add_argument("--cache-mb", type=float, default=2048, help="memory bound of the model cache")
+    parser.add_argument("--id-col", action="append", default=None)
+    args = parser.parse_args(argv)
+
+    transformer = load_transformer(args.base_model, args.transformer)
+    if transformer is None:
+        raise SystemExit("Routing needs the fitted feature transformer (run prepare_data.py)")
+    df = read_table(args.input)
+    if "pos" not in df.columns:
+        raise SystemExit(f"{args.input} has no 'pos' column to route on")
+
+    router = PositionRouter(args.model_dir, args.base_model, max_bytes=int(args.cache_mb * 2**20))
+    t0 = time.perf_counter()
+    preds = router.predict(transformer.prepare(df), df["pos"].to_numpy())
+    out = df[args.id_col] if args.id_col else df[["pos"]]
+    out = out.assign(predicted_rating=preds)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    out.to_csv(args.output, index=False)
+    stats = router.cache.stats()
+    print(f"Saved {len(out)} predictions → {args.output} in {time.perf_counter() - t0:.2f}s "
+          f"({stats['misses']} model loads, {stats['evictions']} evictions, "
+          f"{stats['bytes'] / 2**20:.0f} MB cached)")
+
+
+if __name__ == "__main__":
+    main()
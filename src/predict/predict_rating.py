@@ -2,29 +2,89 @@
 # predict_rating.py
 
 
-import os, argparse, pandas as pd, numpy as np, joblib
+import os, sys, argparse, numpy as np
 
-def load_features(path):
-    df = pd.read_csv(path)
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.profiling import span, stage
+from common.storage import read_table
+from features.transformer import FeatureTransformer, default_path
+from common.hashing import file_digest
+from model.forest_arrays import load_forest_or_model, read_header
+
+def load_transformer(model_path, transformer_path=None):
+    """The fitted transformer saved by prepare_data.py next to the model, if any.
+
+    A forest artifact's header records the transformer it was trained with;
+    a different one is reported, since its medians and columns may not match.
+    """
+    path = transformer_path or default_path(model_path)
+    if os.path.isfile(path):
+        expected = ((read_header(model_path) or {}).get("transformer") or {}).get("sha256")
+        if expected and expected != file_digest(path):
+            print(f"Warning: {path} is not the transformer {model_path} was trained with")
+        return FeatureTransformer.load(path)
+    if transformer_path:
+        raise FileNotFoundError(f"Feature transformer not found: {path}")
+    return None
+
+def load_features(path, transformer=None):
+    """Read raw merged rows or engineered features and return clean model input.
+
+    With a fitted transformer every row is imputed with the training medians in
+    one vectorised pass, so any batch size (even one row) is scored correctly.
+    Without one we fall back to the old behaviour of batch medians.
+    """
+    df = read_table(path)
+    if transformer is not None:
+        return transformer.prepare(df)
+    print("Warning: no feature transformer — imputing with medians of this batch")
     df.replace([np.inf, -np.inf], np.nan, inplace=True)
     df.fillna(df.median(), inplace=True)
     return df
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser()
-    parser.add_argument("--model",  required=True)
+    parser.add_argument("--model",  required=True,
+                        help="pickled model, flattened forest directory or .forest.npz (forest_arrays.py)")
     parser.add_argument("--input",  required=True)
     parser.add_argument("--output", required=True)
-    args = parser.parse_args()
+    parser.add_argument("--transformer", default=None,
+                        help="fitted feature transformer (default: feature_transformer.pkl next to --model)")
+    parser.add_argument("--chunk-rows", type=int, default=None,
+                        help="stream the input in chunks of this many rows (see batch_score.py)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="score chunks on this many processes (implies chunked mode)")
+    parser.add_argument("--id-col", action="append", default=None,
+                        help="write only these input columns plus predicted_rating (repeatable)")
+    args = parser.parse_args(argv)
+    with stage("predict"):
+        run(args)
+
+def run(args):
+    if args.chunk_rows or args.workers:
+        from predict.batch_score import score_file, DEFAULT_CHUNK_ROWS
+        score_file(args.model, args.input, args.output, args.transformer,
+                   chunk_rows=args.chunk_rows or DEFAULT_CHUNK_ROWS,
+                   workers=args.workers, id_cols=args.id_col)
+        return
 
-    X_new = load_features(args.input)
-    model = joblib.load(args.model)
+    with span("load_features"):
+        transformer = load_transformer(args.model, args.transformer)
+        ids = read_table(args.input, columns=args.id_col) if args.id_col else None
+        X_new = load_features(args.input, transformer)
+    with span("load_model"):
+        model = load_forest_or_model(args.model)
 
-    preds = model.predict(X_new.values)
-    out_df = X_new.copy()
+    with span("predict", rows=len(X_new)):
+        preds = model.predict(X_new.values)
+    out_df = ids if ids is not None else X_new
     out_df["predicted_rating"] = preds
-    os.makedirs(os.path.dirname(args.output), exist_ok=True)
-    out_df.to_csv(args.output, index=False)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with span("write"):
+        out_df.to_csv(args.output, index=False)
     print(f"Saved {len(preds)} predictions → {args.output}")
 
 if __name__ == "__main__":
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# client.py
+#
+# Stdlib-only client for scoring_service.py (TCP or Unix socket).
+#
+#   from serve.client import RaterClient
+#   client = RaterClient("http://127.0.0.1:8765")        # or RaterClient(unix_socket="/tmp/rater.sock")
+#   client.predict([{"pos": "MF", "minutesPlayed": 90, ...}])
+
+import json
+import math
+import socket
+import http.client
+from urllib.parse import urlparse
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=30):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+def _clean(value):
+    # JSON has no NaN; missing values travel as null
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class RaterClient:
+    """Keeps one persistent connection; create one client per thread."""
+
+    def __init__(self, url="http://127.0.0.1:8765", unix_socket=None, timeout=30):
+        if unix_socket:
+            self._conn = _UnixHTTPConnection(unix_socket, timeout=timeout)
+        else:
+            u = urlparse(url)
+            self._conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=timeout)
+
+    def _request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if data else {}
+        try:
+            self._conn.request(method, path, body=data, headers=headers)
+            resp = self._conn.getresponse()
+        except (ConnectionError, http.client.HTTPException):
+            self._conn.close()  # server dropped the keep-alive connection: retry once
+            self._conn.request(method, path, body=data, headers=headers)
+            resp = self._conn.getresponse()
+        payload = json.loads(resp.read())
+        if resp.status != 200:
+            raise RuntimeError(payload.get("error", f"HTTP {resp.status}"))
+        return payload
+
+    def predict(self, rows):
+        """Score a list of row dicts; returns a list of predicted ratings."""
+        rows = [{k: _clean(v) for k, v in r.items()} for r in rows]
+        return self._request("POST", "/predict", {"rows": rows})["predictions"]
+
+    def predict_table(self, columns, data):
+        """Score column-major input: `data` is a list of row lists aligned with `columns`."""
+        data = [[_clean(v) for v in row] for row in data]
+        return self._request("POST", "/predict", {"columns": list(columns), "data": data})["predictions"]
+
+    def metrics(self):
+        return self._request("GET", "/metrics")
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def close(self):
+        self._conn.close()
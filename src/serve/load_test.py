@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# load_test.py
+#
+# Fire concurrent requests at a running scoring_service.py on localhost and
+# report client-side latency percentiles, throughput and the server's
+# micro-batching counters.
+#
+#   python src/serve/scoring_service.py &
+#   python src/serve/load_test.py --concurrency 16 --requests 2000 --rows-per-request 1
+
+import os, sys, time, json, argparse, threading
+
+import numpy as np
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.storage import read_table
+from serve.client import RaterClient
+
+ROOT = os.path.abspath(os.path.join(SRC, ".."))
+SAMPLE = os.path.join(ROOT, "data", "processed", "player_ratings_merged")
+
+
+def load_rows(path, n=1000):
+    df = read_table(path).drop(columns=["rating"], errors="ignore").head(n)
+    for c in df.columns:
+        if df[c].dtype.kind == "M":
+            df[c] = df[c].astype(str)
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def run(url, unix_socket, rows, concurrency, n_requests, rows_per_request):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    counter = iter(range(n_requests))
+
+    def worker():
+        client = RaterClient(url, unix_socket=unix_socket)
+        rng = np.random.default_rng(threading.get_ident() % 2**32)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            idx = rng.integers(0, len(rows), rows_per_request)
+            t0 = time.perf_counter()
+            try:
+                client.predict([rows[j] for j in idx])
+                ok = True
+            except Exception as exc:
+                ok = False
+                with lock:
+                    errors.append(str(exc))
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - t0)
+        client.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    return np.array(latencies) * 1000, errors, wall
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the local scoring service.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--unix-socket", default=None)
+    parser.add_argument("--sample", default=SAMPLE, help="table to draw request rows from")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--rows-per-request", type=int, default=1)
+    parser.add_argument("--output", default=None, help="write the summary as JSON")
+    args = parser.parse_args(argv)
+
+    rows = load_rows(args.sample)
+    client = RaterClient(args.url, unix_socket=args.unix_socket)
+    before = client.metrics()
+    lat, errors, wall = run(args.url, args.unix_socket, rows, args.concurrency,
+                            args.requests, args.rows_per_request)
+    after = client.metrics()
+    client.close()
+
+    done = len(lat)
+    batches = after["batches"] - before["batches"]
+    summary = {
+        "requests": done,
+        "errors": len(errors),
+        "concurrency": args.concurrency,
+        "rows_per_request": args.rows_per_request,
+        "wall_s": round(wall, 3),
+        "requests_per_s": round(done / wall, 1),
+        "rows_per_s": round(done * args.rows_per_request / wall, 1),
+        "latency_ms": {p: round(float(np.percentile(lat, q)), 3) if done else None
+                       for p, q in (("p50", 50), ("p95", 95), ("p99", 99))},
+        "server_batches": batches,
+        "server_mean_batch_rows": round((after["rows"] - before["rows"]) / batches, 2) if batches else 0,
+    }
+    print(json.dumps(summary, indent=2))
+    if errors:
+        print(f"First error: {errors[0]}")
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# scoring_service.py
+#
+# Resident rating service: the model and feature transformer are loaded once
+# and kept warm, concurrent requests are coalesced into micro-batches for a
+# single model.predict call, and latency/throughput counters are exposed.
+#
+#   POST /predict   {"rows": [{col: value, ...}, ...]}
+#                   or {"columns": [...], "data": [[...], ...]}
+#                → {"predictions": [...], "latency_ms": ...}
+#   GET  /metrics  counters, batch sizes, latency percentiles, throughput
+#   GET  /health
+#
+# Rows may be raw merged rows or engineered features (see FeatureTransformer.prepare).
+
+import os, sys, json, time, queue, argparse, threading, warnings, socketserver
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from predict.predict_rating import load_transformer
+from model.forest_arrays import load_forest_or_model
+
+ROOT = os.path.abspath(os.path.join(SRC, ".."))
+MODEL_PATH = os.path.join(ROOT, "models", "rating_model.pkl")
+
+
+class Metrics:
+    """Thread-safe request/batch counters with a rolling latency window."""
+
+    def __init__(self, window=10_000):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.requests = self.rows = self.batches = self.errors = 0
+        self.max_batch_rows = 0
+        self._latency = deque(maxlen=window)      # seconds, per request
+        self._recent = deque()                    # (timestamp, rows) for the last minute
+
+    def record_batch(self, n_requests, n_rows):
+        with self._lock:
+            self.batches += 1
+            self.max_batch_rows = max(self.max_batch_rows, n_rows)
+
+    def record_request(self, n_rows, latency, ok=True):
+        now = time.time()
+        with self._lock:
+            self.requests += 1
+            self.rows += n_rows
+            self.errors += 0 if ok else 1
+            self._latency.append(latency)
+            self._recent.append((now, n_rows))
+            while self._recent and self._recent[0][0] < now - 60:
+                self._recent.popleft()
+
+    def snapshot(self):
+        with self._lock:
+            lat = np.array(self._latency) * 1000 if self._latency else np.zeros(1)
+            uptime = time.time() - self.started
+            recent_rows = sum(n for _, n in self._recent)
+            recent_span = min(60.0, uptime) or 1.0
+            return {
+                "uptime_s": round(uptime, 1),
+                "requests": self.requests,
+                "rows": self.rows,
+                "errors": self.errors,
+                "batches": self.batches,
+                "mean_batch_rows": round(self.rows / self.batches, 2) if self.batches else 0,
+                "max_batch_rows": self.max_batch_rows,
+                "latency_ms": {
+                    "p50": round(float(np.percentile(lat, 50)), 3),
+                    "p95": round(float(np.percentile(lat, 95)), 3),
+                    "p99": round(float(np.percentile(lat, 99)), 3),
+                    "max": round(float(lat.max()), 3),
+                },
+                "throughput_rows_per_s": {
+                    "overall": round(self.rows / uptime, 1) if uptime else 0,
+                    "last_60s": round(recent_rows / recent_span, 1),
+                },
+            }
+
+
+class _Pending:
+    __slots__ = ("frame", "done", "result", "error")
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Collects requests for up to `max_wait_ms` (or `max_batch_rows` rows),
+    prepares each request's rows, and scores them all with one predict call."""
+
+    def __init__(self, model, transformer=None, max_batch_rows=512, max_wait_ms=5.0, metrics=None):
+        self.model = model
+        self.transformer = transformer
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self.metrics = metrics or Metrics()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def predict(self, frame, timeout=30):
+        pending = _Pending(frame)
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError("prediction timed out")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _prepare(self, frame):
+        """Model input for one request's rows (raw rows and features are told apart per request)."""
+        if self.transformer is not None:
+            return self.transformer.prepare(frame)
+        names = getattr(self.model, "feature_names_in_", None)
+        if names is not None:
+            frame = frame.reindex(columns=list(names))
+        return frame.replace([np.inf, -np.inf], np.nan).fillna(0)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            rows = len(batch[0].frame)
+            deadline = time.perf_counter() + self.max_wait
+            while rows < self.max_batch_rows:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                rows += len(item.frame)
+            self._score(batch, rows)
+
+    def _score(self, batch, rows):
+        try:
+            # prepared per request: one request's raw columns must not decide how another's
+            # engineered features are read
+            prepared = [self._prepare(p.frame) for p in batch]
+            with warnings.catch_warnings():  # all-null columns in a single request are expected
+                warnings.simplefilter("ignore", FutureWarning)
+                X = prepared[0] if len(prepared) == 1 else pd.concat(prepared, ignore_index=True)
+            preds = self.model.predict(X)
+        except Exception as exc:  # fall back to per-request scoring to isolate the bad one
+            if len(batch) > 1:
+                for p in batch:
+                    self._score([p], len(p.frame))
+                return
+            batch[0].error = exc
+            batch[0].done.set()
+            return
+        self.metrics.record_batch(len(batch), rows)
+        start = 0
+        for p in batch:
+            p.result = preds[start:start + len(p.frame)]
+            start += len(p.frame)
+            p.done.set()
+
+
+def parse_payload(payload):
+    if "rows" in payload:
+        return pd.DataFrame.from_records(payload["rows"])
+    if "columns" in payload and "data" in payload:
+        return pd.DataFrame(payload["data"], columns=payload["columns"])
+    raise ValueError("expected {'rows': [...]} or {'columns': [...], 'data': [...]}")
+
+
+def make_handler(batcher):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, code, body):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                self._send(200, batcher.metrics.snapshot())
+            elif self.path == "/health":
+                self._send(200, {"status": "ok"})
+            else:
+                self._send(404, {"error": f"unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self._send(404, {"error": f"unknown path {self.path}"})
+                return
+            t0 = time.perf_counter()
+            n_rows = 0
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                frame = parse_payload(json.loads(self.rfile.read(length)))
+                n_rows = len(frame)
+                preds = batcher.predict(frame) if n_rows else np.empty(0)
+            except Exception as exc:
+                batcher.metrics.record_request(n_rows, time.perf_counter() - t0, ok=False)
+                self._send(400, {"error": f"{type(exc).__name__}: {exc}"})
+                return
+            latency = time.perf_counter() - t0
+            batcher.metrics.record_request(n_rows, latency)
+            self._send(200, {"predictions": [float(p) for p in preds],
+                             "latency_ms": round(latency * 1000, 3)})
+
+        def log_message(self, fmt, *args):  # keep the hot path quiet
+            pass
+
+    return Handler
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)  # BaseHTTPRequestHandler expects (host, port)
+
+
+def build_server(batcher, host="127.0.0.1", port=8765, unix_socket=None):
+    handler = make_handler(batcher)
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        return ThreadingUnixHTTPServer(unix_socket, handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def load_batcher(model_path, transformer_path=None, max_batch_rows=512, max_wait_ms=5.0):
+    t0 = time.perf_counter()
+    model = load_forest_or_model(model_path)
+    transformer = load_transformer(model_path, transformer_path)
+    if transformer is None:
+        print("Warning: no feature transformer — requests must carry engineered features")
+    batcher = MicroBatcher(model, transformer, max_batch_rows=max_batch_rows, max_wait_ms=max_wait_ms)
+    if transformer is not None:  # warm the predict path once before taking traffic
+        warm = pd.DataFrame(np.zeros((1, len(transformer.feature_columns_))),
+                            columns=transformer.feature_columns_)
+        model.predict(transformer.clean_features(warm))
+    print(f"Model loaded from {model_path} in {time.perf_counter() - t0:.2f}s")
+    return batcher
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve rating predictions from a warm model.")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--transformer", default=None,
+                        help="fitted feature transformer (default: next to --model)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", default=None, help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--max-batch-rows", type=int, default=512)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0,
+                        help="how long the first request of a batch waits for company")
+    args = parser.parse_args(argv)
+
+    batcher = load_batcher(args.model, args.transformer, args.max_batch_rows, args.max_wait_ms)
+    server = build_server(batcher, args.host, args.port, args.unix_socket)
+    where = args.unix_socket or f"http://{args.host}:{args.port}"
+    print(f"Serving predictions on {where} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+#conftest.py
+
+import os, sys, numpy as np, pandas as pd, pytest
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.dataset import load_dataset
+from common.storage import write_table
+
+@pytest.fixture
+def tiny_dataset(tmp_path):
+    """make(n, meta=None, seed=0, columns="abc") -> (ds, X, y): a cached Dataset under tmp_path.
+
+    X is float32 normal noise and y = a + 7 + noise. `meta(rng, y)` builds the
+    cleaned-rows table (context columns); without it the dataset has none.
+    """
+    def make(n, meta=None, seed=0, columns="abc"):
+        rng = np.random.default_rng(seed)
+        X = pd.DataFrame(rng.normal(size=(n, len(columns))).astype("float32"), columns=list(columns))
+        y = X["a"].to_numpy() + 7 + rng.normal(0, 0.1, n)
+        tables = [X, pd.DataFrame({"rating": y})] + ([meta(rng, y)] if meta else [])
+        paths = [str(tmp_path / name) for name in ("feat", "target", "clean")[:len(tables)]]
+        for df, p in zip(tables, paths):
+            write_table(df, p)
+        clean = paths[2] if meta else None
+        return load_dataset(paths[0], paths[1], clean, cache_dir=str(tmp_path / "cache")), X, y
+    return make
@@ -0,0 +1,88 @@
+#test_eval.py
+
+import os, sys, numpy as np, pandas as pd
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from eval.slicing import assign_bands, slice_metrics, format_slice, get_slice
+
+def test_slice_metrics_match_groupby_including_crosses():
+    rng = np.random.default_rng(4)
+    n = 1_000
+    y = rng.uniform(5, 10, n)
+    pred = y + rng.normal(0, 0.5, n)
+    keys = pd.DataFrame({"pos": rng.choice(["DF", "FW", "GK", None], n),
+                         "competition": rng.choice([f"C{i}" for i in range(40)], n)})
+    keys["band"] = assign_bands(y)
+    table = slice_metrics(y, pred, keys, ["band", "pos", ("pos", "competition")])
+
+    df = keys.assign(err=pred - y)
+    df["abs"], df["sq"] = df["err"].abs(), df["err"] ** 2
+    for name, by in (("band", ["band"]), ("pos", ["pos"]), ("pos × competition", ["pos", "competition"])):
+        ref = df.groupby(by, observed=True).agg(n=("err", "size"), mae=("abs", "mean"),
+                                                sq=("sq", "mean"), bias=("err", "mean")).reset_index()
+        got = get_slice(table, name).merge(ref, on=by, suffixes=("", "_ref"))
+        assert len(got) == len(ref) == len(get_slice(table, name))
+        np.testing.assert_array_equal(got["n"], got["n_ref"])
+        np.testing.assert_allclose(got["mae"], got["mae_ref"], rtol=1e-12)
+        np.testing.assert_allclose(got["rmse"], np.sqrt(got["sq"]), rtol=1e-12)
+        np.testing.assert_allclose(got["bias"], got["bias_ref"], rtol=1e-9, atol=1e-12)
+
+    bands = assign_bands([5.75, 6.25, 7.0, 7.75, 10.1, 3.0])
+    assert [b if isinstance(b, str) else None for b in bands] == ["≈6", None, "≈7", "≥8", None, None]
+    assert format_slice(table, "band")[0].startswith(" ≈6: ")
+
+def test_prediction_store_hits_partial_hits_and_invalidation(tmp_path):
+    import joblib
+    from sklearn.ensemble import RandomForestRegressor
+    from eval.prediction_store import PredictionStore
+    rng = np.random.default_rng(5)
+    X = pd.DataFrame(rng.normal(size=(100, 3)), columns=list("abc"))
+    y = X["a"].to_numpy()
+    model_path = str(tmp_path / "m.pkl")
+    joblib.dump(RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y), model_path)
+    loads = []
+    store = PredictionStore(str(tmp_path / "cache" / "predictions"),
+                            loader=lambda p: loads.append(p) or joblib.load(p), keep=1)
+
+    first = store.predict(model_path, X.iloc[:60], key="part")
+    assert store.last["computed"] == 60 and len(loads) == 1
+    np.testing.assert_array_equal(store.predict(model_path, X.iloc[:60], key="part"), first)
+    assert store.last["source"] == "key" and len(loads) == 1        # model not reloaded
+
+    both = store.predict(model_path, X)                             # 60 known, 40 new rows
+    assert store.last == {"source": "rows", "hits": 60, "computed": 40}
+    np.testing.assert_allclose(both, joblib.load(model_path).predict(X))
+
+    joblib.dump(RandomForestRegressor(n_estimators=5, random_state=1).fit(X, y), model_path)
+    store.predict(model_path, X.iloc[:60], key="part")              # retrained → recomputed
+    assert store.last["computed"] == 60
+    assert len(os.listdir(store.cache_dir)) == 1                     # the old model's dir is pruned
+
+def test_prediction_store_appends_parts_without_losing_concurrent_rows(tmp_path, monkeypatch):
+    import joblib
+    from sklearn.ensemble import RandomForestRegressor
+    from eval import prediction_store
+    from eval.prediction_store import PredictionStore, row_hashes
+    rng = np.random.default_rng(6)
+    X = pd.DataFrame(rng.normal(size=(100, 3)), columns=list("abc"))
+    model_path = str(tmp_path / "m.pkl")
+    joblib.dump(RandomForestRegressor(n_estimators=5, random_state=0).fit(X, X["a"]), model_path)
+    store = PredictionStore(str(tmp_path / "predictions"))
+    directory = store.model_dir(model_path, X.columns)
+
+    store.predict(model_path, X.iloc[:20])
+    stale, parts = store._load_rows(directory)              # a writer reads ...
+    store.predict(model_path, X.iloc[20:40])                # ... another one appends ...
+    late = X.iloc[40:50]                                    # ... then the first one appends
+    store._save_rows(directory, stale, parts, row_hashes(late), np.zeros(len(late)))
+    assert len(store._load_rows(directory)[0]) == 50
+
+    monkeypatch.setattr(prediction_store, "COMPACT_PARTS", 4)
+    store.predict(model_path, X.iloc[50:60])                # fourth part → merged into one
+    known, parts = store._load_rows(directory)
+    assert len(parts) == 1 and len(known) == 60
+    store.predict(model_path, X.iloc[:60])
+    assert store.last["computed"] == 0
@@ -0,0 +1,117 @@
+#test_features.py
+
+import os, sys, numpy as np, pandas as pd
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from features.transformer import FeatureTransformer
+
+def make_merged(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "competition": rng.choice(["Bundesliga", "Premier League", "Serie A"], n),
+        "date": pd.Timestamp("2017-08-01") + pd.to_timedelta(rng.integers(0, 300, n), unit="D"),
+        "match": [f"M{i // 20}" for i in range(n)],
+        "team": rng.choice(["A", "B"], n),
+        "pos": rng.choice(["DF", "MF", "FW", "GK"], n),
+        "pos_role": rng.choice(["DC", "DMC", "FW"], n),
+        "player_name": rng.choice([f"P{i}" for i in range(30)], n),
+        "rating": np.round(rng.normal(6.8, 0.6, n), 1),
+        "minutesPlayed": rng.integers(0, 91, n),
+        "goals": rng.poisson(0.3, n),
+        "touches": rng.poisson(40, n),
+        "win": rng.integers(0, 2, n).astype(bool),
+        "lost": rng.integers(0, 2, n).astype(bool),
+        "is_home_team": rng.integers(0, 2, n).astype(bool),
+        "overall_rating": rng.integers(50, 90, n).astype(float),
+    })
+    df.loc[df.index[::17], "overall_rating"] = np.nan
+    df.loc[df.index[3], "team"] = None  # dropped at training time
+    return df
+
+def test_fit_transform_matches_get_dummies_layout():
+    df = make_merged()
+    X, y = FeatureTransformer().fit_transform(df.copy())
+    assert len(X) == len(y) == len(df) - 1
+    ref = pd.get_dummies(df.dropna(subset=["team"])[["pos"]].astype("category"),
+                         columns=["pos"], drop_first=True)
+    assert [c for c in X.columns if c.startswith("pos_") and not c.startswith("pos_role")] \
+        == ref.columns.tolist()
+    assert X["touches_per90"].isna().sum() == (df.dropna(subset=["team"])["minutesPlayed"] == 0).sum()
+
+def test_single_row_matches_batch_and_handles_unseen_category():
+    df = make_merged()
+    t = FeatureTransformer().fit(df.copy())
+    batch = t.prepare(df.drop(columns="rating"))
+    for i in (0, 5, 42):
+        one = t.prepare(df.drop(columns="rating").iloc[[i]])
+        pd.testing.assert_frame_equal(one, batch.iloc[[i]])
+    new = df.iloc[[0]].assign(competition="Ligue 1", overall_rating=np.nan)
+    row = t.prepare(new)
+    assert not row.isna().any().any()
+    assert not row.filter(like="competition_").any(axis=1).iloc[0]
+    assert row["overall_rating"].iloc[0] == t.raw_medians_["overall_rating"]
+
+def test_compact_dtypes_match_wide_values():
+    df = make_merged()
+    Xc, _ = FeatureTransformer().fit_transform(df.copy())
+    Xw, _ = FeatureTransformer(compact=False).fit_transform(df.copy())
+    assert set(Xc.dtypes.astype(str)) <= {"float32", "uint8"}
+    assert Xc.columns.tolist() == Xw.columns.tolist()
+    np.testing.assert_allclose(Xc.to_numpy(dtype="float64"), Xw.to_numpy(dtype="float64"),
+                               rtol=1e-6, equal_nan=True)
+    per90 = [c for c in Xc.columns if c.endswith("_per90")]
+    assert per90       # float64 rates rounded once, not float32 arithmetic
+    np.testing.assert_array_equal(Xc[per90].to_numpy(), Xw[per90].to_numpy(dtype="float32"))
+
+def test_rolling_form_is_prior_only_and_incremental_matches_full():
+    from features.rolling_form import compute
+    df = make_merged(300, seed=3)
+    full, state = compute(df, last_n=3)
+    # a player's first match has no history; later ones only see earlier dates
+    first = df.sort_values("date", kind="stable").groupby("player_name").head(1).index
+    assert (full.loc[first, "form_matches"] == 0).all()
+    assert full.loc[first, "form_ewm_rating"].isna().all()
+    p = df[df["player_name"] == "P0"].sort_values("date", kind="stable")
+    np.testing.assert_allclose(full.loc[p.index[3], "form_last3_rating"], p["rating"].iloc[:3].mean())
+
+    cut = df["date"].sort_values().iloc[180]
+    old, new = df[df["date"] <= cut], df[df["date"] > cut]
+    part1, mid = compute(old, last_n=3)
+    part2, end = compute(new, mid, last_n=3)
+    pd.testing.assert_frame_equal(pd.concat([part1, part2]).loc[df.index], full, rtol=1e-12)
+    pd.testing.assert_frame_equal(end.reset_index(drop=True), state.reset_index(drop=True),
+                                  check_dtype=False)
+
+def test_prepare_form_skips_incomplete_rows_in_full_and_incremental_builds(tmp_path, monkeypatch):
+    from common.storage import append_partition, read_table
+    from features import prepare_data, rolling_form
+    df = make_merged(300, seed=4).sort_values("date", kind="stable").reset_index(drop=True)
+    df.loc[df.index[::25], "team"] = None            # incomplete rows in the middle of histories
+    saved = {}
+    monkeypatch.setattr(rolling_form, "save_state", lambda state: saved.update(state=state))
+    monkeypatch.setattr(rolling_form, "load_state", lambda: saved.get("state"))
+    store = str(tmp_path / "merged")
+
+    def paths(name):
+        return dict(feat_path=str(tmp_path / name / "feat"), target_path=str(tmp_path / name / "target"),
+                    transformer_path=str(tmp_path / name / "t.joblib"),
+                    clean_path=str(tmp_path / name / "clean"))
+
+    cut = df["date"].iloc[150]
+    append_partition(df[df["date"] <= cut], store, "batch=1")
+    prepare_data.run_incremental(store, **paths("inc"), state_path=str(tmp_path / "wm.json"), form=True)
+    append_partition(df[df["date"] > cut], store, "batch=2")
+    prepare_data.run_incremental(store, **paths("inc"), state_path=str(tmp_path / "wm.json"), form=True)
+    X_full, _, _ = prepare_data.run_full(store, **paths("full"), form=True)
+
+    cols = [c for c in rolling_form.form_columns() if c in X_full.columns]
+    expected, _ = rolling_form.compute(df[df["team"].notna()])
+    expected = expected[cols].to_numpy("float64")
+    seen = ~np.isnan(expected)                       # the rest is median-filled by each transformer
+    full = X_full[cols].to_numpy("float64")
+    inc = read_table(paths("inc")["feat_path"])[cols].to_numpy("float64")
+    np.testing.assert_allclose(full[seen], expected[seen], rtol=1e-6)
+    np.testing.assert_allclose(inc[seen], full[seen], rtol=1e-6)
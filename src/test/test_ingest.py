@@ -0,0 +1,144 @@
+#test_ingest.py
+
+import os, sys, sqlite3, numpy as np, pandas as pd
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.storage import read_table
+from ingest import ingest_data
+
+ATTRS = ingest_data.ATTR_COLUMNS
+
+def make_raw(root, n_matches=60, seed=0):
+    """Tiny ratings CSV + SQLite DB with unmatched players, NULL attributes,
+    a duplicated player name and several raters."""
+    rng = np.random.default_rng(seed)
+    players = [f"Player {i}" for i in range(40)]
+    dates = pd.date_range("2015-08-01", periods=n_matches, freq="5D")
+    rows = []
+    for m in range(n_matches):
+        d = dates[rng.integers(0, n_matches)]  # file is not date-ordered
+        for pl in rng.choice(players, 6, replace=False):
+            base = dict(competition=f"League {m % 2}", date=d.strftime("%d/%m/%Y"),
+                        match=f"M{m}", team="T", pos="MF", pos_role="MC", player=pl,
+                        minutesPlayed=int(rng.integers(0, 91)), goals=int(rng.poisson(0.3)),
+                        interceptions=int(rng.poisson(1)), win=True, lost=False,
+                        is_home_team=bool(m % 2))
+            for rater in ("WhoScored", "Kicker"):
+                rows.append(dict(base, rater=rater, is_human=rater == "Kicker",
+                                 original_rating=round(float(rng.normal(6.8, 0.5)), 1)))
+    raw_csv = os.path.join(root, "ratings.csv")
+    pd.DataFrame(rows).to_csv(raw_csv, index=False)
+
+    db = os.path.join(root, "db.sqlite")
+    con = sqlite3.connect(db)
+    con.execute("CREATE TABLE Player(id INTEGER PRIMARY KEY, player_api_id INTEGER, player_name TEXT)")
+    con.execute("CREATE TABLE Player_Attributes(id INTEGER PRIMARY KEY, player_api_id INTEGER, date TEXT, "
+                + ", ".join(f"{a} INTEGER" for a in ATTRS) + ")")
+    for i, pl in enumerate(players + ["Player 3"]):  # 'Player 3' twice
+        if i % 7 == 5:
+            continue
+        con.execute("INSERT INTO Player(player_api_id, player_name) VALUES (?, ?)", (1000 + i, pl))
+        for _ in range(int(rng.integers(1, 5))):
+            d = pd.Timestamp("2015-01-01") + pd.Timedelta(days=int(rng.integers(0, 400)))
+            vals = [None if rng.random() < 0.05 else int(v) for v in rng.integers(40, 90, len(ATTRS))]
+            con.execute(f"INSERT INTO Player_Attributes(player_api_id, date, {', '.join(ATTRS)}) "
+                        f"VALUES (?, ?, {', '.join('?' * len(ATTRS))})",
+                        [1000 + i, d.strftime("%Y-%m-%d 00:00:00")] + vals)
+    con.commit()
+    con.close()
+    return raw_csv, db
+
+def test_streaming_matches_full_merge(tmp_path):
+    raw_csv, db = make_raw(str(tmp_path))
+    full = os.path.join(str(tmp_path), "full")
+    stream = os.path.join(str(tmp_path), "stream")
+    ingest_data.run_full(raw_csv, db, full)
+    ingest_data.run_streaming(raw_csv, db, stream, chunk_rows=100)
+    a, b = read_table(full), read_table(stream)
+    assert a["overall_rating"].notna().any() and a["overall_rating"].isna().any()
+    pd.testing.assert_frame_equal(a, b)
+
+def test_streaming_weekly_windows_match_full_merge(tmp_path):
+    raw_csv, db = make_raw(str(tmp_path), seed=2)
+    full = os.path.join(str(tmp_path), "full")
+    weekly = os.path.join(str(tmp_path), "weekly")
+    ingest_data.run_full(raw_csv, db, full)
+    ingest_data.run_streaming(raw_csv, db, weekly, chunk_rows=100, window="W")
+    pd.testing.assert_frame_equal(read_table(full), read_table(weekly))
+
+def test_sql_asof_matches_pandas_and_indexes(tmp_path):
+    raw_csv, db = make_raw(str(tmp_path), seed=1)
+    pandas_out = os.path.join(str(tmp_path), "pandas")
+    sql_out = os.path.join(str(tmp_path), "sql")
+    ingest_data.run_full(raw_csv, db, pandas_out)  # read-only, indexes only reported
+    ingest_data.run_full(raw_csv, db, sql_out, asof="sql", create_indexes=True)
+    pd.testing.assert_frame_equal(read_table(pandas_out), read_table(sql_out))
+
+    conn = sqlite3.connect(db)
+    assert ingest_data.ensure_indexes(conn) == []
+    conn.close()
+
+def test_incremental_appends_only_new_dates(tmp_path):
+    raw_csv, db = make_raw(str(tmp_path), seed=2)
+    out = os.path.join(str(tmp_path), "store")
+    state = os.path.join(str(tmp_path), "wm.json")
+    full = pd.read_csv(raw_csv)
+    dates = pd.to_datetime(full["date"], format="%d/%m/%Y")
+    cutoff = dates.sort_values().iloc[len(dates) // 2]
+    full[dates <= cutoff].to_csv(raw_csv, index=False)
+
+    first = ingest_data.run_incremental(raw_csv, db, out, state_path=state)
+    assert ingest_data.run_incremental(raw_csv, db, out, state_path=state) == 0
+    full.to_csv(raw_csv, index=False)
+    second = ingest_data.run_incremental(raw_csv, db, out, state_path=state)
+
+    merged = read_table(out)
+    assert first + second == len(merged) == (full["rater"] == "WhoScored").sum()
+    ingest_data.run_full(raw_csv, db, os.path.join(str(tmp_path), "full"))
+    pd.testing.assert_frame_equal(merged, read_table(os.path.join(str(tmp_path), "full")))
+
+    # an edited historical row, no newer match: rebuilt rather than ignored
+    old = (full["rater"] == "WhoScored") & (dates <= cutoff)
+    full.loc[old.idxmax(), "original_rating"] += 1.0
+    full.to_csv(raw_csv, index=False)
+    assert ingest_data.run_incremental(raw_csv, db, out, state_path=state) == len(merged)
+    ingest_data.run_full(raw_csv, db, os.path.join(str(tmp_path), "full"))
+    pd.testing.assert_frame_equal(read_table(out), read_table(os.path.join(str(tmp_path), "full")))
+
+def test_incremental_keeps_late_rows_of_the_watermark_day(tmp_path):
+    raw_csv, db = make_raw(str(tmp_path), seed=3)
+    out = os.path.join(str(tmp_path), "store")
+    state = os.path.join(str(tmp_path), "wm.json")
+    full = pd.read_csv(raw_csv)
+    dates = pd.to_datetime(full["date"], format="%d/%m/%Y")
+    days = dates.drop_duplicates().sort_values()
+    cutoff, later = days.iloc[len(days) // 2], days.iloc[len(days) // 2 + 1]
+    on_cutoff = np.flatnonzero((dates == cutoff).to_numpy())
+    late = full.index[on_cutoff[len(on_cutoff) // 2:]]          # the day's late fixtures
+    first = full[(dates < cutoff) | ((dates == cutoff) & ~full.index.isin(late))]
+    first.to_csv(raw_csv, index=False)
+    ingest_data.run_incremental(raw_csv, db, out, state_path=state)
+
+    # the late rows of the watermark day arrive together with the next matchday
+    full[(dates <= later)].to_csv(raw_csv, index=False)
+    ingest_data.run_incremental(raw_csv, db, out, state_path=state)
+    assert len(ingest_data.list_partitions(out)) == 2
+    ingest_data.run_full(raw_csv, db, os.path.join(str(tmp_path), "full"))
+    pd.testing.assert_frame_equal(read_table(out), read_table(os.path.join(str(tmp_path), "full")))
+
+def test_synthetic_generator_feeds_ingest(tmp_path):
+    from bench.make_synthetic import CSV_COLUMNS, generate
+    info = generate(str(tmp_path), rows=3_000, raters=2, seed=1, block_matches=20, log=lambda *a: None)
+    raw_csv = os.path.join(str(tmp_path), "data", "raw", "data_football_ratings.csv")
+    db = os.path.join(str(tmp_path), "data", "raw", "database.sqlite")
+    ratings = pd.read_csv(raw_csv)
+    assert list(ratings.columns) == CSV_COLUMNS and len(ratings) == info["rows"] >= 3_000
+    assert set(ratings["rater"]) == {"WhoScored", "SofaScore"}
+    out = os.path.join(str(tmp_path), "merged")
+    ingest_data.run_full(raw_csv, db, out)
+    merged = read_table(out)
+    assert len(merged) == info["rows"] // 2
+    assert 0.5 < merged["overall_rating"].notna().mean() < 1      # some players are not in the DB
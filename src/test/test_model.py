@@ -0,0 +1,247 @@
+#test_model.py
+
+import os, sys, numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from model.forest_arrays import ForestArrays, load_forest_or_model
+
+def test_forest_arrays_match_sklearn_and_load_mmapped(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 6))
+    X[rng.random(X.shape) < 0.05] = np.nan  # trees learn a side for missing values
+    y = np.nan_to_num(X[:, 0]) * 2 + np.nan_to_num(X[:, 1]) ** 2 + rng.normal(0, 0.1, 500)
+    rf = RandomForestRegressor(n_estimators=15, min_samples_leaf=2, random_state=0).fit(X, y)
+
+    forest = ForestArrays.from_model(rf)
+    X_new = rng.normal(size=(300, 6)).astype(np.float32)
+    X_new[::7, 2] = np.nan
+    np.testing.assert_allclose(forest.predict(X_new), rf.predict(X_new), rtol=1e-12)
+    np.testing.assert_allclose(forest.predict(X_new[:1]), rf.predict(X_new[:1]), rtol=1e-12)
+
+    forest.save(str(tmp_path / "rf.forest"))
+    loaded = load_forest_or_model(str(tmp_path / "rf.forest"))
+    assert isinstance(loaded.arrays["threshold"], np.memmap)
+    assert loaded.arrays["threshold"].dtype == np.float32
+    np.testing.assert_allclose(loaded.predict(X_new, block_rows=64), rf.predict(X_new), rtol=1e-12)
+
+    # named features: columns are matched by name, and a missing one is an error, not NaN
+    import pandas as pd
+    import pytest
+    cols = list("abcdef")
+    named = ForestArrays.from_model(RandomForestRegressor(n_estimators=3, random_state=0)
+                                    .fit(pd.DataFrame(X, columns=cols), y))
+    frame = pd.DataFrame(X_new, columns=cols)
+    np.testing.assert_array_equal(named.predict(frame[cols[::-1]]), named.predict(X_new))
+    with pytest.raises(KeyError, match="c, e"):
+        named.predict(frame.drop(columns=["c", "e"]))
+
+def test_cv_engine_single_fit_matches_cross_val_score_and_groups(tmp_path, tiny_dataset):
+    import pandas as pd
+    from sklearn.model_selection import cross_val_score
+    from model.cv_engine import make_folds, run_cv
+    ds, X, y = tiny_dataset(120, seed=1, columns="abcd", meta=lambda rng, y: pd.DataFrame({
+        "match": np.repeat([f"M{i}" for i in range(30)], 4),
+        "date": pd.Timestamp("2018-01-01") + pd.to_timedelta(np.arange(120), unit="D"),
+        "pos": rng.choice(["DF", "FW"], 120), "rating": y}))
+    meta = ds.meta("all")
+
+    rf = RandomForestRegressor(n_estimators=5, random_state=0)
+    res = run_cv(rf, ds, "kfold", n_jobs=1, oof_path=str(tmp_path / "oof"))
+    ref = -cross_val_score(rf, X, y, cv=5, scoring="neg_mean_absolute_error")
+    np.testing.assert_allclose([f["mae"] for f in res["folds"]], ref, rtol=1e-10)
+    assert set(res["by_position"]) == {"DF", "FW"}
+    assert len(pd.read_parquet(res["oof_path"])) == 120
+
+    for tr, te in make_folds("group", 120, 5, meta):
+        assert not set(meta["match"].iloc[tr]) & set(meta["match"].iloc[te])
+    for tr, te in make_folds("time", 120, 5, meta):
+        assert meta["date"].iloc[tr].max() < meta["date"].iloc[te].min()
+
+def test_successive_halving_schedule_and_resume(tmp_path):
+    from scipy.stats import randint, uniform
+    from model.tuning import TrialStore, rung_schedule, space_key, successive_halving
+    assert rung_schedule(20, 3, 1 / 9) == [(20, 1 / 9), (7, 1 / 3), (3, 1.0)]
+    assert space_key({"n": randint(1, 5), "d": [None, 2], "f": uniform(loc=0.1, scale=0.5)}) == \
+        {"n": "randint(1, 5)", "d": [None, 2], "f": "uniform(loc=0.1, scale=0.5)"}
+    assert space_key({"n": randint(1, 5)}) != space_key({"n": randint(1, 6)})
+    rng = np.random.default_rng(2)
+    X = rng.normal(size=(180, 3))
+    y = X[:, 0] + rng.normal(0, 0.1, 180)
+    space = {"n_estimators": [20, 30], "max_depth": [2, 4, None]}
+    store = TrialStore(str(tmp_path / "trials.sqlite"))
+    store.open_study("s", space)
+    run = lambda: successive_halving(RandomForestRegressor(random_state=0), space, X, y, store, "s",
+                                     n_candidates=4, eta=2, min_fraction=0.25, cv=2, n_jobs=1,
+                                     min_trees=2, log=lambda *a: None)
+    best = run()
+    n_trials = len(store.trials("s"))
+    assert n_trials == 4 + 2 + 1
+    assert run() == best and len(store.trials("s")) == n_trials   # resume: nothing re-fitted
+    store.close()
+
+def test_quick_tune_refuses_to_resume_on_a_rebuilt_dataset(tmp_path):
+    import pandas as pd
+    import pytest
+    from common.storage import write_table
+    from common.dataset import load_dataset
+    from model.quick_tune import study_space
+    from model.tuning import TrialStore
+    rng = np.random.default_rng(7)
+    X = pd.DataFrame(rng.normal(size=(60, 2)).astype("float32"), columns=list("ab"))
+    paths = [str(tmp_path / n) for n in ("feat", "target")]
+    write_table(X, paths[0])
+    store = TrialStore(str(tmp_path / "trials.sqlite"))
+
+    def open_study():
+        ds = load_dataset(*paths, clean=None, cache_dir=str(tmp_path / "cache"))
+        store.open_study("rf", study_space(ds, cv=3, candidates=4, eta=3, min_fraction=1 / 9))
+
+    write_table(pd.DataFrame({"rating": X["a"].to_numpy() + 7}), paths[1])
+    open_study()
+    open_study()                                     # same data: resumes
+    write_table(pd.DataFrame({"rating": X["a"].to_numpy() + 8}), paths[1])   # prepare_data.py re-run
+    with pytest.raises(ValueError, match="different search space"):
+        open_study()
+    store.close()
+
+def test_backends_fit_predict_and_importances():
+    import pandas as pd
+    from model.backends import BACKENDS, make_model, fit_model, feature_importances
+    rng = np.random.default_rng(3)
+    X = pd.DataFrame(rng.normal(size=(200, 3)), columns=["a", "b", "c"])
+    y = 2 * X["a"].to_numpy() + rng.normal(0, 0.1, 200)
+    for backend in BACKENDS:
+        size = {"max_iter": 20} if backend == "hgb" else {"n_estimators": 20}
+        model = fit_model(make_model(backend, n_jobs=1, **size), X, y, n_jobs=1)
+        assert model.predict(X.iloc[:5]).shape == (5,)
+        imp = feature_importances(model, X, y)
+        assert np.isclose(imp.sum(), 1) and imp.argmax() == 0
+
+def test_partition_trainer_matches_serial_fit_in_parallel(tmp_path, tiny_dataset):
+    import joblib, pandas as pd
+    from sklearn.model_selection import train_test_split
+    from model.partition_trainer import train_partitions, plan
+    ds, X, y = tiny_dataset(200, seed=2, meta=lambda rng, y: pd.DataFrame(
+        {"pos": rng.choice(["DF", "FW", "GK"], len(y), p=[0.5, 0.47, 0.03]), "rating": y}))
+    pos = ds.meta("all", ["pos"])["pos"].to_numpy()
+
+    summary = train_partitions(ds, "pos", params={"n_estimators": 5}, procs=2, tree_jobs=1,
+                               min_rows=10, model_dir=str(tmp_path / "models"), log=lambda *a: None)
+    assert list(summary["pos"]) == ["DF", "FW"]          # GK is below min_rows
+    # same model as fitting the partition's rows serially, in table order
+    idx = np.flatnonzero(pos == "FW")
+    X_tr, X_te, y_tr, _ = train_test_split(X.iloc[idx], y[idx], test_size=0.2, random_state=42)
+    ref = RandomForestRegressor(n_estimators=5, random_state=42).fit(X_tr, y_tr)
+    model = joblib.load(tmp_path / "models" / "rf_pos_FW.pkl")
+    np.testing.assert_allclose(model.predict(X_te), ref.predict(X_te))
+    assert plan(5, cpus=8) == (5, 1) and plan(2, cpus=8) == (2, 4) and plan(3, procs=1, cpus=8) == (1, 8)
+
+def test_stacking_reuses_cached_base_learners(tmp_path, tiny_dataset):
+    from model.stacking import build
+    ds, _, _ = tiny_dataset(150, seed=3)
+    learners = {"rf": ("rf", {"n_estimators": 5}), "hgb": ("hgb", {"max_iter": 20})}
+    kw = dict(n_splits=3, n_jobs=1, cache_dir=str(tmp_path / "stack"), log=lambda *a: None)
+
+    ens, report = build(ds, learners, "linear", **kw)
+    assert report["fitted"] == ["rf", "hgb"]
+    assert all(np.isfinite(report["members"][n]["oof_mae"]) for n in learners)
+    # the combined artifact reproduces the stacked test predictions in one pass
+    X_te, y_te = ds.features("test"), np.asarray(ds.target("test"))
+    assert abs(np.mean(np.abs(ens.predict(X_te) - y_te)) - report["test_mae"]) < 1e-4
+
+    _, again = build(ds, {**learners, "rf2": ("rf", {"n_estimators": 3})}, "mean", **kw)
+    assert again["fitted"] == ["rf2"]
+    assert again["members"]["rf"]["cached"] and again["members"]["rf"]["weight"] == round(1 / 3, 4)
+
+def test_load_dataset_keeps_only_the_newest_caches(tmp_path):
+    import pandas as pd
+    from common.storage import write_table
+    from common import dataset
+    from common.dataset import load_dataset
+    X = pd.DataFrame(np.arange(40, dtype="float32").reshape(20, 2), columns=list("ab"))
+    paths = [str(tmp_path / n) for n in ("feat", "target")]
+    cache = tmp_path / "cache"
+    write_table(X, paths[0])
+    opened = []
+    for shift in range(4):                          # separate runs, a re-prepared target each time
+        dataset._OPEN.clear()                       # datasets open in this process are never pruned
+        write_table(pd.DataFrame({"rating": X["a"].to_numpy() + shift}), paths[1])
+        opened.append(load_dataset(*paths, clean=None, cache_dir=str(cache), keep=2).directory)
+    assert sorted(p.name for p in cache.glob("dataset-*")) == sorted(os.path.basename(d) for d in opened[-2:])
+
+def test_update_model_grows_evicts_and_records_lineage(tmp_path, tiny_dataset):
+    import joblib
+    import pandas as pd
+    from model import lineage
+    from model.backends import make_model
+    from model.update_model import update, evaluate
+    ds, _, _ = tiny_dataset(200, seed=4, meta=lambda rng, y: pd.DataFrame(
+        {"date": pd.Timestamp("2018-01-01") + pd.to_timedelta(np.arange(len(y)), unit="D")}))
+    quiet = dict(n_jobs=1, log=lambda *a: None)
+
+    rf = RandomForestRegressor(n_estimators=10, random_state=0).fit(ds.features("train"), ds.target("train"))
+    path = str(tmp_path / "rating_model.pkl")
+    joblib.dump(rf, path)
+    lineage.record(path, "full", until="2018-05-31", trees=10)
+
+    rf, entry = update(rf, ds, "2018-05-31", version=2, add=4, window_days=0, **quiet)
+    assert (entry["added"], entry["evicted"], entry["trees"]) == (4, 0, 14)
+    assert entry["rows"] == entry["new_rows"] == int((ds.meta("train", ["date"])["date"] > "2018-05-31").sum())
+    assert rf.tree_versions_ == [1] * 10 + [2] * 4
+    assert evaluate(rf, ds, "2018-05-31")["new_test_rows"] > 0
+
+    # the cap drops the oldest trees, --max-age every tree grown too many versions ago
+    rf, entry = update(rf, ds, "2018-06-15", version=3, add=4, max_trees=12, **quiet)
+    assert entry["evicted"] == 6 and rf.tree_versions_ == [1] * 4 + [2] * 4 + [3] * 4
+    rf, _ = update(rf, ds, "2018-06-15", version=4, add=2, max_age=2, **quiet)
+    assert rf.tree_versions_ == [3] * 4 + [4] * 2 and len(rf.estimators_) == rf.n_estimators == 6
+
+    joblib.dump(rf, path)
+    assert lineage.current(path) is None            # replaced behind the history's back
+    entry = lineage.record(path, "update", **entry)
+    assert (entry["version"], entry["parent"]) == (2, 1) and lineage.current(path) == entry
+
+    hgb = make_model("hgb", n_jobs=1, max_iter=20).fit(ds.features("train"), ds.target("train"))
+    hgb, entry = update(hgb, ds, "2018-05-31", version=2, add=5, **quiet)
+    assert hgb.n_iter_ == entry["trees"] == 25
+    _, entry = update(hgb, ds, "2018-05-31", version=3, add=5, max_trees=28, **quiet)
+    assert entry["refit"] and entry["trees"] == 500
+
+def test_forest_export_header_compressed_copy_and_stale_cleanup(tmp_path):
+    import joblib
+    import pandas as pd
+    from features.transformer import FeatureTransformer
+    from model.backends import make_model
+    from model.forest_arrays import (export, read_header, unpack, load_forest_or_model,
+                                     ForestArrays)
+    rng = np.random.default_rng(5)
+    X = rng.normal(size=(300, 4))
+    y = X[:, 0] * 3 + rng.normal(0, 0.1, 300)
+    rf = RandomForestRegressor(n_estimators=8, random_state=0).fit(X, y)
+    model_path, transformer = str(tmp_path / "m.pkl"), tmp_path / "feature_transformer.pkl"
+    joblib.dump(rf, model_path)
+    t = FeatureTransformer()
+    t.feature_columns_, t.feature_medians_ = list("abcd"), pd.Series({"a": 1.5, "b": np.nan})
+    t.save(str(transformer))
+
+    forest = export(rf, model_path, str(transformer), "dataset-abc", leaf_dtype=np.float32,
+                    compress=True)
+    header = read_header(forest)
+    assert header["dataset"] == "dataset-abc" and header["leaf_dtype"] == "float32"
+    assert header["transformer"]["path"] == "feature_transformer.pkl"
+    assert header["transformer"]["feature_medians"] == {"a": 1.5, "b": 0.0, "c": 0.0, "d": 0.0}
+    packed = str(tmp_path / "m.forest.npz")
+    assert read_header(packed) == header and read_header(model_path) is None
+    # float32 leaves: float32 rounding only, whichever way the forest is loaded
+    for loaded in (load_forest_or_model(forest), load_forest_or_model(packed),
+                   ForestArrays.load(unpack(packed, str(tmp_path / "cold.forest")))):
+        np.testing.assert_allclose(loaded.predict(X), rf.predict(X), rtol=1e-6)
+
+    gbm = make_model("hgb", n_jobs=1, max_iter=5).fit(X, y)
+    joblib.dump(gbm, model_path)
+    assert export(gbm, model_path) is None
+    assert not os.path.exists(forest) and not os.path.exists(packed)
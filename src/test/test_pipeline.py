@@ -1,24 +1,86 @@
 #test_pipeline.py
 
-import os, joblib, pandas as pd, numpy as np
+import os, sys, joblib, numpy as np
 
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 PROC = os.path.join(ROOT, "data", "processed")
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common.storage import read_table, resolve
 
 def test_processed_files_exist():
-    for fname in ["player_ratings_features.csv",
-                  "player_ratings_target.csv",
-                  "player_ratings_cleaned.csv"]:
-        path = os.path.join(PROC, fname)
-        assert os.path.isfile(path) and os.path.getsize(path) > 0, f"{fname} missing"
+    for fname in ["player_ratings_features",
+                  "player_ratings_target",
+                  "player_ratings_cleaned"]:
+        path = resolve(os.path.join(PROC, fname))
+        assert os.path.getsize(path) > 0, f"{fname} missing"
 
 def test_model_predicts():
     model = joblib.load(os.path.join(ROOT, "models", "rating_model.pkl"))
-    X = pd.read_csv(os.path.join(PROC, "player_ratings_features.csv")).head(3)
+    X = read_table(os.path.join(PROC, "player_ratings_features")).head(3)
     preds = model.predict(X)
     assert preds.shape == (3,)
     assert np.all((preds >= 1) & (preds <= 10)), "predictions out of 1-10 range"
 
+def test_stage_runner_skips_unchanged_stages(tmp_path, monkeypatch):
+    from pipeline import run_pipeline as rp
+    for name, value in (("ROOT", tmp_path), ("STATE", tmp_path / "state.json"),
+                        ("LOGS", tmp_path / "logs"), ("DIGESTS", tmp_path / "cache")):
+        monkeypatch.setattr(rp, name, str(value))
+    (tmp_path / "copy.py").write_text("import sys; open(sys.argv[2], 'w').write(open(sys.argv[1]).read() + 'x')")
+    (tmp_path / "in.txt").write_text("a")
+    stages = [rp.Stage("a", "copy.py", ["in.txt"], ["mid.txt"], args=["in.txt", "mid.txt"]),
+              rp.Stage("b", "copy.py", ["mid.txt"], ["out.txt"], args=["mid.txt", "out.txt"]),
+              rp.Stage("c", "copy.py", ["in.txt"], ["c.txt"], args=["in.txt", "c.txt"])]
+    assert rp.dependencies(stages) == {"a": [], "b": ["a"], "c": []}
+    run = lambda: {k: v["status"] for k, v in rp.run(stages, jobs=2, log=lambda *a: None).items()}
+
+    assert run() == {"a": "ran", "b": "ran", "c": "ran"}
+    assert (tmp_path / "out.txt").read_text() == "axx"
+    assert run() == {"a": "skipped", "b": "skipped", "c": "skipped"}
+    (tmp_path / "in.txt").write_text("b")
+    (tmp_path / "out.txt").unlink()
+    assert run() == {"a": "ran", "b": "ran", "c": "ran"}
+    (tmp_path / "mid.txt").write_text("changed")   # only b reads it
+    assert run() == {"a": "skipped", "b": "ran", "c": "skipped"}
+
+def test_profiling_spans_nest_and_noop_when_off(tmp_path):
+    from common import profiling
+    try:
+        assert not profiling.configure(modes=[])
+        assert profiling.span("x") is profiling.NULL and profiling.stage("s") is profiling.NULL
+
+        profiling.configure(modes=["memory"], directory=str(tmp_path), run="r1")
+        with profiling.stage("prep"):
+            with profiling.span("outer") as sp:
+                with profiling.span("inner"):
+                    blob = bytearray(4 * 2**20)
+                del blob
+                sp.set(rows=3)
+        records = profiling.load_records(str(tmp_path / profiling.LOG_NAME))
+        by_span = {r["span"]: r for r in records}
+        assert set(by_span) == {"outer/inner", "outer", "total"}
+        assert all(r["run"] == "r1" and r["stage"] == "prep" for r in records)
+        assert by_span["outer"]["rows"] == 3
+        # the child's allocation counts towards every enclosing peak
+        assert by_span["outer/inner"]["heap_peak_mb"] >= 4
+        assert by_span["outer"]["heap_peak_mb"] >= 4 and by_span["total"]["heap_peak_mb"] >= 4
+        assert profiling.summarize(records)[0]["span"] == "total"
+    finally:
+        profiling.configure()
+
+def test_bad_profile_mode_warns_on_import_and_disables_profiling():
+    import subprocess
+    code = ("import warnings\n"
+            "with warnings.catch_warnings(record=True) as caught:\n"
+            "    warnings.simplefilter('always')\n"
+            "    import common.profiling as p\n"
+            "print(p.enabled(), *caught[0].message.args)")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         env={**os.environ, "PYTHONPATH": ROOT, "RATER_PROFILE": "memroy"}).stdout
+    assert out.startswith("False") and "unknown mode 'memroy'" in out and "profiling is off" in out
+
 if __name__ == "__main__":
     import pytest, sys
     sys.exit(pytest.main([__file__]))
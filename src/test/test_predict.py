@@ -0,0 +1,120 @@
+#test_predict.py
+
+import os, sys, joblib, numpy as np, pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.storage import write_table, read_table
+from features.transformer import FeatureTransformer, default_path
+from predict.batch_score import score_file, score_frame
+from test_features import make_merged
+
+def fit_model(tmp_path, n=600):
+    df = make_merged(n)
+    t = FeatureTransformer()
+    X, y = t.fit_transform(df.copy())
+    model = RandomForestRegressor(n_estimators=10, random_state=0).fit(X, y)
+    model_path = str(tmp_path / "model.pkl")
+    joblib.dump(model, model_path)
+    t.save(default_path(model_path))
+    return df, model, t, model_path
+
+def test_chunked_parallel_scoring_matches_single_pass(tmp_path):
+    df, model, t, model_path = fit_model(tmp_path)
+    raw = df.drop(columns="rating")
+    write_table(raw, str(tmp_path / "input"))
+    expected = score_frame(model, t, raw, id_cols=["player_name", "match"])
+
+    out = str(tmp_path / "preds.csv")
+    rows = score_file(model_path, str(tmp_path / "input"), out, chunk_rows=70, workers=2,
+                      id_cols=["player_name", "match"])
+    got = read_table(out)
+    assert rows == len(df)
+    assert got.columns.tolist() == ["player_name", "match", "predicted_rating"]
+    np.testing.assert_allclose(got["predicted_rating"], expected["predicted_rating"])
+    assert got["player_name"].tolist() == raw["player_name"].tolist()
+
+def test_position_router_groups_scatters_and_evicts(tmp_path):
+    from predict.position_router import PositionRouter
+    df, base, t, base_path = fit_model(tmp_path)
+    X = t.prepare(df.drop(columns="rating"))
+    models = {}
+    for i, p in enumerate(["DF", "FW"]):
+        m = RandomForestRegressor(n_estimators=5, random_state=i).fit(X, df["rating"])
+        joblib.dump(m, str(tmp_path / f"rf_pos_{p}.pkl"))
+        models[p] = m
+    pos = df["pos"].to_numpy(dtype=object)
+    pos[::11] = None  # missing position → base model
+
+    router = PositionRouter(str(tmp_path), base_path, max_bytes=1)  # room for one model at a time
+    got = router.predict(X, pos)
+    expected = base.predict(X)
+    for p, m in models.items():
+        mask = pos == p
+        expected[mask] = m.predict(X[mask])
+    np.testing.assert_allclose(got, expected)
+    stats = router.cache.stats()
+    assert stats["misses"] == 3 and stats["evictions"] == 2 and len(stats["models"]) == 1
+
+def test_model_cache_loads_once_outside_the_lock(tmp_path):
+    import threading
+    from predict.position_router import ModelCache
+    for name in ("slow", "fast"):
+        (tmp_path / name).write_bytes(b"x")
+    slow, fast = str(tmp_path / "slow"), str(tmp_path / "fast")
+    release, loads, timed_out = threading.Event(), [], []
+
+    def loader(path):
+        loads.append(path)
+        if path == slow:
+            timed_out.append(not release.wait(5))
+        return path.upper()
+
+    cache = ModelCache(loader=loader)
+    got = []
+    threads = [threading.Thread(target=lambda: got.append(cache.get(slow))) for _ in range(3)]
+    for th in threads:
+        th.start()
+    assert cache.get(fast) == fast.upper()      # not blocked behind the slow load
+    release.set()
+    for th in threads:
+        th.join()
+    assert timed_out == [False] and got == [slow.upper()] * 3 and sorted(loads) == sorted([slow, fast])
+    assert slow in cache and cache.stats()["misses"] == 2
+
+def test_rater_predict_numpy_path_matches_model_without_pandas(tmp_path):
+    import subprocess
+    from cli.rater import fast_predict
+    from model.forest_arrays import export
+    df, model, t, model_path = fit_model(tmp_path)
+    forest = export(model, model_path, default_path(model_path))
+    X = t.transform(df.drop(columns="rating"))[0].astype("float64")
+    X.iloc[::7, 0] = np.nan                   # filled with the training medians from the header
+    X[X.columns[::-1]].to_csv(tmp_path / "feats.csv", index=False)    # column order does not matter
+    expected = model.predict(t.clean_features(X))
+
+    out = str(tmp_path / "preds.csv")
+    code = ("import sys; from cli.rater import main; main(sys.argv[1:]); "
+            "assert 'pandas' not in sys.modules and 'sklearn' not in sys.modules")
+    subprocess.run([sys.executable, "-c", code, "predict", "--model", forest,
+                    "--input", str(tmp_path / "feats.csv"), "--output", out],
+                   check=True, env={**os.environ, "PYTHONPATH": SRC})
+    fast = pd.read_csv(out)
+    np.testing.assert_allclose(fast["predicted_rating"], expected, rtol=1e-6)
+
+    # the same columns as predict_rating.py writes for the same input
+    from predict.predict_rating import main as predict_main
+    slow = str(tmp_path / "slow.csv")
+    predict_main(["--model", model_path, "--input", str(tmp_path / "feats.csv"), "--output", slow])
+    slow = pd.read_csv(slow)
+    assert fast.columns.tolist() == slow.columns.tolist()
+    np.testing.assert_allclose(fast.to_numpy(), slow.to_numpy(), rtol=1e-6)
+
+    # raw rows or a pickled model go through predict_rating.py instead
+    df.drop(columns="rating").to_csv(tmp_path / "raw.csv", index=False)
+    assert fast_predict(["--model", forest, "--input", str(tmp_path / "raw.csv"), "--output", out]) is None
+    assert fast_predict(["--model", model_path, "--input", str(tmp_path / "feats.csv"),
+                         "--output", out]) is None
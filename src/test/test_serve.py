@@ -0,0 +1,58 @@
+#test_serve.py
+
+import os, sys, threading, numpy as np
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from serve.client import RaterClient
+from serve.scoring_service import MicroBatcher, build_server, load_batcher
+from test_predict import fit_model
+
+def test_service_and_client_round_trip(tmp_path):
+    df, model, t, model_path = fit_model(tmp_path, n=200)
+    raw = df.drop(columns=["rating", "date"]).head(5)         # JSON rows carry no timestamps
+    expected = model.predict(t.prepare(raw))
+
+    server = build_server(load_batcher(model_path, max_wait_ms=1), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = RaterClient(f"http://127.0.0.1:{server.server_address[1]}")
+    try:
+        assert client.health() == {"status": "ok"}
+        np.testing.assert_allclose(client.predict(raw.to_dict("records")), expected)
+        np.testing.assert_allclose(client.predict_table(raw.columns, raw.values.tolist()), expected)
+        assert client.metrics()["requests"] == 2
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+def test_batch_mixing_raw_rows_and_features_scores_each_like_alone(tmp_path):
+    df, model, t, _ = fit_model(tmp_path, n=200)
+    raw = df.drop(columns="rating").head(4).reset_index(drop=True)
+    features = t.prepare(df.drop(columns="rating").iloc[10:13]).reset_index(drop=True)
+    alone = [model.predict(t.prepare(raw)), model.predict(t.prepare(features))]
+
+    # a long wait so both requests land in one batch
+    batcher = MicroBatcher(model, t, max_batch_rows=1_000, max_wait_ms=300)
+    got = [None, None]
+
+    def ask(i, frame):
+        got[i] = batcher.predict(frame)
+
+    threads = [threading.Thread(target=ask, args=(i, f)) for i, f in enumerate((raw, features))]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    assert batcher.metrics.batches == 1
+    for g, a in zip(got, alone):
+        np.testing.assert_allclose(g, a)
+
+def test_batcher_without_transformer_aligns_columns_to_the_model(tmp_path):
+    df, model, t, _ = fit_model(tmp_path, n=200)
+    X = t.prepare(df.drop(columns="rating").head(6))
+    shuffled = X[X.columns[::-1]].assign(extra=1.0)     # other order, one unknown column
+    batcher = MicroBatcher(model, None, max_wait_ms=1)
+    np.testing.assert_allclose(batcher.predict(shuffled), model.predict(X))
@@ -0,0 +1,67 @@
+#test_storage.py
+
+import os, sys, pandas as pd
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from common.storage import TableWriter, read_table, resolve, write_table
+
+def _frame():
+    return pd.DataFrame({
+        "pos": pd.Categorical(["DF", "MF", "FW"]),
+        "competition": ["A", "B", "A"],
+        "rating": [6.5, 7.1, 8.0],
+    })
+
+def test_parquet_round_trip_keeps_category_and_projects(tmp_path):
+    stem = str(tmp_path / "table")
+    out = write_table(_frame(), stem, fmt="parquet")
+    assert out.endswith(".parquet")
+    df = read_table(stem, columns=["pos", "rating"])
+    assert list(df.columns) == ["pos", "rating"]
+    assert isinstance(df["pos"].dtype, pd.CategoricalDtype)
+
+def test_write_replaces_other_format(tmp_path):
+    stem = str(tmp_path / "table")
+    write_table(_frame(), stem, fmt="csv")
+    write_table(_frame(), stem + ".csv", fmt="parquet")
+    assert resolve(stem).endswith(".parquet")
+    assert not os.path.exists(stem + ".csv")
+
+def test_table_writer_appends_chunks(tmp_path):
+    stem = str(tmp_path / "chunks")
+    for fmt in ("parquet", "csv"):
+        with TableWriter(stem, fmt=fmt) as w:
+            w.write(_frame())
+            w.write(_frame())
+        assert len(read_table(stem)) == 6
+
+def test_dataset_cache_matches_train_test_split_and_tracks_content(tmp_path):
+    import numpy as np
+    from sklearn.model_selection import train_test_split
+    from common.dataset import load_dataset
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(50, 3)).astype("float32"), columns=["a", "b", "c"])
+    X.loc[::7, "b"] = np.nan
+    X.loc[3, "c"] = np.inf
+    y = pd.DataFrame({"rating": rng.normal(7, 1, 50)})
+    meta = pd.DataFrame({"pos": rng.choice(["DF", "MF"], 50), "rating": y["rating"]})
+    feat, target, clean, cache = (str(tmp_path / n) for n in ("feat", "target", "clean", "cache"))
+    write_table(X, feat); write_table(y, target); write_table(meta, clean)
+
+    ds = load_dataset(feat, target, clean, cache_dir=cache)
+    X_ref = X.replace([np.inf, -np.inf], np.nan)
+    X_ref = X_ref.fillna(X_ref.median())
+    X_tr, X_te, y_tr, y_te, m_tr, m_te = train_test_split(X_ref, y["rating"].values, meta,
+                                                          test_size=0.2, random_state=42)
+    np.testing.assert_array_equal(ds.features("test").values, X_te.values)
+    np.testing.assert_array_equal(ds.target("train"), y_tr)
+    assert ds.meta("test")["pos"].tolist() == m_te["pos"].tolist()
+    assert np.shares_memory(ds.features("train").values, ds.X)   # a view, not a copy
+    np.testing.assert_array_equal(ds.features("all").values, X_ref.values)
+
+    assert load_dataset(feat, target, clean, cache_dir=cache) is ds
+    write_table(y.assign(rating=y["rating"] + 1), target)
+    assert load_dataset(feat, target, clean, cache_dir=cache).directory != ds.directory